@@ -1,64 +1,79 @@
 import httpx
 import asyncio
 
-async def dynamic_url_building():
-    """Build URLs dynamically for e-commerce scraping"""
+from http_cache import CachingTransport
+from json_codec import read_json
+from retry_policy import RetryPolicy
 
-    retry_count=0
-    max_retry=3
-    retry_delay=2.5
 
-    async with httpx.AsyncClient(http2=True, timeout=httpx.Timeout(30.0), limits=httpx.Limits(max_connections=2, max_keepalive_connections=2)) as client:
-            try:
-                search_scenarios = [
-                    {"query": "gaming laptop", "page": 1, "sort": "relevance"},
-                    {"query": "wireless headphones", "page": 2, "sort": "price_low"},
-                    {"query": "smartphone", "page": 1, "sort": "rating"}
-                ]
+def log_retry(request, attempt, delay, outcome):
+    if isinstance(outcome, httpx.Response):
+        print(f"❌ Search failed: {outcome.status_code}")
+    else:
+        print(f"🔥 Network error: {type(outcome).__name__} - {outcome}")
+    print(f"🔄 Retrying in {delay:.1f}s... ({attempt}/{retry_policy.max_attempts - 1})")
 
-                for scenario in search_scenarios:
 
-                    while retry_count <= max_retry:
-                        base_url = "https://httpbin.org/get"
-                        params = {
-                            "q": scenario["query"],
-                            "page": scenario["page"],
-                            "sort": scenario["sort"],
-                            "in_stock": "true",
-                            "free_shipping": "true"
-                        }
+# Each search gets its own attempts (no retry counter shared across scenarios);
+# jittered backoff, honours Retry-After, retries capped at ~10% of traffic
+retry_policy = RetryPolicy(max_attempts=4, base_delay=0.5, max_delay=10.0, on_retry=log_retry)
+
+
+async def dynamic_url_building():
+    """Build URLs dynamically for e-commerce scraping"""
 
-                        resp = await client.get(
-                            base_url,
-                            params=params,
-                            headers={
-                                "User-Agent": "DynamicURLClient/1.0",
-                                "Accept": "application/json"
-                            }
-                        )
+    # Pages we've already fetched come from memory while they're fresh
+    cache = CachingTransport(http2=True, limits=httpx.Limits(max_connections=2, max_keepalive_connections=2))
+    async with httpx.AsyncClient(transport=cache, timeout=httpx.Timeout(30.0)) as client:
+        search_scenarios = [
+            {"query": "gaming laptop", "page": 1, "sort": "relevance"},
+            {"query": "wireless headphones", "page": 2, "sort": "price_low"},
+            {"query": "smartphone", "page": 1, "sort": "rating"},
+            # User goes back to the first results page → cache hit
+            {"query": "gaming laptop", "page": 1, "sort": "relevance"}
+        ]
 
-                        if resp.status_code == 200:
-                            data = resp.json()
-                            print("✅ Dynamic URL Building Successful!")
-                            print(f"data: {data}")
-                            print(f"✅ Search '{scenario['query']}' - Page {scenario['page']}")
-                            print(f"   URL: {data['url']}")
-                            break
+        for scenario in search_scenarios:
+            # /cache/60 → same echo as /get, but cacheable for 60s
+            base_url = "https://httpbin.org/cache/60"
+            params = {
+                "q": scenario["query"],
+                "page": scenario["page"],
+                "sort": scenario["sort"],
+                "in_stock": "true",
+                "free_shipping": "true"
+            }
 
-                        else:
-                            print(f"❌ Search failed: {resp.status_code}")
-                            print(f"   Response: {resp.text}")
-                            retry_count = retry_count + 1
-                            print(f"🔄 Retrying... ({retry_count}/{max_retry + 1})")
-                            await asyncio.sleep(retry_delay * (2 ** retry_count))
-                    
+            try:
+                resp = await retry_policy.request(
+                    client,
+                    "GET",
+                    base_url,
+                    params=params,
+                    headers={
+                        "User-Agent": "DynamicURLClient/1.0",
+                        "Accept": "application/json"
+                    }
+                )
             except httpx.RequestError as e:
                 print(f"🔥 Network error: {type(e).__name__} - {e}")
-                retry_count += 1
-                if retry_count <= max_retry:
-                    print(f"🔄 Retrying... ({retry_count}/{max_retry + 1})")
-                    await asyncio.sleep(retry_delay * (2 ** retry_count))
-                
+                continue
+
+            if resp.status_code == 200:
+                data = await read_json(resp)
+                print("✅ Dynamic URL Building Successful!")
+                print(f"data: {data}")
+                print(f"✅ Search '{scenario['query']}' - Page {scenario['page']}")
+                print(f"   URL: {data['url']}")
+                print(f"   🗄️ Cache: {resp.extensions['cache_status']}")
+
+            else:
+                print(f"❌ Search failed: {resp.status_code}")
+                print(f"   Response: {resp.text}")
+
+    print(f"📊 Cache stats: {cache.stats()}")
+    print(f"📊 Retry stats: {retry_policy.stats}")
+
 
 if __name__ == "__main__":
-    asyncio.run(dynamic_url_building())
\ No newline at end of file
+    asyncio.run(dynamic_url_building())
@@ -3,18 +3,24 @@ import asyncio
 import time
 from datetime import datetime, timedelta
 
+from http_cache import CachingTransport
+from json_codec import read_json
+
 
 async def advanced_parameter_building():
     """Advanced parameter building for financial data APIs"""
 
-    async with httpx.AsyncClient(http2=True, limits=httpx.Limits(max_connections=5, max_keepalive_connections=5), timeout=httpx.Timeout(30.0)) as client:
+    # Market data for the same range is reused while fresh (Cache-Control / ETag revalidation)
+    cache = CachingTransport(http2=True, limits=httpx.Limits(max_connections=5, max_keepalive_connections=5))
+    async with httpx.AsyncClient(transport=cache, timeout=httpx.Timeout(30.0)) as client:
         
         end_date = datetime.now()
 
         """current time now - 30 days later"""
         start_date = end_date - timedelta(days=30)
 
-        symbols = ["AAPL", "GOOGL", "TSLA", "MSFT", "AMZN"]
+        # Dashboards ask for the same symbols over and over
+        symbols = ["AAPL", "GOOGL", "TSLA", "MSFT", "AMZN", "AAPL", "TSLA"]
 
         for symbol in symbols:
             params = {
@@ -31,19 +37,23 @@ async def advanced_parameter_building():
             params = {k: v for k, v in params.items() if v is not None and v != ""}
             try:
                 response = await client.get(
-                    "https://httpbin.org/get",
+                    # /cache/60 → same echo as /get, but cacheable for 60s
+                    "https://httpbin.org/cache/60",
                     params=params,
                     timeout=30.0
                 )
 
                 if response.status_code == 200:
-                    data = response.json()
+                    data = await read_json(response)
                     print(f"✅ {symbol} data fetched successfully")
                     print(f"   Parameters: {data['args']}")
+                    print(f"   🗄️ Cache: {response.extensions['cache_status']}")
 
             except Exception as e:
                 print(f"❌ Error fetching {symbol}: {e}")
 
+        print(f"📊 Cache stats: {cache.stats()}")
+
 # Run it
 asyncio.run(advanced_parameter_building())
 
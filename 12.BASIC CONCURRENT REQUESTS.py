@@ -1,6 +1,10 @@
 import httpx
 import asyncio
 
+from fan_out import FanOut
+from json_codec import read_json
+from request_coalescing import CoalescingTransport
+
 async def fetch_url(product_id, client):
     url = f"https://httpbin.org/json"  # Simulating product API
     response = await client.get(url, params={"product_id": product_id}, timeout=30.0)
@@ -9,30 +13,35 @@ async def fetch_url(product_id, client):
 async def basic_concurrent_requests():
     """Basic concurrent requests for product data"""
 
-    # List of product IDs to fetch
-    product_ids = [101, 102, 103, 104, 105, 106, 107, 108, 109, 110]
+    # List of product IDs to fetch (catalog fan-outs often ask for the same product more than once)
+    # Any iterable / async iterable works here - a generator over millions of IDs never gets materialised
+    product_ids = [101, 102, 103, 104, 105, 106, 107, 108, 109, 110, 101, 103, 105]
 
-    async with httpx.AsyncClient(timeout=httpx.Timeout(30.0), limits=httpx.Limits(max_connections=5, max_keepalive_connections=5)) as client:
-        tasks = [fetch_url(product_id, client) for product_id in product_ids]
-        responses = await asyncio.gather(*tasks, return_exceptions=True)
+    # Identical in-flight GETs (same URL + params + vary headers) share one upstream request
+    transport = CoalescingTransport(limits=httpx.Limits(max_connections=5, max_keepalive_connections=5))
 
-        # prints out a list of all API responses
-        print("Results Summary:", responses)
+    async with httpx.AsyncClient(transport=transport, timeout=httpx.Timeout(30.0)) as client:
+        # At most 10 requests in flight; results are handled as they arrive, so memory stays flat however many IDs there are
+        fan_out = FanOut(lambda product_id: fetch_url(product_id, client), concurrency=10, return_exceptions=True)
 
         successful_responses = 0
+        total = 0
 
-        # iterate through the responses list
-        for i, response in enumerate(responses):
-            if response.status_code == 200:
+        async for product_id, response in fan_out.map(product_ids):
+            total += 1
+            if isinstance(response, httpx.Response) and response.status_code == 200:
                 successful_responses += 1
-                data = response.json()
-                print(f"✅ Product ID {product_ids[i]} data fetched successfully")
+                data = await read_json(response)
+                print(f"✅ Product ID {product_id} data fetched successfully")
 
             else:
-                print(f"❌ Error fetching Product ID {product_ids[i]}: {response}")
+                print(f"❌ Error fetching Product ID {product_id}: {response}")
+
+        print(f"🎯 Results: {successful_responses}/{total} successful")
 
-        print(f"🎯 Results: {successful_responses}/{len(product_ids)} successful")
+        stats = transport.stats()
+        print(f"🔁 Dedupe: {stats['coalesced']}/{stats['requests']} requests coalesced ({stats['dedupe_ratio']:.0%}) | Upstream calls: {stats['upstream_requests']}")
+        print(f"📦 Fan-out: peak {fan_out.stats()['peak_in_flight']} in flight")
 
 # Run it
 asyncio.run(basic_concurrent_requests())
-
@@ -1,14 +1,18 @@
 import httpx
 import asyncio
+import hashlib
 import os
-import aiofiles
 
-async def fetch_images(url, index, download_folder):
+from download_cache import DownloadCache
+
+async def fetch_images(url, download_folder):
     file_extension = os.path.basename(url)
     if file_extension not in ['jpeg', 'png', 'svg', 'jpg']:
         file_extension = 'jpg'  # default to jpg if unknown
 
-    filename = os.path.join(download_folder, f"product_image_{index+1}.{file_extension}")
+    # Named after the URL, not its position in the list - the same image keeps the same file across runs
+    url_key = hashlib.sha256(url.encode("utf-8")).hexdigest()[:12]
+    filename = os.path.join(download_folder, f"product_image_{url_key}.{file_extension}")
     return filename
 
 async def basic_file_download():
@@ -24,45 +28,29 @@ async def basic_file_download():
     download_folder = "downloaded_images"
     os.makedirs(download_folder, exist_ok=True)
 
+    # Survives between runs: unchanged images are only revalidated (304), duplicates stored once
+    cache = DownloadCache(os.path.join(download_folder, ".cache"))
+
     async with httpx.AsyncClient(timeout=httpx.Timeout(30.0), limits=httpx.Limits(max_connections=5, max_keepalive_connections=5)) as client:
 
         # Extract and Prepare filenames for each image
-        tasks = [fetch_images(url, i, download_folder) for i, url in enumerate(image_urls)]
+        tasks = [fetch_images(url, download_folder) for url in image_urls]
         filenames = await asyncio.gather(*tasks, return_exceptions=True)
         print("Results Summary:", filenames)
 
-        tasks = [download_single_file(client, url, filename) for url, filename in zip(image_urls, filenames) if isinstance(filename, str)]
+        tasks = [download_single_file(client, cache, url, filename) for url, filename in zip(image_urls, filenames) if isinstance(filename, str)]
 
         # Download all files concurrently
         print("🚀 Starting concurrent file downloads...")
         result = await asyncio.gather(*tasks, return_exceptions=True)
         print("Results Summary:", result)
+        print("Cache:", await cache.stats())
 
-async def download_single_file(client, url, filename):
-    """Download a single file"""
-    try:
-        response = await client.get(url, timeout=30.0)
-        response.raise_for_status()  # Raise an error for bad responses
-        print(response)
-
-        async with aiofiles.open(filename, 'wb') as f:
-            await f.write(response.content)
-        
-        file_size = len(response.content)
-        return {
-            "success": True,
-            "filename": filename,
-            "size_bytes": file_size,
-            "error": None
-        }
+    await cache.close()
 
-    except Exception as e:
-        return {
-            "success": False, 
-            "filename": filename,
-            "size": 0,
-            "error": str(e)
-        }
+async def download_single_file(client, cache, url, filename, expected_digest=None):
+    """Download a single file through the cache - streamed to disk and verified (expected_digest and/or the server's digest headers) as it's written"""
+    return await cache.fetch(client, url, filename, expected_digest=expected_digest)
 
 
 if __name__ == "__main__":
@@ -1,9 +1,13 @@
 import httpx
 import asyncio
 import os
-import hashlib
+import tempfile
 import aiofiles
 
+from chunked_upload import ChunkedUploader, UploadIncomplete
+from retry_policy import RetryPolicy
+from streaming_upload import FilePart, MultipartFileBody, digest_cache
+
 
 async def enterprise_file_upload():
     """Enterprise-grade file upload with progress tracking and verification"""
@@ -30,75 +34,109 @@ async def enterprise_file_upload():
         print("Results Summary:", results)
 
 
-async def upload_single_file(client, filepath):
-    """Upload a single file with progress tracking and retry logic"""
-    start_time = asyncio.get_event_loop().time()
-    retry_count = 0
+async def enterprise_chunked_upload(upload_url="http://uploads.local"):
+    """Large files: split into parts, 4 in flight, only failed parts retried, resumable against a persistent upload service"""
 
-    for i in range(1, 4):  # Retry up to 3 times
-        try:
-            file_size = os.path.getsize(filepath['path'])
-            file_name = os.path.basename(filepath['path'])
+    # Local stand-in for the upload service (init / part / complete) - point upload_url at the real one instead
+    from upload_server import UploadServer
 
-            print(f"   📤 Uploading {file_name} ({file_size} bytes)...")
+    large_file = os.path.join("large_downloads", "10MB_file.bin")
+    if not os.path.exists(large_file):
+        os.makedirs("large_downloads", exist_ok=True)
+        with open(large_file, "wb") as f:
+            f.write(os.urandom(10 * 1024 * 1024))
 
-            # Read file content
-            async with aiofiles.open(filepath['path'], 'rb') as file:
-                file_content = await file.read()
-                print(f"   📦 Read {len(file_content)} bytes from {file_name}")
+    def show_progress(path, parts_done, part_count):
+        print(f"   📤 {os.path.basename(path)}: part {parts_done}/{part_count}")
 
-            # Generate file hash for verification
-            file_hash = hashlib.md5(file_content).hexdigest()
-            print(f"   🔒 File Hash (MD5): {file_hash}")
+    # The stand-in's storage (parts + the assembled file) goes away with the demo
+    with tempfile.TemporaryDirectory(prefix="uploads-") as storage_dir:
+        transport = httpx.ASGITransport(app=UploadServer(storage_dir, per_request_mbps=20))
+        async with httpx.AsyncClient(transport=transport, timeout=httpx.Timeout(60.0)) as client:
+            uploader = ChunkedUploader(client, upload_url, part_size=2 * 1024 * 1024, concurrency=4, on_progress=show_progress)
+            try:
+                result = await uploader.upload(large_file)
+                print(f"✅ Uploaded {result['size']} bytes in {result['parts']} parts (resumed {result['parts_resumed']}) | sha256 {result['sha256'][:16]}...")
+            except UploadIncomplete as e:
+                # Progress is saved next to the file, but this in-process stand-in forgets its sessions on exit -
+                # only a persistent upload service lets the next run resume instead of starting over
+                print(f"❌ {e}")
 
-             # Prepare files for upload (multipart form data)
-            files = {
-                'file': (file_name, file_content, filepath['type']),
-                'metadata': (None, f'{{"original_name":"{file_name}","hash":"{file_hash}"}}')
-            }
 
-            # Upload to httpbin (simulating real upload endpoint)
-            response = await client.post(
-                "https://httpbin.org/post",
-                files=files,
-                timeout=60.0,
-                headers={
-                    "X-File-Size": str(file_size),
-                    "X-File-Hash": file_hash
-                }
-            )
-            response.raise_for_status()  # Raise error for bad responses
-            upload_time = asyncio.get_event_loop().time() - start_time
-
-            # parse response
-            response_data = response.json()
-            return {
-                "success": True,
-                "filename": file_name,
-                "file_size": file_size,
-                "upload_time": upload_time,
-                "retry_count": retry_count,
-                "error": None
+def log_retry(request, attempt, delay, outcome):
+    reason = f"HTTP {outcome.status_code}" if isinstance(outcome, httpx.Response) else f"{type(outcome).__name__}: {outcome}"
+    print(f"   ❌ Upload attempt {attempt}/{upload_retry_policy.max_attempts} failed ({reason}) - retrying in {delay:.1f}s")
+
+
+# Uploads carry X-File-Hash, so the server can drop a duplicate → safe to retry the POST.
+# Jittered backoff + retry budget: a flaky upload endpoint never sees a synchronised retry storm.
+upload_retry_policy = RetryPolicy(max_attempts=3, base_delay=1.0, max_delay=15.0, retry_non_idempotent=True, on_retry=log_retry)
+
+
+async def upload_single_file(client, filepath):
+    """Upload a single file with progress tracking and retry logic"""
+    start_time = asyncio.get_event_loop().time()
+    file_name = os.path.basename(filepath['path'])
+
+    try:
+        file_size = os.path.getsize(filepath['path'])
+
+        print(f"   📤 Uploading {file_name} ({file_size} bytes)...")
+
+        # Generate file hash for verification - hashed in a worker thread, once per (path, mtime, size)
+        file_hash = await digest_cache.digest(filepath['path'], "md5")
+        print(f"   🔒 File Hash (MD5): {file_hash}")
+
+        # Prepare the multipart body - streamed from disk in 1 MB reads on every attempt, never held in memory.
+        # The hash above is trusted while the file's mtime + size don't change (no re-hash per attempt);
+        # if they change mid-upload the body is cut short.
+        body = MultipartFileBody(
+            files={'file': FilePart('file', filepath['path'], file_name, filepath['type'])},
+            data={'metadata': f'{{"original_name":"{file_name}","hash":"{file_hash}"}}'},
+            hash_algorithm="md5",
+            expected_digests={'file': file_hash},
+        )
+
+        # Upload to httpbin (simulating real upload endpoint)
+        response = await upload_retry_policy.request(
+            client,
+            "POST",
+            "https://httpbin.org/post",
+            content=body,
+            timeout=60.0,
+            headers={
+                **body.headers,
+                "X-File-Size": str(file_size),
+                "X-File-Hash": file_hash
             }
-            break  # Exit retry loop on success
-        except Exception as e:
-            retry_count = retry_count + 1
-            # Exponential backoff: double wait time each retry
-            await asyncio.sleep(2 ** retry_count)
-
-            print(f"   ❌ Error uploading {file_name} (Attempt {retry_count}/3): {e}")
-            if retry_count >= 3:
-                return {
-                    "success": False,
-                    "filename": filepath,
-                    "file_size": 0,
-                    "upload_time": 0,
-                    "error": str(e),
-                    "retry_count": retry_count
-                }
+        )
+        response.raise_for_status()  # Raise error for bad responses
+        upload_time = asyncio.get_event_loop().time() - start_time
+
+        # parse response
+        response_data = response.json()
+        return {
+            "success": True,
+            "filename": file_name,
+            "file_size": file_size,
+            "upload_time": upload_time,
+            "retry_count": response.extensions["retries"],
+            "error": None
+        }
+    except Exception as e:
+        print(f"   ❌ Error uploading {file_name}: {e}")
+        return {
+            "success": False,
+            "filename": filepath,
+            "file_size": 0,
+            "upload_time": 0,
+            "error": str(e),
+            "retry_count": upload_retry_policy.max_attempts - 1
+        }
 
 if __name__ == "__main__":
     asyncio.run(enterprise_file_upload())
+    asyncio.run(enterprise_chunked_upload())
 
 
 
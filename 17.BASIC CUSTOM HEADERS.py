@@ -3,6 +3,8 @@ import asyncio
 import time
 import random
 
+from client_registry import client_registry
+
 async def middleware_pattern():
     """Middleware pattern for request/response modification"""
 
@@ -23,7 +25,10 @@ async def middleware_pattern():
         if response.status_code == 429:
             response.headers["X-RateLimit-Detected"] = "true"
             retry_after = response.headers.get("Retry-After", "unknown")
-            print(f"⚠️ Rate limit detected! Retry after: {retry_after}")
+            print(f"⚠️ Rate limit detected! Retry after: {retry_after} (the client's rate limiter has slowed this host down)")
+        waited = response.extensions.get("rate_limit_wait")
+        if waited:
+            print(f"⏳ Held back {waited:.2f}s by the client-side rate limiter")
         return response
 
     async def response_time_middleware(response, request):
@@ -51,19 +56,27 @@ async def middleware_pattern():
         print("Request Headers: ", request.headers)
         print("Resquest startTime: ", request._start_time)
 
-        async with httpx.AsyncClient(timeout=httpx.Timeout(30.0), follow_redirects=True, limits=httpx.Limits(max_connections=2, max_keepalive_connections=2)) as client:
-            response = await client.send(request)
-
-            # Apply response middleware
-            response = await rate_limit_detection_middleware(response, request)
-            print(f"Response Headers: {response.headers}")
-            print(f"Response: {response}")
+        # One shared client for every request (registry) instead of a new connection pool per request
+        # Rate limited per host: learns from X-RateLimit-* / Retry-After and backs off on 429 before sending more
+        client = client_registry.get_client(
+            http2=False,
+            timeout=httpx.Timeout(30.0),
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=2, max_keepalive_connections=2),
+            rate_limit={"rate": 5, "burst": 2},
+        )
+        response = await client.send(request)
+
+        # Apply response middleware
+        response = await rate_limit_detection_middleware(response, request)
+        print(f"Response Headers: {response.headers}")
+        print(f"Response: {response}")
+
+        response = await response_time_middleware(response, request)
+        print("response time", response.headers)
+        print()
 
-            response = await response_time_middleware(response, request)
-            print("response time", response.headers)
-            print()
-
-            return response
+        return response
 
     test_urls = [
         "https://httpbin.org/headers",
@@ -72,7 +85,10 @@ async def middleware_pattern():
     ]
     custom_headers={"X-Custom-Data": "test_value"}
     tasks = [make_request_with_middleware(url, custom_headers) for i, url in enumerate(test_urls)]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+    try:
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        await client_registry.shutdown()
     print("result summary: ", results)
 
     for response in results:
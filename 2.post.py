@@ -1,33 +1,44 @@
 import asyncio
-import httpx
+
+from client_registry import client_registry
+from json_codec import read_json
 
 
 async def stealth_post():
-    async with httpx.AsyncClient(http2=True, timeout=20, follow_redirects=True) as client:
-        requestBody = {
-            "title": "Test Post for joshua",
-            "body": "This is post call for id 5",
-            "userId": 5
-        }
+    # Shared client from the registry - no new DNS + TCP + TLS per call
+    client = client_registry.get_client(http2=True, timeout=20, follow_redirects=True)
+    requestBody = {
+        "title": "Test Post for joshua",
+        "body": "This is post call for id 5",
+        "userId": 5
+    }
+
+    resp = await client.post(
+        "https://jsonplaceholder.typicode.com/posts/",
+        json=requestBody,
+        headers={
+            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)",
+            "Content-Type": "application/json",
+            "X-Requested-With": "XMLHttpRequest",  # Mimic AJAX
+            "Referer": "https://google.com"
 
-        resp = await client.post(
-            "https://jsonplaceholder.typicode.com/posts/",
-            json=requestBody,
-            headers={
-                "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)",
-                "Content-Type": "application/json",
-                "X-Requested-With": "XMLHttpRequest",  # Mimic AJAX
-                "Referer": "https://google.com"
-
-            }
-        )
-        print(f"✅ Request Body: ", resp.request.content)
-        print(f"✅ Response JSON: {resp.json()}")
-        print(f"✅ cookies: ", resp.cookies.jar)
-        print(f"✅ Status: {resp.status_code}")
-        print(f"✅ Headers: {resp.headers}")
-        print(f"✅ Body snippet: {resp.text[:100].replace('\n', ' ')}")
-asyncio.run(stealth_post())
+        }
+    )
+    print(f"✅ Request Body: ", resp.request.content)
+    print(f"✅ Response JSON: {await read_json(resp)}")
+    print(f"✅ cookies: ", resp.cookies.jar)
+    print(f"✅ Status: {resp.status_code}")
+    print(f"✅ Headers: {resp.headers}")
+    snippet = resp.text[:100].replace("\n", " ")
+    print(f"✅ Body snippet: {snippet}")
+
+async def main():
+    try:
+        await stealth_post()
+    finally:
+        await client_registry.shutdown()
+
+asyncio.run(main())
 
 
 # 🧩 Step 5: In your 1000 logcode case
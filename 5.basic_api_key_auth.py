@@ -1,6 +1,8 @@
 import httpx
 import asyncio
 
+from json_codec import read_json
+
 
 async def basic_api_key_auth():
     """Simple API key in headers - e-commerce style"""
@@ -21,7 +23,7 @@ async def basic_api_key_auth():
         )
 
         if response.status_code == 200:
-            data = response.json()
+            data = await read_json(response)
             print("✅ API Key Auth Successful!")
             print("Response Headers:", data)
             print("Response Body:", response.text)
@@ -1,41 +1,28 @@
 import httpx
 import asyncio
-import time
 
+from token_auth import BearerTokenAuth
 
 
+def parse_demo_token(response):
+    """Simulate extracting token from response (httpbin just echoes our credentials back)"""
+    print("response:", response.json())
+    return "fake_jwt_token_abc123xyz", 3500  # Token valid for ~1 hour
 
-current_token = None
-token_expiry = 0
 
-
-async def get_bearer_token(client):
-    """Get a fresh bearer token"""
-    global current_token, token_expiry
-
-    # Return existing token if still valid
-    if current_token and time.time() < token_expiry: # if current time is less than expiry token time
-        return current_token
-
-    # Simulate token endpoint - in real world, this would be real auth
-    print("🔄 Getting new bearer token...")
-
-    data = {
+# Simulate token endpoint - in real world, this would be real auth.
+# One shared manager per credential set: concurrent requests never stampede the token endpoint,
+# the token is refreshed in the background before it expires, and a 401 re-auths once and replays.
+auth = BearerTokenAuth(
+    "https://httpbin.org/post",
+    {
         "username": "demo_user",
         "password": "demo_pass",
         "grant_type": "password"
-    }
+    },
+    parse_token=parse_demo_token,
+)
 
-    response = await client.post("https://httpbin.org/post", json=data)
-
-    if response.status_code == 200:
-        print("response:", response.json())
-        # Simulate extracting token from response
-        current_token = "fake_jwt_token_abc123xyz"
-        token_expiry = time.time() + 3500 # Token valid for 1 hour
-        return current_token
-    else:
-        raise Exception("Failed to obtain token, status code: {}".format(response.status_code))
 
 async def bearer_token_auth():
     """Bearer Token Authentication with token refresh"""
@@ -43,27 +30,31 @@ async def bearer_token_auth():
     async with httpx.AsyncClient(
         http2=True,
         timeout=httpx.Timeout(30.0),
-        limits=httpx.Limits(max_connections=1, max_keepalive_connections=1)
+        limits=httpx.Limits(max_connections=1, max_keepalive_connections=1),
+        auth=auth
     ) as client:
+        # --------------- Bearer Token is always in headers (added by the auth flow) ----------------
         try:
-            token = await get_bearer_token(client)
+            responses = await asyncio.gather(*[
+                client.get(
+                    "https://httpbin.org/bearer",
+                    headers={
+                        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36",
+                        "Accept": "application/json"
+                    }
+                )
+                for _ in range(5)
+            ])
         except Exception as e:
             print("❌ Failed to obtain bearer token:", str(e))
             return None
+        finally:
+            print("🔑 Token manager:", auth.manager.stats())
 
-        # --------------- Bearer Token is always in headers ----------------
-        response = await client.get(
-            "https://httpbin.org/bearer",
-            headers={
-                "Authorization": f"Bearer {token}",
-                "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36",
-                "Accept": "application/json"
-            }
-        )
-
+        response = responses[0]
         if response.status_code == 200:
             data = response.json()
-            print("✅ Bearer Token Auth Successful!")
+            print(f"✅ Bearer Token Auth Successful! ({len(responses)} requests, {auth.manager.refreshes} token fetch)")
             print("Response Headers:", data)
             print("Response Body:", response.text)
             return data
@@ -72,4 +63,11 @@ async def bearer_token_auth():
             return None
 
 
-asyncio.run(bearer_token_auth())
\ No newline at end of file
+async def main():
+    try:
+        await bearer_token_auth()
+    finally:
+        await auth.manager.aclose()
+
+
+asyncio.run(main())
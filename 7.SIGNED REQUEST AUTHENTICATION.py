@@ -1,33 +1,22 @@
 import httpx
 import asyncio
-import hashlib
-import hmac
-import time
+
+from request_signing import HmacAuth
 
 async def signed_request_auth():
     """HMAC signed request - crypto exchange style"""
     
     api_key = "fake_api_key_789"
     secret_key = "fake_secret_key_xyz123"
-    timestamp = str(int(time.time() * 1000))  # milliseconds
-    
-    # Create message to sign (method + endpoint + timestamp)
-    message = f"GET\n/api/data\ntimestamp={timestamp}"
-    
-    # Generate HMAC signature
-    signature = hmac.new(
-        secret_key.encode('utf-8'),
-        message.encode('utf-8'),
-        hashlib.sha256
-    ).hexdigest()
+
+    # Signs timestamp + method + path + query + sha256(body) on every request.
+    # The keyed HMAC state is computed once here and copied per request.
+    auth = HmacAuth(api_key, secret_key)
     
-    async with httpx.AsyncClient(http2=True) as client:
+    async with httpx.AsyncClient(http2=True, auth=auth) as client:
         response = await client.get(
             "https://httpbin.org/headers",
             headers={
-                "X-API-Key": api_key,
-                "X-Signature": signature,
-                "X-Timestamp": timestamp,
                 "User-Agent": "TradingBot/1.0",
                 "Accept": "application/json"
             }
@@ -36,12 +25,22 @@ async def signed_request_auth():
         if response.status_code == 200:
             data = response.json()
             print("✅ Signed Request Auth Successful!")
-            print(f"Signature: {signature}")
-            print(f"Timestamp: {timestamp}")
-            return data
+            print(f"Signature: {response.request.headers['X-Signature']}")
+            print(f"Timestamp: {response.request.headers['X-Timestamp']}")
         else:
             print(f"❌ Signed auth failed: {response.status_code}")
             return None
 
+        # Order bursts: build the requests, sign them all in a thread pool, then send (already signed → auth=None)
+        orders = [
+            client.build_request("POST", "https://httpbin.org/post", json={"symbol": "BTCUSDT", "side": "BUY", "qty": 0.01, "client_order_id": i})
+            for i in range(20)
+        ]
+        await auth.sign_batch(orders)
+        responses = await asyncio.gather(*[client.send(order, auth=None) for order in orders])
+        print(f"✅ {sum(r.status_code == 200 for r in responses)}/{len(orders)} signed orders accepted")
+
+        return data
+
 # Run it
-asyncio.run(signed_request_auth())
\ No newline at end of file
+asyncio.run(signed_request_auth())
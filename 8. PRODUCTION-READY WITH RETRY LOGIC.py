@@ -2,54 +2,61 @@ import httpx
 import asyncio
 import time
 
+from client_registry import client_registry
+from json_codec import read_json
+from retry_policy import RetryPolicy
 
-async def make_authenticated_request_with_retry(endpoint: str, api_key: str, max_retries: int = 3, method: str = "GET", data=None):
-    """Production-ready function with retry logic"""
+
+def log_retry(request, attempt, delay, outcome):
+    if isinstance(outcome, httpx.Response):
+        if outcome.status_code == 429:
+            print(f"⚠️ Rate limited, waiting {delay:.1f} seconds...")
+        else:
+            print(f"❌ HTTP error {outcome.status_code}")
+    else:
+        print(f"🔥 Network error: {type(outcome).__name__} - {outcome}")
+    print(f"🔄 Retrying in {delay:.1f} seconds... ({attempt}/{retry_policy.max_attempts - 1})")
+
+
+# Shared by every request: jittered backoff, Retry-After aware, retries capped at ~10% of traffic
+retry_policy = RetryPolicy(
+    max_attempts=4,
+    base_delay=0.5,
+    max_delay=10.0,
+    rules={401: False},  # Authentication failed - retrying won't fix the API key
+    on_retry=log_retry,
+)
+
+
+async def make_authenticated_request_with_retry(client: httpx.AsyncClient, endpoint: str, api_key: str, method: str = "GET", data=None):
+    """Production-ready function with retry logic (on the caller's pooled client)"""
 
     base_url = "https://httpbin.org"
-    retry_count = 0
-
-    while retry_count <= max_retries:
-        try:
-            async with httpx.AsyncClient(http2=True, limits=httpx.Limits(max_connections=10, max_keepalive_connections=5), timeout=httpx.Timeout(10.0)) as client:
-                headers = {
-                    "X-API-Key": api_key,
-                    "User-Agent": "RobustClient/1.0",
-                    "Accept": "application/json",
-                    "X-Request": f"req_{int(time.time())}_{retry_count}"
-                }
-                url = f"{base_url}/{endpoint}"
-
-                if method == "GET":
-                    response = await client.get(url, headers=headers)
-                else:
-                    response = await client.post(url, headers=headers, json=data)
-
-                if response.status_code == 200:
-                    print(f"✅ Request successful on attempt {retry_count + 1}")
-                    return response.json()  
-
-                elif response.status_code in {429, 503}:
-                    print("⚠️ Rate limited, waiting 5 seconds...")
-                    await asyncio.sleep(5)
-                    retry_count = retry_count + 1
-                
-                elif response.status_code in {401}:
-                    print("❌ Authentication failed - check API key")
-                    return None
-
-                else:
-                    print(f"❌ HTTP error {response.status_code}")
-                    retry_count = retry_count + 1
-                    await asyncio.sleep(2 ** retry_count) # # Exponential backoff
-
-        except httpx.RequestError as e:
-            print(f"🔥 Network error: {type(e).__name__} - {e}")
-            retry_count += 1
-            if retry_count <= max_retries:
-                wait_time = 2 ** retry_count
-                print(f"🔄 Retrying in {wait_time} seconds...")
-                await asyncio.sleep(wait_time)
+    headers = {
+        "X-API-Key": api_key,
+        "User-Agent": "RobustClient/1.0",
+        "Accept": "application/json",
+        "X-Request": f"req_{int(time.time())}"
+    }
+    url = f"{base_url}/{endpoint}"
+
+    try:
+        response = await retry_policy.request(client, method, url, headers=headers, json=data if method != "GET" else None)
+    except httpx.RequestError as e:
+        print(f"🔥 Network error: {type(e).__name__} - {e}")
+        return None
+
+    if response.status_code == 200:
+        print("✅ Request successful")
+        return await read_json(response)
+
+    elif response.status_code in {401}:
+        print("❌ Authentication failed - check API key")
+        return None
+
+    else:
+        print(f"❌ HTTP error {response.status_code} (giving up)")
+        return None
 
 async def production_ready_demo():
     """Demo the production-ready function"""
@@ -59,28 +66,35 @@ async def production_ready_demo():
 
     print("🚀 Testing production-ready authentication...")
 
-    result = await make_authenticated_request_with_retry("headers", api_key)
-    if result:
-        print("✅ Production-ready request succeeded:", result)
+    # One shared, pooled client for every request and every retry - connection opened before the first real call
+    client = client_registry.get_client(http2=True, limits=httpx.Limits(max_connections=10, max_keepalive_connections=5), timeout=httpx.Timeout(10.0))
+    await client_registry.prewarm(client, "https://httpbin.org/get")
 
-    result2 = await make_authenticated_request_with_retry(
-        "post",
-        api_key,
-        method="POST",
-        data={"order": "test_order_123"}
-    )
-    if result2:
-        print("✅ Production-ready POST request succeeded:", result2)
+    try:
+        result = await make_authenticated_request_with_retry(client, "headers", api_key)
+        if result:
+            print("✅ Production-ready request succeeded:", result)
 
-    result3 = await make_authenticated_request_with_retry("status/429", api_key)
+        result2 = await make_authenticated_request_with_retry(
+            client,
+            "post",
+            api_key,
+            method="POST",
+            data={"order": "test_order_123"}
+        )
+        if result2:
+            print("✅ Production-ready POST request succeeded:", result2)
 
-    if not result3:
-        print("✅ Rate limit handling worked correctly.")
-
-
-if __name__ == "__main__":
-    asyncio.run(production_ready_demo())
+        result3 = await make_authenticated_request_with_retry(client, "status/429", api_key)
 
+        if not result3:
+            print("✅ Rate limit handling worked correctly.")
+    finally:
+        await client_registry.shutdown()
 
+    print("📊 Retry stats:", retry_policy.stats)
+    print("📊 Cold vs warm latency:", client_registry.stats())
 
 
+if __name__ == "__main__":
+    asyncio.run(production_ready_demo())
@@ -1,16 +1,32 @@
 import httpx
 import asyncio
 
-async def basic_query_params():
-    max_retry=3
-    retry_delay=2.5
-    retry_count=0
+from http_cache import CachingTransport
+from json_codec import read_json
+from retry_policy import RetryPolicy
+
+
+def log_retry(request, attempt, delay, outcome):
+    if isinstance(outcome, httpx.Response):
+        print("❌ Query Parameters Failed!")
+        print(f"Status Code: {outcome.status_code}")
+    else:
+        print(f"🔥 Network error: {type(outcome).__name__} - {outcome}")
+    print(f"🔄 Retrying in {delay:.1f}s... ({attempt}/{retry_policy.max_attempts - 1})")
+
 
+# Jittered backoff, honours Retry-After, retries capped at ~10% of traffic
+retry_policy = RetryPolicy(max_attempts=4, base_delay=0.5, max_delay=10.0, on_retry=log_retry)
+
+
+async def basic_query_params():
     """Simple query parameters for product search"""
-    async with httpx.AsyncClient(http2=True, timeout=httpx.Timeout(30.0), limits=httpx.Limits(max_connections=2, max_keepalive_connections=2)) as client:
+    # Repeat searches are answered from memory while the response is fresh (Cache-Control / ETag)
+    cache = CachingTransport(http2=True, limits=httpx.Limits(max_connections=2, max_keepalive_connections=2))
+    async with httpx.AsyncClient(transport=cache, timeout=httpx.Timeout(30.0)) as client:
             try:
-                # Build URL with query parameters
-                base_url = "https://httpbin.org/get"
+                # Build URL with query parameters (/cache/60 → same echo as /get, but cacheable for 60s)
+                base_url = "https://httpbin.org/cache/60"
                 params = {
                     "category": "electronics",
                     "price_min": "100",
@@ -19,35 +35,34 @@ async def basic_query_params():
                     "limit": "50"
                 }
 
-                resp = await client.get(
-                    base_url,
-                    params=params,
-                    headers={
-                        "User-Agent": "QueryClient/1.0",
-                        "Accept": "application/json"
-                    }
-                )
+                # Same search twice → the second one never leaves the process
+                for attempt in range(2):
+                    resp = await retry_policy.request(
+                        client,
+                        "GET",
+                        base_url,
+                        params=params,
+                        headers={
+                            "User-Agent": "QueryClient/1.0",
+                            "Accept": "application/json"
+                        }
+                    )
+                    print(f"🗄️ Cache: {resp.extensions['cache_status']}")
 
                 if resp.status_code == 200:
-                    data = resp.json()
+                    data = await read_json(resp)
                     print("✅ Query Parameters Successful!")
                     print(f"data: {data}")
                     print(f"text: {resp.text}")
+                    print(f"📊 Cache stats: {cache.stats()}")
                     return data
                 else:
                     print("❌ Query Parameters Failed!")
                     print(f"Status Code: {resp.status_code}")
                     print(f"text: {resp.text}")
-                    retry_count = retry_count + 1
-                    print(f"🔄 Retrying... ({retry_count}/{max_retry})")
-                    await asyncio.sleep(retry_delay * (2 ** retry_count))
 
             except httpx.RequestError as e:
                 print(f"🔥 Network error: {type(e).__name__} - {e}")
-                retry_count += 1
-                if retry_count <= max_retry:
-                    print(f"🔄 Retrying... ({retry_count}/{max_retry})")
-                    await asyncio.sleep(retry_delay * (2 ** retry_count))
 
 # Run it
 if __name__ == "__main__":
@@ -0,0 +1,191 @@
+"""Adaptive per-service concurrency limit (AIMD or gradient) for the enterprise circuit breaker"""
+import asyncio
+import collections
+import math
+import time
+
+
+class ConcurrencyLimitExceeded(Exception):
+    """Raised when a call can't even get a place in the limiter's queue"""
+
+
+class AdaptiveConcurrencyLimiter:
+    """Caps in-flight requests to a service and moves the cap with observed latency/errors.
+
+    algorithm="gradient" (default, Vegas / Netflix Gradient2 style)
+        Compares a slow-moving baseline RTT with each sample. While latency stays flat
+        the limit grows by ~sqrt(limit) per sample; once samples get slower than the
+        baseline the limit shrinks in proportion (never faster than halving).
+
+    algorithm="aimd"
+        +1 per successful sample while the limit is actually being used,
+        × backoff_ratio on an error or a sample slower than `latency_threshold`.
+
+    Errors always count as a drop. Callers above the limit wait in a FIFO queue
+    (no spinning); with `max_queue` set, callers beyond it get ConcurrencyLimitExceeded.
+    """
+
+    def __init__(
+        self,
+        initial_limit=20,
+        min_limit=1,
+        max_limit=1000,
+        algorithm="gradient",
+        backoff_ratio=0.9,
+        latency_threshold=None,
+        rtt_tolerance=1.5,
+        smoothing=0.2,
+        max_queue=None,
+    ):
+        if algorithm not in ("gradient", "aimd"):
+            raise ValueError(f"Unknown limiter algorithm: {algorithm}")
+
+        self.algorithm = algorithm
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.latency_threshold = latency_threshold
+        self.rtt_tolerance = rtt_tolerance
+        self.smoothing = smoothing
+        self.max_queue = max_queue
+
+        # Live state
+        self.in_flight = 0
+        self._waiters = collections.deque()
+
+        # Baseline RTT (slow EMA) for the gradient algorithm
+        self.baseline_rtt = 0.0
+
+        # Stats
+        self.total_requests = 0
+        self.rejected = 0
+        self.total_queue_wait = 0.0
+        self.queued_requests = 0
+        self.last_queue_wait = 0.0
+
+    # 👉 current ceiling as a whole number of requests
+    @property
+    def current_limit(self):
+        return max(self.min_limit, int(self.limit))
+
+    @property
+    def queue_size(self):
+        return len(self._waiters)
+
+    def try_acquire(self):
+        """Take a slot only if one is free right now (never queues) - True when taken"""
+        if self.in_flight < self.current_limit and not self._waiters:
+            self.in_flight += 1
+            self.total_requests += 1
+            return True
+        return False
+
+    async def acquire(self):
+        """Wait for an in-flight slot - returns the time the request was admitted"""
+        # Fast path - below the limit and nobody queued ahead of us: no await at all
+        if self.in_flight < self.current_limit and not self._waiters:
+            self.in_flight += 1
+            self.total_requests += 1
+            return time.perf_counter()
+
+        if self.max_queue is not None and len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise ConcurrencyLimitExceeded(f"Concurrency limit {self.current_limit} reached and {len(self._waiters)} calls already queued")
+
+        queued_at = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+
+        try:
+            # release() hands the slot over directly (in_flight already counted for us)
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # We got the slot but are going away - pass it on
+                self.in_flight -= 1
+                self._wake_waiters()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+
+        admitted_at = time.perf_counter()
+        self.last_queue_wait = admitted_at - queued_at
+        self.total_queue_wait += self.last_queue_wait
+        self.queued_requests += 1
+        self.total_requests += 1
+        return admitted_at
+
+    def release(self, rtt=None, dropped=False):
+        """Give the slot back and feed the sample (seconds, error/timeout?) to the algorithm
+
+        rtt=None frees the slot without a sample (e.g. the caller was cancelled).
+        """
+        in_flight = self.in_flight
+        self.in_flight -= 1
+
+        if rtt is None:
+            pass
+        elif self.algorithm == "aimd":
+            self._update_aimd(rtt, dropped, in_flight)
+        else:
+            self._update_gradient(rtt, dropped, in_flight)
+
+        self._wake_waiters()
+
+    def _update_aimd(self, rtt, dropped, in_flight):
+        too_slow = self.latency_threshold is not None and rtt > self.latency_threshold
+
+        if dropped or too_slow:
+            self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+
+        # Only grow when the limit is actually the bottleneck (not when we're idle)
+        elif in_flight * 2 >= self.limit:
+            self.limit = min(self.max_limit, self.limit + 1)
+
+    def _update_gradient(self, rtt, dropped, in_flight):
+        if dropped:
+            self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+            return
+
+        if self.baseline_rtt == 0.0:
+            self.baseline_rtt = rtt
+        else:
+            # Slow EMA → the "no queueing" latency the service is capable of
+            self.baseline_rtt += (rtt - self.baseline_rtt) * 0.01
+
+        # rtt ≈ baseline → gradient 1.0 (room to grow); rtt ≫ baseline → shrink, at most halving
+        gradient = max(0.5, min(1.0, self.rtt_tolerance * self.baseline_rtt / max(rtt, 1e-9)))
+
+        # Don't grow a limit we aren't using
+        if gradient >= 1.0 and in_flight * 2 < self.limit:
+            return
+
+        new_limit = self.limit * gradient + math.sqrt(self.limit)
+        new_limit = self.limit * (1 - self.smoothing) + new_limit * self.smoothing
+        self.limit = max(self.min_limit, min(self.max_limit, new_limit))
+
+        # If the baseline drifted up during a long overload, pull it back towards the fastest recent sample
+        if rtt < self.baseline_rtt:
+            self.baseline_rtt = rtt
+
+    def _wake_waiters(self):
+        """Hand free slots to queued callers in FIFO order"""
+        while self._waiters and self.in_flight < self.current_limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def stats(self):
+        """Current limit, in-flight count and queue numbers"""
+        return {
+            "algorithm": self.algorithm,
+            "limit": self.current_limit,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "rejected": self.rejected,
+            "last_queue_wait": self.last_queue_wait,
+            "avg_queue_wait": self.total_queue_wait / self.queued_requests if self.queued_requests else 0.0,
+            "baseline_rtt": self.baseline_rtt,
+        }
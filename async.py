@@ -1,19 +1,90 @@
 import asyncio
 import httpx
-import statistics
 import time
+from contextlib import nullcontext
+from types import MappingProxyType
+
+from adaptive_limiter import AdaptiveConcurrencyLimiter, ConcurrencyLimitExceeded
+from client_registry import client_registry
+from health_window import RollingHealthWindow, SlidingTimeWindow
+from latency_histogram import LatencyHistogram
+from shared_circuit_state import SharedCircuitBackend
 
 
 
 # Enterprise circuit breaker with multiple services
 enterprise_circuits = {}
 
+# Optional cross-process backend (see use_shared_circuit_state) - None means plain per-process dicts
+shared_circuit_backend = None
+
+# Stand-in for the shared backend's slot lock when circuits are plain per-process dicts
+NO_LOCK = nullcontext()
+
+# Adaptive concurrency limiters, one per service (always per process - they count this process's in-flight calls)
+service_limiters = {}
+
+
+def use_shared_circuit_state(path, slot_count=1024, window_size=100, window_seconds=10, latency_interval=60.0):
+    """Keep circuit state in a memory-mapped file shared by every worker process"""
+    global shared_circuit_backend
+
+    shared_circuit_backend = SharedCircuitBackend(path, slot_count, window_size, window_seconds, latency_interval)
+    enterprise_circuits.clear()
+    return shared_circuit_backend
+
+
 # 👉 “Give me the latest status record for that service — create one if it doesn’t exist.”
-def get_circuit_for_service(service_name):
+def get_circuit_for_service(service_name, config=None):
     """Get or create circuit for a service"""
+    circuit = enterprise_circuits.get(service_name)
+    if circuit is not None:
+        return circuit
+
+    # Per-process bookkeeping - never shared between workers
+    local = {
+        # Keeps a count of which errors occurred most often (timeout, 500, etc.).
+        "error_types": {}, ####
+
+        # How many calls were turned away without touching the network.
+        "rejected_requests": 0,
+
+        # Log the fail-fast message once per open period, not once per rejected call.
+        "rejection_logged": False,
+
+        # Preallocated, read-only fail-fast results - rejecting a call costs no allocation.
+        "rejections": {
+            "open": MappingProxyType({
+                "error": f"Circuit breaker open for {service_name}",
+                "status": "fail_fast",
+                "circuit_state": "open",
+            }),
+            "half_open": MappingProxyType({
+                "error": f"Half-open probe limit reached for {service_name}",
+                "status": "fail_fast",
+                "circuit_state": "half_open",
+            }),
+            "concurrency": MappingProxyType({
+                "error": f"Concurrency limit reached for {service_name}",
+                "status": "fail_fast",
+                "circuit_state": "closed",
+            }),
+        },
+
+        # Guards read-modify-write updates (a real per-slot lock with the shared backend).
+        "lock": NO_LOCK,
+    }
 
-    if service_name not in enterprise_circuits:
-        enterprise_circuits[service_name] = {
+    if shared_circuit_backend is not None:
+        # State, counters and health window live in the shared slot - every worker sees the same circuit
+        enterprise_circuits[service_name] = shared_circuit_backend.circuit(service_name, local)
+        return enterprise_circuits[service_name]
+
+    window_size = (config or {}).get("window_size", 100)
+    window_seconds = (config or {}).get("sliding_window_seconds", 10)
+    latency_interval = (config or {}).get("latency_histogram_interval", 60.0)
+
+    enterprise_circuits[service_name] = {
 
             # "closed" or "open" or "half_open"
             "state": "closed", 
@@ -33,12 +104,18 @@ def get_circuit_for_service(service_name):
             # When to try again after being open (used for the 60s wait).
             "next_retry_time": 0, 
             
-            # List of response durations for calculating averages.
-            "response_times": [],
-            
-            # Keeps a count of which errors occurred most often (timeout, 500, etc.).
-            "error_types": {}, ####
+            # Ring buffer of the last `window_size` requests (latency + success/failure).
+            # Success rate and average latency are read from it in O(1).
+            "health_window": RollingHealthWindow(window_size),
 
+            # Per-second buckets (requests, failures, slow calls, latency) over the last `sliding_window_seconds`.
+            # Drives the failure-rate / slow-call-rate trip rules.
+            "time_window": SlidingTimeWindow(window_seconds),
+
+            # Fixed-size log-linear histogram of recent response times → p50 / p95 / p99 / max.
+            # Same memory whether the service saw 10 requests or 10 billion.
+            "latency_histogram": LatencyHistogram(latency_interval),
+            
             # Total number of requests made overall.
             "total_requests": 0, 
 
@@ -48,106 +125,198 @@ def get_circuit_for_service(service_name):
             # The overall “service health” percentage (0–100). Starts healthy at 100.
             "health_score": 100, # 0-100 scale
 
-            'retry': False
+            # Half-open probes currently on the wire (never more than half_open_max_requests).
+            "probes_in_flight": 0,
+
+            # Successful probes since the circuit last went half-open.
+            "half_open_successes": 0,
+
+            # Bumped on every open → half-open transition so a probe from an older round
+            # can't release a slot or count a success in the current round.
+            "half_open_generation": 0,
+
+            **local
         }
 
     return enterprise_circuits[service_name]
 
-async def enterprise_circuit_breaker(service_name, request_func, *args, config=None):
-    """Enterprise-grade circuit breaker for any service"""
 
-    default_config = {
-        # How many times a request can fail before the circuit “opens” (stops sending requests temporarily).
-        "max_failures": 5,
+# 👉 “Is this call allowed to go out right now?” - the closed path is one read, no await and no lock.
+# The event loop only switches coroutines at an await, so the checks below can't interleave inside one
+# process; the circuit lock only matters for the shared backend, where other processes update the same slot.
+def admit_request(service_name, circuit, config, current_time):
+    """Admission control: returns (rejection, probe_generation)
 
-        # How long (in seconds) the circuit should stay open before testing again.
-        "reset_timeout": 30,
+    rejection is None when the call may proceed, otherwise a preallocated fail-fast result.
+    probe_generation is None for normal calls, or the half-open round this probe belongs to.
+    """
+    state = circuit["state"]
 
-        # Number of successful requests required to close the circuit again after reopening.
-        "success_threshold": 3,
+    # Fast path - closed circuit lets everything through
+    if state == "closed":
+        return None, None
 
-        # If a response takes longer than this (in seconds), it counts as a “slow” request.
-        "slow_response_threshold": 3.0,
+    # Still cooling down - reject without taking the lock
+    if state == "open" and current_time < circuit["next_retry_time"]:
+        return reject_request(service_name, circuit, "open")
 
-        # A health score (0–100). If it drops below this, the service is considered unhealthy.
-        "health_threshold": 30, 
+    with circuit["lock"]:
+        # Re-read under the lock - another worker may have moved the circuit on meanwhile
+        state = circuit["state"]
+        if state == "closed":
+            return None, None
 
-        # A “warning” level — below this, service is degraded but not yet broken.
-        "degraded_threshold": 70,  
+        if state == "open":
+            if current_time < circuit["next_retry_time"]:
+                return reject_request(service_name, circuit, "open")
 
-        # How many past requests are tracked to calculate the health score.
-        "window_size": 100,  # Requests to consider for health
+            # update the state from open to half-open
+            start_half_open_round(service_name, circuit, current_time)
 
-        # When the circuit is half-open (testing state), only allow this many trial requests.
-        "half_open_max_requests": 5  
-    }
+        # Half-open: exactly half_open_max_requests probes in flight, everybody else fails fast
+        if circuit["probes_in_flight"] >= config["half_open_max_requests"]:
 
-    config = default_config or config
+            # A whole reset_timeout without an outcome → the probes died with their worker, start a fresh round
+            if current_time - circuit["last_state_change"] < config["reset_timeout"]:
+                return reject_request(service_name, circuit, "half_open")
+            start_half_open_round(service_name, circuit, current_time)
 
-    # 👉 “Give me the latest status record for that service — create one if it doesn’t exist.”
-    circuit = get_circuit_for_service(service_name)
-    current_time = time.time()
+        circuit["probes_in_flight"] = circuit["probes_in_flight"] + 1
+        return None, circuit["half_open_generation"]
 
-    # Circuit state machine
-    if circuit["state"] == "open":
-
-        if current_time < circuit["next_retry_time"]:
-
-            if not circuit['retry']:
-                print(f"🚫 [{service_name}] Circuit OPEN - failing fast")
-                circuit['retry'] = True
-                # circuit["total_requests"] += 1
-                
-                return {
-                    "error": f"Circuit breaker open for {service_name}",
-                    "status": "fail_fast", 
-                    "circuit_state": "open",
-                    'health_score': circuit['health_score'],
-                }
-            return 
-        else:
-            # update the state from open to half-open
-            print(f"🟡 [{service_name}] Circuit transitioning to HALF-OPEN")
-            circuit.update({
-                "state": "half_open",
-                "consecutive_failures": 0,
-                "last_state_change": current_time,
-                "retry": False
-            })
-
-    # Track requests in half-open state
-    if circuit["state"] == "half_open":
-        half_open_requests = circuit.get("half_open_requests", 0) + 1
-        circuit["half_open_requests"] = half_open_requests
-        
-        if half_open_requests > config["half_open_max_requests"]:
-            print(f"🔴 [{service_name}] Too many failed half-open requests - reopening circuit")
-            circuit.update({
-                "state": "open",
-                "next_retry_time": current_time + config["reset_timeout"],
-                "last_state_change": current_time
-
-            })
-            return {
-                "error": f"Too many half-open requests for {service_name}",
-                "status": "fail_fast",
-                "circuit_state": "open",
-            }
 
-    start_time = time.time()
-    circuit['total_requests'] = circuit['total_requests'] + 1
+def reject_request(service_name, circuit, state):
+    """Count a fail-fast rejection and hand out the circuit's preallocated result"""
+    circuit["rejected_requests"] += 1
+    if state == "open" and not circuit["rejection_logged"]:
+        print(f"🚫 [{service_name}] Circuit OPEN - failing fast")
+        circuit["rejection_logged"] = True
+    return circuit["rejections"][state], None
+
+
+def start_half_open_round(service_name, circuit, current_time):
+    """Move to half-open and start a new round of probes"""
+    print(f"🟡 [{service_name}] Circuit transitioning to HALF-OPEN")
+    circuit.update({
+        "state": "half_open",
+        "consecutive_failures": 0,
+        "last_state_change": current_time,
+        "probes_in_flight": 0,
+        "half_open_successes": 0,
+        "half_open_generation": circuit["half_open_generation"] + 1,
+        "rejection_logged": False
+    })
+
+
+def release_probe(circuit, probe_generation):
+    """Give a half-open probe slot back (ignored if the round already ended)"""
+    if probe_generation is None:
+        return
+
+    with circuit["lock"]:
+        if probe_generation == circuit["half_open_generation"] and circuit["probes_in_flight"] > 0:
+            circuit["probes_in_flight"] = circuit["probes_in_flight"] - 1
+
+
+def open_circuit(service_name, circuit, config, current_time, reason):
+    """Trip the circuit and schedule the next half-open round"""
+    print(f"🪫 [{service_name}] Opening circuit - {reason}")
+    circuit.update({
+        "state": "open",
+        "next_retry_time": current_time + config['reset_timeout'],
+        "last_state_change": current_time,
+        "probes_in_flight": 0,
+        "half_open_successes": 0,
+        "rejection_logged": False
+    })
+
+
+# Defaults every circuit starts from - per-service config only overrides what it sets
+DEFAULT_CIRCUIT_CONFIG = {
+    # How many times a request can fail before the circuit “opens” (stops sending requests temporarily).
+    "max_failures": 5,
+
+    # How long (in seconds) the circuit should stay open before testing again.
+    "reset_timeout": 30,
+
+    # Number of successful requests required to close the circuit again after reopening.
+    "success_threshold": 3,
+
+    # If a response takes longer than this (in seconds), it counts as a “slow” request.
+    "slow_response_threshold": 3.0,
+
+    # None → the slow-response penalty compares the *average* latency to slow_response_threshold.
+    # A number (e.g. 95) → it compares that percentile instead, so tail latency can't hide behind the mean.
+    "slow_response_percentile": None,
+
+    # Latency percentiles cover the last 1-2 of these intervals (seconds).
+    "latency_histogram_interval": 60.0,
+
+    # None → no concurrency cap. True or a dict of AdaptiveConcurrencyLimiter settings
+    # (e.g. {"algorithm": "aimd", "initial_limit": 10, "max_queue": 100}) → per-service adaptive in-flight limit.
+    "adaptive_concurrency": None,
+
+    # A health score (0–100). If it drops below this, the service is considered unhealthy.
+    "health_threshold": 30, 
+
+    # A “warning” level — below this, service is degraded but not yet broken.
+    "degraded_threshold": 70,  
 
+    # How many past requests are tracked to calculate the health score.
+    "window_size": 100,  # Requests to consider for health
+
+    # When the circuit is half-open (testing state), only allow this many trial requests.
+    "half_open_max_requests": 5,
+
+    # Length (in seconds) of the time-based sliding window used by the rate trip rules.
+    "sliding_window_seconds": 10,
+
+    # Rate rules only kick in once the sliding window holds at least this many calls.
+    "minimum_calls": 20,
+
+    # Open if more than this % of calls in the sliding window failed...
+    "failure_rate_threshold": 50,
+
+    # ...or more than this % of them were slower than slow_response_threshold.
+    "slow_call_rate_threshold": 80
+}
+
+
+def get_limiter_for_service(service_name, config):
+    """Get or create the adaptive concurrency limiter for a service (None when disabled)"""
+    limiter = service_limiters.get(service_name)
+    if limiter is None and config.get("adaptive_concurrency"):
+        settings = config["adaptive_concurrency"]
+        limiter = AdaptiveConcurrencyLimiter(**(settings if isinstance(settings, dict) else {}))
+        service_limiters[service_name] = limiter
+    return limiter
+
+
+async def acquire_limiter_slot(service_name, circuit, limiter, probe_generation):
+    """Wait for the service's concurrency limiter - returns a rejection when its queue is full"""
     try:
-        result = await request_func(*args)
-        response_time = time.time() - start_time
-        
+        await limiter.acquire()
+    except ConcurrencyLimitExceeded:
+        release_probe(circuit, probe_generation)
+        return reject_request(service_name, circuit, "concurrency")[0]
+    except BaseException:
+        # Cancelled while queued - don't strand the probe slot
+        release_probe(circuit, probe_generation)
+        raise
+    return None
+
+
+def record_success(service_name, circuit, config, response_time, probe_generation, current_time):
+    """Book a successful request and close the circuit if enough probes passed"""
+    with circuit['lock']:
         # Track successful request
+        circuit['total_requests'] = circuit['total_requests'] + 1
         circuit['success_count'] = circuit['success_count'] + 1
-        circuit['response_times'].append(response_time)
 
-        # Keep only recent response times(we wanna focus on only 100 request)
-        if len(circuit['response_times']) > config['window_size']:
-            circuit['response_times'].pop(0)
+        # Ring buffer overwrites the oldest slot, so we only ever look at the last `window_size` requests
+        circuit['health_window'].record(response_time, True)
+        circuit['time_window'].record(current_time, response_time, True, response_time > config['slow_response_threshold'])
+        circuit['latency_histogram'].record(current_time, response_time)
 
         # Reset consecutive failures on success
         circuit['consecutive_failures'] = 0
@@ -155,66 +324,130 @@ async def enterprise_circuit_breaker(service_name, request_func, *args, config=N
         health_score = calculate_health_score(circuit, config)
         circuit['health_score'] = health_score
 
-        # State transitions on success
-        if circuit['state'] == "half_open":
+        # State transitions on success - only probes of the current half-open round count
+        if circuit['state'] == "half_open" and probe_generation == circuit['half_open_generation']:
 
             # Success in half-open state - check if we should close
-            half_open_successes = circuit.get("half_open_successes", 0) + 1
+            half_open_successes = circuit['half_open_successes'] + 1
             circuit['half_open_successes'] = half_open_successes
 
             if half_open_successes >= config['success_threshold']:
                 print(f"✅ [{service_name}] Service recovered - circuit CLOSED")
-    
+
                 circuit.update({
                    "state": "closed",
                    "last_state_change": current_time,
-                   "half_open_requests": 0,
+                   "probes_in_flight": 0,
                    "half_open_successes": 0 
                 })
 
-        print(f"✅ [{service_name}] Request succeeded | Health: {health_score} | Time: {response_time:.2f}s")
-        return {
-            "data": result,
-            "status": "success",
-            "response_time": response_time,
-            "circuit_state": circuit['state'],
-            "health_score": health_score
-            }
+        # Successful but slow calls can still trip the slow-call rate rule
+        elif circuit['state'] == "closed":
+            trip_reason = check_trip_rules(circuit, config)
+            if trip_reason:
+                open_circuit(service_name, circuit, config, current_time, trip_reason)
 
-    except Exception as e:
-        # Request failed
-        response_time = time.time() - start_time
-        error_type = type(e).__name__
+        return health_score
+
+
+def record_failure(service_name, circuit, config, response_time, error_type, probe_generation, current_time):
+    """Book a failed request and open the circuit if it crossed a limit"""
+    with circuit['lock']:
         error_count = circuit['error_types'].get(error_type, 0) + 1
 
         # Track failure
+        circuit['total_requests'] = circuit['total_requests'] + 1
+
         # This counts all-time total failures for the service.
         circuit['failure_count'] = circuit['failure_count'] + 1
 
         # This counts how many times in a row it has failed.
         circuit['consecutive_failures'] = circuit['consecutive_failures'] + 1
-        
+    
         # current time of failure
         circuit['last_failure_time'] = current_time
 
         # For example: { "TimeoutError": 3, "HTTPStatusError": 5, "ConnectionRefusedError": 2}
         circuit['error_types'][error_type] = error_count
 
+        # Failed requests count against the rolling window too
+        circuit['health_window'].record(response_time, False)
+        circuit['time_window'].record(current_time, response_time, False, response_time > config['slow_response_threshold'])
+        circuit['latency_histogram'].record(current_time, response_time)
+
         # Calculate health score
         health_score = calculate_health_score(circuit, config)
         circuit['health_score'] = health_score
-        print(f"❌ [{service_name}] Request failed: {error_type} | Health: {health_score} 🔋 | Time: {response_time:.2f}s")
+
+        # A failed probe means the service hasn't recovered yet → straight back to open
+        if circuit['state'] == "half_open" and probe_generation == circuit['half_open_generation']:
+            open_circuit(service_name, circuit, config, current_time, "half-open probe failed")
 
         # Check if we should open circuit
-        if (circuit['consecutive_failures'] >= config['max_failures'] or health_score < config['health_threshold']):
-            if circuit['state'] != 'open':
-                print(f"🪫 [{service_name}] Opening circuit - health too low or too many failures")
-                circuit.update({
-                    "state": "open",
-                    "next_retry_time": current_time + config['reset_timeout'],
-                    "last_state_change": current_time
-                })
-        
+        elif circuit['state'] == 'closed':
+            if circuit['consecutive_failures'] >= config['max_failures'] or health_score < config['health_threshold']:
+                open_circuit(service_name, circuit, config, current_time, "health too low or too many failures")
+            else:
+                # Interleaved failures never build a streak - the sliding-window rate rules catch those
+                trip_reason = check_trip_rules(circuit, config)
+                if trip_reason:
+                    open_circuit(service_name, circuit, config, current_time, trip_reason)
+
+        return health_score
+
+
+async def enterprise_circuit_breaker(service_name, request_func, *args, config=None):
+    """Enterprise-grade circuit breaker for any service"""
+
+    # Service-specific settings override the defaults
+    config = {**DEFAULT_CIRCUIT_CONFIG, **(config or {})}
+
+    # 👉 “Give me the latest status record for that service — create one if it doesn’t exist.”
+    circuit = get_circuit_for_service(service_name, config)
+    current_time = time.time()
+
+    # Circuit state machine - decided synchronously before we ever await
+    rejection, probe_generation = admit_request(service_name, circuit, config, current_time)
+    if rejection is not None:
+        return rejection
+
+    # Opt-in adaptive concurrency limit - past the limit we queue here instead of piling onto the service
+    limiter = get_limiter_for_service(service_name, config)
+    if limiter is not None:
+        rejection = await acquire_limiter_slot(service_name, circuit, limiter, probe_generation)
+        if rejection is not None:
+            return rejection
+
+    start_time = time.time()
+    limiter_sample = None  # (latency, failed?) once the request finished - cancelled calls give no sample
+
+    try:
+        result = await request_func(*args)
+        current_time = time.time()
+        response_time = current_time - start_time
+        limiter_sample = (response_time, False)
+
+        health_score = record_success(service_name, circuit, config, response_time, probe_generation, current_time)
+
+        print(f"✅ [{service_name}] Request succeeded | Health: {health_score} | Time: {response_time:.2f}s")
+        return {
+            "data": result,
+            "status": "success",
+            "response_time": response_time,
+            "circuit_state": circuit['state'],
+            "health_score": health_score
+            }
+
+    except Exception as e:
+        # Request failed
+        current_time = time.time()
+        response_time = current_time - start_time
+        limiter_sample = (response_time, True)
+        error_type = type(e).__name__
+
+        health_score = record_failure(service_name, circuit, config, response_time, error_type, probe_generation, current_time)
+        print(f"❌ [{service_name}] Request failed: {error_type} | Health: {health_score} 🔋 | Time: {response_time:.2f}s")
+
         return {
             "error": str(e), # error string
             "status": "failure",
@@ -223,7 +456,242 @@ async def enterprise_circuit_breaker(service_name, request_func, *args, config=N
             'health_score': health_score,
             "error_type": error_type
         }
-    
+
+    finally:
+        # Runs on success, failure and cancellation - a probe slot can never leak
+        release_probe(circuit, probe_generation)
+        if limiter is not None:
+            limiter.release(*(limiter_sample or (None, False)))
+
+
+# Hedging defaults for CircuitBreakerTransport(hedging=...)
+DEFAULT_HEDGING = {
+    # Only idempotent methods are ever sent twice
+    "methods": frozenset(["GET", "HEAD", "OPTIONS"]),
+
+    # Hedge once the first attempt is slower than this percentile of the circuit's recent latency
+    "percentile": 95,
+
+    # ...but never sooner than this (seconds)
+    "min_delay": 0.005,
+
+    # Don't guess a p95 from a handful of requests
+    "min_samples": 20,
+
+    # Extra load allowed: each hedgeable request earns this fraction of a hedge (0.05 → ≤ 5% extra requests)
+    "budget": 0.05,
+
+    # Unused hedge tokens a quiet service can bank for a burst
+    "max_burst": 10,
+}
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised by CircuitBreakerTransport when a call is rejected without hitting the network"""
+
+    # Fail fast - RetryPolicy doesn't back off and try again into an open circuit
+    retryable = False
+
+    def __init__(self, service_name, rejection, request=None):
+        super().__init__(rejection["error"], request=request)
+        self.service_name = service_name
+        self.rejection = rejection
+
+
+# 👉 Circuit key builders: which requests share one circuit?
+def circuit_key_by_host(request):
+    """One circuit per scheme + host + port"""
+    url = request.url
+    return f"{url.scheme}://{url.netloc.decode('ascii')}"
+
+
+def circuit_key_by_route(request):
+    """One circuit per host + path (query string ignored)"""
+    return f"{circuit_key_by_host(request)}{request.url.path}"
+
+
+CIRCUIT_KEYS = {
+    "host": circuit_key_by_host,
+    "route": circuit_key_by_route,
+}
+
+
+class CircuitBreakerTransport(httpx.AsyncBaseTransport):
+    """httpx transport that runs every request through the enterprise circuit breaker
+
+    Wraps a real AsyncHTTPTransport, so one long-lived AsyncClient keeps its pooled
+    TLS / HTTP/2 connections while each host (or route) gets its own circuit:
+
+        client = httpx.AsyncClient(transport=CircuitBreakerTransport(http2=True))
+
+    Pass `hedging=True` (or a dict overriding DEFAULT_HEDGING) to hedge idempotent
+    requests: if the first attempt hasn't answered by the circuit's observed p95, a
+    second attempt goes out and whichever answers first wins. A single request can
+    opt out with `extensions={"hedge": False}`.
+    """
+
+    def __init__(
+        self,
+        transport=None,
+        circuit_key="host",
+        config=None,
+        service_configs=None,
+        failure_status_codes=None,
+        hedging=None,
+        **transport_kwargs
+    ):
+        # The real network transport we delegate to (owns the connection pool)
+        self._transport = transport or httpx.AsyncHTTPTransport(**transport_kwargs)
+
+        # "host", "route" or any callable(request) -> service name
+        self._circuit_key = CIRCUIT_KEYS[circuit_key] if isinstance(circuit_key, str) else circuit_key
+
+        # Shared overrides for every circuit, plus optional per-service overrides on top
+        self._config = {**DEFAULT_CIRCUIT_CONFIG, **(config or {})}
+        self._service_configs = service_configs or {}
+        self._merged_configs = {}
+
+        # Status codes that count as failures even though a response came back (5xx + 429 by default)
+        self._failure_status_codes = frozenset(failure_status_codes) if failure_status_codes is not None else frozenset([429, *range(500, 600)])
+
+        # Hedging settings (None = off) and per-service hedge token buckets
+        self._hedging = {**DEFAULT_HEDGING, **(hedging if isinstance(hedging, dict) else {})} if hedging else None
+        self._hedge_tokens = {}
+        self.hedge_stats = {"hedgeable": 0, "hedges_sent": 0, "hedges_won": 0, "skipped_budget": 0}
+
+    def config_for(self, service_name):
+        """Merged config for a circuit (cached, so the hot path doesn't rebuild dicts)"""
+        config = self._merged_configs.get(service_name)
+        if config is None:
+            config = {**self._config, **self._service_configs.get(service_name, {})}
+            self._merged_configs[service_name] = config
+        return config
+
+    async def handle_async_request(self, request):
+        service_name = self._circuit_key(request)
+        config = self.config_for(service_name)
+        circuit = get_circuit_for_service(service_name, config)
+
+        rejection, probe_generation = admit_request(service_name, circuit, config, time.time())
+        if rejection is not None:
+            raise CircuitOpenError(service_name, rejection, request=request)
+
+        limiter = get_limiter_for_service(service_name, config)
+        if limiter is not None:
+            rejection = await acquire_limiter_slot(service_name, circuit, limiter, probe_generation)
+            if rejection is not None:
+                raise CircuitOpenError(service_name, rejection, request=request)
+
+        start_time = time.perf_counter()
+        limiter_sample = None
+
+        try:
+            try:
+                hedge_delay = self.hedge_delay(request, service_name, circuit, config)
+                if hedge_delay is None:
+                    response = await self._transport.handle_async_request(request)
+                else:
+                    response = await self._send_hedged(request, service_name, hedge_delay, limiter)
+            except Exception as e:
+                response_time = time.perf_counter() - start_time
+                limiter_sample = (response_time, True)
+                record_failure(service_name, circuit, config, response_time, type(e).__name__, probe_generation, time.time())
+                raise
+
+            # Latency = time to response headers (the body is streamed by the caller)
+            response_time = time.perf_counter() - start_time
+            failed = response.status_code in self._failure_status_codes
+            limiter_sample = (response_time, failed)
+
+            if failed:
+                record_failure(service_name, circuit, config, response_time, f"HTTP {response.status_code}", probe_generation, time.time())
+            else:
+                record_success(service_name, circuit, config, response_time, probe_generation, time.time())
+
+            # Let callers see what the breaker thinks without another lookup
+            response.extensions["circuit_state"] = circuit['state']
+            response.extensions["health_score"] = circuit['health_score']
+            return response
+
+        finally:
+            release_probe(circuit, probe_generation)
+            if limiter is not None:
+                limiter.release(*(limiter_sample or (None, False)))
+
+    def hedge_delay(self, request, service_name, circuit, config):
+        """Seconds to wait before hedging this request, or None when it mustn't be hedged"""
+        hedging = self._hedging
+        if hedging is None or request.extensions.get("hedge") is False or request.method not in hedging["methods"]:
+            return None
+
+        # Never add load to a service that's recovering or already struggling
+        if circuit['state'] != "closed" or circuit['health_score'] < config['degraded_threshold']:
+            return None
+
+        histogram = circuit['latency_histogram']
+        if histogram.count() < hedging["min_samples"]:
+            return None
+
+        # Every hedgeable request earns `budget` of a hedge (0.05 → at most 5% extra load)
+        self.hedge_stats["hedgeable"] += 1
+        tokens = self._hedge_tokens.get(service_name, 0.0) + hedging["budget"]
+        self._hedge_tokens[service_name] = min(tokens, hedging["max_burst"])
+
+        return max(hedging["min_delay"], histogram.percentile(hedging["percentile"]))
+
+    async def _send_hedged(self, request, service_name, delay, limiter):
+        """First attempt now, a second one after `delay` (if budget allows) - first response wins"""
+        primary = asyncio.ensure_future(self._transport.handle_async_request(request))
+        attempts = [primary]
+        hedge_has_slot = False
+
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if done:
+                return primary.result()
+
+            # Spend a hedge token - no token (or no free limiter slot) → just keep waiting on the first attempt
+            if self._hedge_tokens[service_name] < 1 or (limiter is not None and not limiter.try_acquire()):
+                self.hedge_stats["skipped_budget"] += 1
+                return await primary
+
+            hedge_has_slot = limiter is not None
+            self._hedge_tokens[service_name] -= 1
+            self.hedge_stats["hedges_sent"] += 1
+            hedge = asyncio.ensure_future(self._transport.handle_async_request(request))
+            attempts.append(hedge)
+
+            pending = set(attempts)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in (primary, hedge):
+                    if attempt in done and attempt.exception() is None:
+                        if attempt is hedge:
+                            self.hedge_stats["hedges_won"] += 1
+                        return attempt.result()
+                    if attempt in done:
+                        error = error or attempt.exception()
+
+            # Both attempts failed - surface the first failure
+            raise error
+
+        finally:
+            # The loser gets cancelled; if it answered in the same instant, close its response
+            for attempt in attempts:
+                if not attempt.done():
+                    attempt.cancel()
+            await asyncio.gather(*attempts, return_exceptions=True)
+            winner = next((a for a in attempts if a.done() and not a.cancelled() and a.exception() is None), None)
+            for attempt in attempts:
+                if attempt is not winner and attempt.done() and not attempt.cancelled() and attempt.exception() is None:
+                    await attempt.result().aclose()
+            if hedge_has_slot:
+                limiter.release()
+
+    async def aclose(self):
+        await self._transport.aclose()
+
 """⚙️ What You Just Understood (and You’re Right)
 
     ✅ failure_count = long-term memory (historical record)
@@ -237,11 +705,13 @@ async def enterprise_circuit_breaker(service_name, request_func, *args, config=N
 
 def calculate_health_score(circuit, config):
     """Calculate health score 0-100 based on recent performance"""
-    if circuit['total_requests'] == 0:
+    window = circuit['health_window']
+    if window.count == 0:
         return 100
 
-    # Base score from success rate, Example: 8 successes / 10 requests → success_rate = 0.8
-    success_rate = circuit['success_count'] / circuit['total_requests'] # thats good so if 90 passes out of 100 its has a success rate of 0.9/1.0
+    # Base score from success rate over the last `window_size` requests only, Example: 8 successes / 10 requests → success_rate = 0.8
+    # (lifetime counters would let an old service hide a fresh outage behind thousands of past successes)
+    success_rate = window.success_rate() # thats good so if 90 passes out of 100 its has a success rate of 0.9/1.0
     base_score = success_rate * 80 # 80% weight to success rate
     
     # penalty for recent failures
@@ -249,8 +719,13 @@ def calculate_health_score(circuit, config):
 
     time_penalty = 0
 
-    if circuit['response_times']:
-        avg_time = statistics.mean(circuit['response_times'])
+    if window.count:
+        if config.get('slow_response_percentile') is None:
+            avg_time = window.mean_latency() # running sum / count → O(1) for any window size
+        else:
+            # e.g. p95 - "5% of our users wait longer than this"
+            avg_time = circuit['latency_histogram'].percentile(config['slow_response_percentile'])
+
         if avg_time > config['slow_response_threshold']: # if avg_time > 3
             # Penalize slow response
             time_penalty = min((avg_time - config["slow_response_threshold"]) * 10, 10)
@@ -258,16 +733,39 @@ def calculate_health_score(circuit, config):
     health_score = max(0, base_score - failure_penalty - time_penalty)
     return round(health_score)
 
-async def mock_api_request(url, should_fail=False, delay=0):
-    """Mock API request for testing"""
+def get_latency_percentiles(service_name):
+    """p50 / p95 / p99 / max (seconds) for a service's recent requests"""
+    return get_circuit_for_service(service_name)['latency_histogram'].percentiles()
+
+
+def check_trip_rules(circuit, config):
+    """Sliding-window trip rules - returns why the circuit should open, or None"""
+    window = circuit['time_window']
+    calls = window.total_requests
+
+    # Too few calls to judge (e.g. 1 failure out of 2 requests isn't a 50% outage)
+    if calls < config['minimum_calls']:
+        return None
+
+    failure_rate = window.failure_rate() * 100
+    if failure_rate > config['failure_rate_threshold']:
+        return f"failure rate {failure_rate:.0f}% over the last {window.window_seconds}s ({calls} calls)"
+
+    slow_call_rate = window.slow_call_rate() * 100
+    if slow_call_rate > config['slow_call_rate_threshold']:
+        return f"slow-call rate {slow_call_rate:.0f}% over the last {window.window_seconds}s ({calls} calls)"
+
+    return None
+
+async def mock_api_request(client, url, should_fail=False, delay=0):
+    """Mock API request for testing (reuses the caller's pooled client)"""
     if delay > 0:
         await asyncio.sleep(delay)
 
     if should_fail:
         raise httpx.HTTPStatusError(f"Mock error for {url}", request=None, response=None)
 
-    async with httpx.AsyncClient(http2=True) as client:
-        return await client.get(url)
+    return await client.get(url)
 
 
 async def test_enterprise_circuit_breaker():
@@ -306,6 +804,10 @@ async def test_enterprise_circuit_breaker():
 
     print("🚀 Starting Enterprise Circuit Breaker Test...")
 
+    # Shared pooled client from the registry - TLS sessions and HTTP/2 connections get reused (and pre-warmed)
+    client = client_registry.get_client(http2=True)
+    await client_registry.prewarm(client, "https://httpbin.org/get")
+
     for service_name, service_config in services.items():
         print(f"\n🔧 Testing Service: {service_name}")
 
@@ -315,24 +817,64 @@ async def test_enterprise_circuit_breaker():
             result = await enterprise_circuit_breaker(
                 service_name,
                 mock_api_request,
+                client,
                 scenario['url'],
                 scenario['fail'],
                 scenario['delay'],
                 config=service_config['config']
             )
 
-            if result is None:
-                continue
             print(f"   Status: {result['status']} | Circuit: {result['circuit_state']} | Health: {result.get('health_score', 'N/A')}")
             
         # Print final status
         print(f"\n📊 ENTERPRISE CIRCUIT BREAKER SUMMARY:")
         for service_name, circuit in enterprise_circuits.items():
+            latency = circuit['latency_histogram'].percentiles()
             print(f"   🔌 {service_name}: {circuit['state']} | Health: {circuit['health_score']} | Total Requests: {circuit['total_requests']}")
+            print(f"      ⏱️ p50: {latency['p50']:.2f}s | p95: {latency['p95']:.2f}s | p99: {latency['p99']:.2f}s | max: {latency['max']:.2f}s")
+
+
+async def test_circuit_breaker_transport():
+    """Same breaker, but built into the client's transport - one circuit per host"""
+    transport = CircuitBreakerTransport(
+        circuit_key="host",
+        config={"max_failures": 3, "reset_timeout": 15},
+        hedging={"budget": 0.05},  # GETs slower than the host's p95 get one backup attempt (≤ 5% extra load)
+        http2=True,
+    )
+
+    print("\n🚀 Starting Circuit Breaker Transport Test...")
+
+    async with httpx.AsyncClient(transport=transport, timeout=httpx.Timeout(10.0)) as client:
+        urls = [
+            "https://httpbin.org/status/200",
+            "https://httpbin.org/status/500",  # 5xx counts as a failure
+            "https://httpbin.org/status/429",  # so does 429
+            "https://httpbin.org/status/503",  # Should open circuit
+            "https://httpbin.org/status/200",  # Fail fast - never leaves the process
+        ]
+
+        for url in urls:
+            try:
+                response = await client.get(url)
+                print(f"   {url} → {response.status_code} | Circuit: {response.extensions['circuit_state']} | Health: {response.extensions['health_score']}")
+            except CircuitOpenError as e:
+                print(f"   {url} → 🚫 {e.rejection['status']} ({e.service_name})")
+            except httpx.RequestError as e:
+                print(f"   {url} → 🔥 {type(e).__name__}")
+
+
+async def main():
+    try:
+        await test_enterprise_circuit_breaker()
+        await test_circuit_breaker_transport()
+        print("\n📊 Cold vs warm latency:", client_registry.stats())
+    finally:
+        await client_registry.shutdown()
 
 
 if __name__ == "__main__":
-    asyncio.run(test_enterprise_circuit_breaker())
+    asyncio.run(main())
 
 # Simple version (your words)
 
@@ -1,43 +1,50 @@
-# it’s what lets Python send HTTP requests (like visiting a website or calling an API).
-import httpx 
-
 import asyncio
 
+from client_registry import client_registry
+
 
 async def stealth_get():
 
-    # Create an asynchronous HTTP client using 'httpx.AsyncClient'
-    async with httpx.AsyncClient(http2=True, timeout=20, follow_redirects=True) as client: # 'http2=True' enables the modern HTTP/2 protocol for faster and more efficient requests
+    # Shared, long-lived 'httpx.AsyncClient' from the registry - reused by every call with the same config
+    client = client_registry.get_client(http2=True, timeout=20, follow_redirects=True) # 'http2=True' enables the modern HTTP/2 protocol for faster and more efficient requests
+
+    response = await client.get(
+        "https://1xbet.whoscored.com/",
+        headers={
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+            
+            # It means: “I accept JSON, plain text, or anything (*/*).”
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+
+            # 👉 This says your browser prefers English (US).
+            "Accept-Language": "en-US,en;q=0.9",
 
-        response = await client.get(
-            "https://1xbet.whoscored.com/",
-            headers={
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-                
-                # It means: “I accept JSON, plain text, or anything (*/*).”
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            # 👉 This tells the server which page you came from.
+            "Referer": "https://google.com"
+        }
 
-                # 👉 This says your browser prefers English (US).
-                "Accept-Language": "en-US,en;q=0.9",
+    )
 
-                # 👉 This tells the server which page you came from.
-                "Referer": "https://google.com"
-            }
+    # show cookies set by server (if any)
+    print("✅ cookies: ", response.cookies.jar, "\n")
+    print(f"✅ Status: {response.status_code} \n")
+    print(f"✅ headers: ", response.headers, "\n")
 
-        )
+    # print a safe excerpt of the body for diagnosis
+    print("✅ body snippet: ", response.text[:100].replace("\n", " "), "\n")
 
-        # show cookies set by server (if any)
-        print("✅ cookies: ", response.cookies.jar, "\n")
-        print(f"✅ Status: {response.status_code} \n")
-        print(f"✅ headers: ", response.headers, "\n")
+    [print(f"  {k}: {v}") for k,v in response.headers.items()]
 
-        # print a safe excerpt of the body for diagnosis
-        print("✅ body snippet: ", response.text[:100].replace("\n", " "), "\n")
+async def main():
+    try:
+        await stealth_get()
+        print("📊 Cold vs warm latency:", client_registry.stats())
+    finally:
+        await client_registry.shutdown()
 
-        [print(f"  {k}: {v}") for k,v in response.headers.items()]
 
 if __name__ == "__main__":
-    asyncio.run(stealth_get())
+    asyncio.run(main())
 
 
 
@@ -0,0 +1,122 @@
+import argparse
+import asyncio
+import importlib
+import time
+
+import httpx
+
+from latency_histogram import LatencyHistogram
+
+# async.py can't be imported with a plain `import async` (it's a keyword)
+breaker = importlib.import_module("async")
+
+
+class FakeServer:
+    """In-process stand-in for a service that can only work on `capacity` requests at once.
+
+    Requests beyond capacity queue inside the "server"; once that backlog is full it answers 503,
+    like an overloaded upstream would. Rejecting takes `reject_time` too - an instant, synchronous
+    503 would let the clients retry in a tight loop that never yields to the server's own work.
+    """
+
+    def __init__(self, capacity, service_time, max_backlog, reject_time=0.001):
+        self.workers = asyncio.Semaphore(capacity)
+        self.service_time = service_time
+        self.reject_time = reject_time
+        self.max_backlog = max_backlog
+        self.backlog = 0
+        self.peak_backlog = 0
+
+    async def handle(self, request):
+        if self.backlog >= self.max_backlog:
+            await asyncio.sleep(self.reject_time)
+            return httpx.Response(503)
+
+        self.backlog += 1
+        self.peak_backlog = max(self.peak_backlog, self.backlog)
+        try:
+            async with self.workers:
+                self.backlog -= 1
+                await asyncio.sleep(self.service_time)
+        except BaseException:
+            self.backlog -= 1
+            raise
+        return httpx.Response(200)
+
+
+async def run_load(limiter_settings, args):
+    """Hammer the fake server with `args.clients` closed-loop clients for `args.duration` seconds"""
+    breaker.enterprise_circuits.clear()
+    breaker.service_limiters.clear()
+
+    server = FakeServer(args.capacity, args.service_time, args.max_backlog, args.reject_time)
+    transport = breaker.CircuitBreakerTransport(
+        transport=httpx.MockTransport(server.handle),
+        config={
+            # Keep the breaker itself out of the way - we're measuring the limiter
+            "max_failures": 10**9,
+            "health_threshold": -1,
+            "failure_rate_threshold": 101,
+            "slow_call_rate_threshold": 101,
+            "adaptive_concurrency": limiter_settings,
+        },
+    )
+
+    latencies = LatencyHistogram(interval=3600)
+    counts = {"ok": 0, "errors": 0, "rejected": 0}
+    deadline = time.perf_counter() + args.duration
+
+    async def client_loop(client):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await client.get("http://fake-service/work")
+            except breaker.CircuitOpenError:
+                counts["rejected"] += 1
+                continue
+            latencies.record(0.0, time.perf_counter() - start)
+            counts["ok" if response.status_code == 200 else "errors"] += 1
+
+    async with httpx.AsyncClient(transport=transport) as client:
+        await asyncio.gather(*[client_loop(client) for _ in range(args.clients)])
+
+    limiter = breaker.service_limiters.get("http://fake-service")
+    return {
+        "throughput": counts["ok"] / args.duration,
+        "errors": counts["errors"],
+        "rejected": counts["rejected"],
+        "latency": latencies.percentiles(),
+        "peak_backlog": server.peak_backlog,
+        "limiter": limiter.stats() if limiter else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Adaptive concurrency limiter vs. an overloaded fake service")
+    parser.add_argument("--capacity", type=int, default=20, help="requests the fake service works on at once")
+    parser.add_argument("--service-time", type=float, default=0.01, help="seconds per request at the service")
+    parser.add_argument("--max-backlog", type=int, default=50, help="queued requests before the service answers 503")
+    parser.add_argument("--reject-time", type=float, default=0.001, help="seconds the service takes to answer a 503")
+    parser.add_argument("--clients", type=int, default=200, help="concurrent closed-loop clients")
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per scenario")
+    args = parser.parse_args()
+
+    scenarios = {
+        "no limiter": None,
+        "aimd": {"algorithm": "aimd", "initial_limit": 10},
+        "gradient": {"algorithm": "gradient", "initial_limit": 10},
+    }
+
+    print(f"🏭 Fake service: capacity {args.capacity} | {args.service_time * 1000:.0f} ms/request | backlog {args.max_backlog} → 503")
+    print(f"👥 {args.clients} clients for {args.duration:.0f}s per scenario\n")
+
+    for name, settings in scenarios.items():
+        result = asyncio.run(run_load(settings, args))
+        latency = result["latency"]
+        print(f"🔧 {name}")
+        print(f"   ✅ {result['throughput']:.0f} ok/s | ❌ 503s: {result['errors']} | 🚫 rejected: {result['rejected']} | server backlog peak: {result['peak_backlog']}")
+        print(f"   ⏱️ p50 {latency['p50'] * 1000:.1f} ms | p99 {latency['p99'] * 1000:.1f} ms")
+        if result["limiter"]:
+            stats = result["limiter"]
+            print(f"   🎚️ limit {stats['limit']} | avg queue wait {stats['avg_queue_wait'] * 1000:.1f} ms")
+        print()
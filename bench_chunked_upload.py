@@ -0,0 +1,62 @@
+import argparse
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+
+import httpx
+
+from chunked_upload import ChunkedUploader, UploadIncomplete
+from retry_policy import RetryPolicy
+from upload_server import UploadServer
+
+
+async def run(args):
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "artifact.bin")
+        with open(path, "wb") as file:
+            for _ in range(args.size_mb):
+                file.write(os.urandom(1024 * 1024))
+        with open(path, "rb") as file:
+            expected = hashlib.sha256(file.read()).hexdigest()
+
+        print(f"📦 {args.size_mb} MB file | {args.part_mb} MB parts | stand-in server accepts {args.per_request_mbps:.0f} MB/s per request")
+        print(f"   {'concurrency':>11} | {'seconds':>8} | {'MB/s':>8} | ok")
+
+        baseline = None
+        for concurrency in args.concurrency:
+            server = UploadServer(os.path.join(folder, f"server_{concurrency}"), per_request_mbps=args.per_request_mbps)
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server), base_url="http://uploads", timeout=60.0) as client:
+                uploader = ChunkedUploader(client, "http://uploads", part_size=args.part_mb * 1024 * 1024, concurrency=concurrency)
+                start = time.perf_counter()
+                result = await uploader.upload(path)
+                elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"   {concurrency:>11} | {elapsed:>8.2f} | {args.size_mb / elapsed:>8.1f} | {'✅' if result['sha256'] == expected else '❌'} ({baseline / elapsed:.1f}x)")
+
+        # Interrupted upload: no retries and a flaky server, then resume against the same session
+        print(f"\n🔌 Resume: {args.failure_rate:.0%} of part uploads fail and nothing is retried")
+        server = UploadServer(os.path.join(folder, "server_resume"), per_request_mbps=args.per_request_mbps, failure_rate=args.failure_rate, seed=1)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server), base_url="http://uploads", timeout=60.0) as client:
+            no_retries = RetryPolicy(max_attempts=1)
+            uploader = ChunkedUploader(client, "http://uploads", part_size=args.part_mb * 1024 * 1024, concurrency=max(args.concurrency), retry_policy=no_retries)
+            try:
+                await uploader.upload(path)
+            except UploadIncomplete as e:
+                print(f"   first run: {len(e.failed)} part(s) failed, progress saved")
+
+            server.failure_rate = 0.0
+            result = await uploader.upload(path)
+            print(f"   second run: resumed {result['parts_resumed']} part(s), sent {result['parts_sent']} | {'✅' if result['sha256'] == expected else '❌'}")
+            print(f"   part requests in total: {server.part_requests} for {result['parts']} parts")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chunked upload throughput vs. part concurrency, plus an interrupted-upload resume")
+    parser.add_argument("--size-mb", type=int, default=128)
+    parser.add_argument("--part-mb", type=int, default=8)
+    parser.add_argument("--per-request-mbps", type=float, default=40.0, help="how fast the stand-in server accepts one request body (MB/s)")
+    parser.add_argument("--failure-rate", type=float, default=0.3)
+    parser.add_argument("--concurrency", type=lambda value: [int(n) for n in value.split(",")], default=[1, 2, 4, 8])
+    asyncio.run(run(parser.parse_args()))
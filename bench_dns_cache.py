@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+import socket
+import time
+
+import httpcore
+import httpx
+
+from dns_cache import CachingResolver, ResolvingTransport, StaticResolver
+
+# Documentation addresses (RFC 3849 / RFC 5737) - nothing here touches the real network
+IPV6 = "2001:db8::10"
+IPV4 = "192.0.2.10"
+
+RESPONSE = [b"HTTP/1.1 200 OK\r\n", b"Content-Type: text/plain\r\n", b"Content-Length: 2\r\n", b"Connection: close\r\n", b"\r\n", b"ok"]
+
+
+class FakeNetwork(httpcore.AsyncNetworkBackend):
+    """Connects to any address in `connect_time` and answers 200 - except `blackholed` ones, which never answer"""
+
+    def __init__(self, connect_time=0.002, blackholed=()):
+        self.connect_time = connect_time
+        self.blackholed = set(blackholed)
+        self.attempts = []
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        self.attempts.append(host)
+        if host in self.blackholed:
+            # A broken IPv6 route: the SYN just disappears
+            await asyncio.sleep(timeout or 3600)
+            raise httpcore.ConnectTimeout(f"{host} didn't answer")
+        await asyncio.sleep(self.connect_time)
+        # Connection: close → every request makes a fresh connection, and so a fresh resolve()
+        return await httpcore.AsyncMockBackend(RESPONSE).connect_tcp(host, port)
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds)
+
+
+def check(label, ok, detail):
+    print(f"   {'✅' if ok else '❌'} {label:<24} {detail}")
+    return ok
+
+
+async def cache_hits(args):
+    """Sequential requests to one host: one DNS query, the rest are cache hits"""
+    table = StaticResolver({"api.example.com": [IPV4]}, delay=args.dns_delay)
+    transport = ResolvingTransport(resolver=table, backend=FakeNetwork())
+    async with httpx.AsyncClient(transport=transport) as client:
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            (await client.get("http://api.example.com/")).raise_for_status()
+        elapsed = time.perf_counter() - start
+    stats = transport.resolver.stats
+    return check("cache hits", table.lookups == 1 and stats["hits"] == args.requests - 1, f"{args.requests} requests, {table.lookups} lookup, {stats['hits']} hits, {elapsed * 1000:.0f} ms (uncached: ≥{args.requests * args.dns_delay * 1000:.0f} ms of DNS)")
+
+
+async def coalescing(args):
+    """A cold burst: every connection needs the name at once - one query answers them all"""
+    table = StaticResolver({"api.example.com": [IPV4]}, delay=args.dns_delay)
+    transport = ResolvingTransport(resolver=table, backend=FakeNetwork())
+    async with httpx.AsyncClient(transport=transport) as client:
+        responses = await asyncio.gather(*(client.get("http://api.example.com/") for _ in range(args.requests)))
+    stats = transport.resolver.stats
+    ok = all(response.status_code == 200 for response in responses) and table.lookups == 1
+    return check("coalescing", ok, f"{args.requests} concurrent requests, {table.lookups} lookup, {stats['coalesced']} coalesced")
+
+
+async def stale_on_error(args):
+    """The DNS server goes down after the answer expired - the stale answer keeps requests working"""
+    table = StaticResolver({"api.example.com": [IPV4]}, ttl=0.05)
+    resolver = CachingResolver(table, stale_ttl=60.0)
+    async with httpx.AsyncClient(transport=ResolvingTransport(resolver=resolver, backend=FakeNetwork())) as client:
+        (await client.get("http://api.example.com/")).raise_for_status()
+        await asyncio.sleep(0.1)
+        table.table["api.example.com"] = socket.gaierror(socket.EAI_AGAIN, "Temporary failure in name resolution")
+        response = await client.get("http://api.example.com/")
+    ok = response.status_code == 200 and resolver.stats["stale_served"] == 1
+    return check("stale on error", ok, f"resolver failing, {response.status_code} from the stale answer ({resolver.stats['stale_served']} served stale)")
+
+
+async def happy_eyeballs(args):
+    """IPv6 first, but its route is broken - IPv4 gets its turn after the head start, not after a connect timeout"""
+    network = FakeNetwork(blackholed=[IPV6])
+    transport = ResolvingTransport(resolver=StaticResolver({"api.example.com": [IPV6, IPV4]}), backend=network, attempt_delay=args.attempt_delay)
+    async with httpx.AsyncClient(transport=transport, timeout=10.0) as client:
+        start = time.perf_counter()
+        response = await client.get("http://api.example.com/")
+        elapsed = time.perf_counter() - start
+    ok = response.status_code == 200 and network.attempts == [IPV6, IPV4] and elapsed < 1.0
+    return check("IPv6 / IPv4 racing", ok, f"tried {network.attempts}, connected in {elapsed * 1000:.0f} ms ({transport.backend.stats['raced']} raced)")
+
+
+async def run(args):
+    print(f"🌐 Caching resolver against StaticResolver + a fake network ({args.dns_delay * 1000:.0f} ms per DNS query)")
+    results = [await case(args) for case in (cache_hits, coalescing, stale_on_error, happy_eyeballs)]
+    return all(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline checks of the caching DNS resolver: cache hits, coalescing, stale-on-error, happy eyeballs")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--dns-delay", type=float, default=0.02)
+    parser.add_argument("--attempt-delay", type=float, default=0.25)
+    raise SystemExit(0 if asyncio.run(run(parser.parse_args())) else 1)
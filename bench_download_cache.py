@@ -0,0 +1,84 @@
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import tempfile
+import time
+
+import httpx
+
+from download_cache import DownloadCache
+
+
+class ImageServer:
+    """ASGI app serving /images/<n> with strong ETags and If-None-Match → 304 (counts body bytes sent)"""
+
+    def __init__(self, images):
+        self.images = images
+        self.bytes_sent = 0
+        self.responses = {200: 0, 304: 0}
+
+    async def __call__(self, scope, receive, send):
+        index = int(scope["path"].rsplit("/", 1)[1])
+        data = self.images[index]
+        etag = '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+
+        if headers.get("if-none-match") == etag:
+            self.responses[304] += 1
+            await send({"type": "http.response.start", "status": 304, "headers": [(b"etag", etag.encode())]})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        self.responses[200] += 1
+        self.bytes_sent += len(data)
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"etag", etag.encode()), (b"content-type", b"image/jpeg"), (b"content-length", str(len(data)).encode())]})
+        await send({"type": "http.response.body", "body": data})
+
+
+async def sync(client, cache, server, count, folder):
+    server.bytes_sent = 0
+    server.responses = {200: 0, 304: 0}
+    start = time.perf_counter()
+    results = await asyncio.gather(*(cache.fetch(client, f"http://images/images/{index}", os.path.join(folder, f"{index}.jpg")) for index in range(count)))
+    elapsed = time.perf_counter() - start
+    statuses = {}
+    for result in results:
+        statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+    return elapsed, statuses
+
+
+async def run(args):
+    rng = random.Random(1)
+    # A share of the catalogue is the same picture under several URLs (placeholders, variants)
+    unique = [rng.randbytes(args.image_kb * 1024) for _ in range(int(args.images * (1 - args.duplicate_share)))]
+    images = unique + [rng.choice(unique) for _ in range(args.images - len(unique))]
+    server = ImageServer(images)
+    total_mb = sum(len(image) for image in images) / 1024 / 1024
+
+    print(f"🖼️  Syncing {args.images} images ({total_mb:.0f} MB, {args.duplicate_share:.0%} duplicates), {args.changed_share:.0%} changed between runs")
+    print(f"   {'run':>12} | {'seconds':>8} | {'MB sent':>8} | {'200':>5} | {'304':>5} | statuses")
+
+    with tempfile.TemporaryDirectory() as folder:
+        cache = DownloadCache(os.path.join(folder, ".cache"))
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server)) as client:
+            for label in ("first", "nightly"):
+                elapsed, statuses = await sync(client, cache, server, args.images, folder)
+                print(f"   {label:>12} | {elapsed:>8.2f} | {server.bytes_sent / 1024 / 1024:>8.1f} | {server.responses[200]:>5} | {server.responses[304]:>5} | {statuses}")
+                # Some images get re-uploaded before the next night
+                for index in rng.sample(range(args.images), int(args.images * args.changed_share)):
+                    images[index] = rng.randbytes(args.image_kb * 1024)
+
+        stats = await cache.stats()
+        print(f"   index: {stats['urls']} URLs → {stats['blobs']} blobs, {stats['stored_bytes'] / 1024 / 1024:.0f} MB stored for {stats['logical_bytes'] / 1024 / 1024:.0f} MB of files")
+        await cache.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Nightly image sync with and without the content-addressed download cache")
+    parser.add_argument("--images", type=int, default=500)
+    parser.add_argument("--image-kb", type=int, default=200)
+    parser.add_argument("--duplicate-share", type=float, default=0.2)
+    parser.add_argument("--changed-share", type=float, default=0.05)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,65 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from download_writer import ChunkCoalescer, DownloadWriter
+
+
+async def network_chunks(total, chunk_size):
+    """Stand-in for response.aiter_raw(): `total` bytes in chunk_size pieces, yielding to the loop like a socket would"""
+    chunk = os.urandom(chunk_size)
+    for _ in range(total // chunk_size):
+        yield chunk
+        await asyncio.sleep(0)
+
+
+async def per_chunk_writes(path, total, chunk_size):
+    """Old path (aiofiles): one thread-pool hop + one write() per network chunk"""
+    with open(path, "wb", buffering=0) as file:
+        async for chunk in network_chunks(total, chunk_size):
+            await asyncio.to_thread(file.write, chunk)
+
+
+async def writer_stage(path, total, chunk_size, buffer_size):
+    """New path: coalesce into aligned buffer_size writes on the file's writer thread"""
+    writer = DownloadWriter(os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644))
+    try:
+        coalescer = ChunkCoalescer(0, buffer_size)
+        async for chunk in network_chunks(total, chunk_size):
+            for offset, pieces in coalescer.add(chunk):
+                await writer.submit(offset, pieces)
+        if coalescer.size:
+            await writer.submit(*coalescer.take())
+        await writer.drain()
+        return writer.writes
+    finally:
+        await writer.close()
+
+
+async def run(args):
+    total = args.size_mb * 1024 * 1024
+    print(f"💾 Writing {args.size_mb} MB in {args.chunk_kb} KiB network chunks")
+    print(f"   {'path':>22} | {'MB/s':>8} | {'writes':>8}")
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "out.bin")
+
+        start = time.perf_counter()
+        await per_chunk_writes(path, total, args.chunk_kb * 1024)
+        elapsed = time.perf_counter() - start
+        print(f"   {'per-chunk to_thread':>22} | {args.size_mb / elapsed:>8.0f} | {total // (args.chunk_kb * 1024):>8}")
+
+        for buffer_mb in (1, 4, 8):
+            start = time.perf_counter()
+            writes = await writer_stage(path, total, args.chunk_kb * 1024, buffer_mb * 1024 * 1024)
+            elapsed = time.perf_counter() - start
+            print(f"   {f'writer stage {buffer_mb} MB':>22} | {args.size_mb / elapsed:>8.0f} | {writes:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-chunk thread-pool writes vs. the coalescing writer stage")
+    parser.add_argument("--size-mb", type=int, default=1024)
+    parser.add_argument("--chunk-kb", type=int, default=16, help="size of each incoming network chunk")
+    asyncio.run(run(parser.parse_args()))
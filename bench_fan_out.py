@@ -0,0 +1,94 @@
+import argparse
+import asyncio
+import resource
+import subprocess
+import sys
+import time
+
+from fan_out import FanOut
+
+
+async def fake_fetch(product_id):
+    """Stand-in for a request: yields to the loop once and returns a small payload"""
+    await asyncio.sleep(0)
+    return {"product_id": product_id, "price": product_id % 997}
+
+
+def product_ids(count):
+    # A generator, like reading IDs from a file or a DB cursor - never a 10M-element list
+    return (101 + i for i in range(count))
+
+
+async def run_fan_out(count, concurrency, ordered):
+    fan_out = FanOut(fake_fetch, concurrency=concurrency, ordered=ordered)
+    processed = 0
+    async for product_id, data in fan_out.map(product_ids(count)):
+        processed += 1
+    return processed, fan_out.stats()
+
+
+async def run_gather(count, concurrency):
+    """Old pattern (script 12): one coroutine per ID, gather them all"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(product_id):
+        async with semaphore:
+            return await fake_fetch(product_id)
+
+    results = await asyncio.gather(*[limited(product_id) for product_id in product_ids(count)])
+    return len(results), None
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def child(args):
+    """One measurement in a fresh process, so peak RSS belongs to this run alone"""
+    start = time.perf_counter()
+    if args.mode == "gather":
+        processed, stats = asyncio.run(run_gather(args.count, args.concurrency))
+    else:
+        processed, stats = asyncio.run(run_fan_out(args.count, args.concurrency, args.mode == "ordered"))
+    elapsed = time.perf_counter() - start
+    peak = stats["peak_buffered"] if stats else "-"
+    print(f"{processed}\t{elapsed:.3f}\t{peak_rss_mb():.1f}\t{peak}")
+
+
+def measure(mode, count, concurrency):
+    output = subprocess.run(
+        [sys.executable, __file__, "--child", "--mode", mode, "--count", str(count), "--concurrency", str(concurrency)],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    processed, elapsed, rss, peak_buffered = output.split()
+    return int(processed), float(elapsed), float(rss), peak_buffered
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Peak RSS of FanOut vs. gather-everything as the input grows")
+    parser.add_argument("--sizes", default="10000,100000,1000000,10000000", help="comma-separated input counts")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--gather-max", type=int, default=1_000_000, help="largest input the gather baseline is run on")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", default="unordered", help=argparse.SUPPRESS)
+    parser.add_argument("--count", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        sys.exit(0)
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    print(f"📦 Peak RSS per run | concurrency {args.concurrency}")
+    print(f"   {'inputs':>12} | {'mode':>9} | {'peak RSS (MB)':>13} | {'items/s':>10} | {'reorder peak':>12}")
+
+    for count in sizes:
+        for mode in ("unordered", "ordered", "gather"):
+            if mode == "gather" and count > args.gather_max:
+                continue
+            processed, elapsed, rss, peak_buffered = measure(mode, count, args.concurrency)
+            print(f"   {count:>12,} | {mode:>9} | {rss:>13.1f} | {processed / elapsed:>10,.0f} | {peak_buffered:>12}")
@@ -0,0 +1,53 @@
+import importlib
+import statistics
+import time
+
+from health_window import RollingHealthWindow
+
+# async.py can't be imported with a plain `import async` (it's a keyword)
+breaker = importlib.import_module("async")
+
+CONFIG = {"slow_response_threshold": 3.0}
+
+
+def legacy_record(circuit, response_time, window_size):
+    """Old behaviour: list append + pop(0) + statistics.mean over the whole window"""
+    circuit["response_times"].append(response_time)
+    if len(circuit["response_times"]) > window_size:
+        circuit["response_times"].pop(0)
+    return statistics.mean(circuit["response_times"])
+
+
+def bench_rolling_window(window_size, calls):
+    """Per-call cost of recording a request + recalculating health"""
+    circuit = {"health_window": RollingHealthWindow(window_size), "consecutive_failures": 0}
+
+    # Fill the window first so every measured call also evicts a slot
+    for i in range(window_size):
+        circuit["health_window"].record(0.1, i % 10 != 0)
+
+    start = time.perf_counter()
+    for i in range(calls):
+        circuit["health_window"].record(0.1 + (i % 7) * 0.01, i % 10 != 0)
+        breaker.calculate_health_score(circuit, CONFIG)
+    return (time.perf_counter() - start) / calls
+
+
+def bench_legacy_window(window_size, calls):
+    circuit = {"response_times": [0.1] * window_size}
+
+    start = time.perf_counter()
+    for i in range(calls):
+        legacy_record(circuit, 0.1 + (i % 7) * 0.01, window_size)
+    return (time.perf_counter() - start) / calls
+
+
+if __name__ == "__main__":
+    print("📏 Per-call overhead of record + health score")
+    print(f"   {'window_size':>12} | {'rolling (µs)':>12} | {'legacy list (µs)':>16}")
+
+    for window_size in (100, 10_000, 100_000):
+        rolling = bench_rolling_window(window_size, calls=200_000)
+        # The legacy path is O(window_size) per call, so give it fewer calls
+        legacy = bench_legacy_window(window_size, calls=max(200, 2_000_000 // window_size))
+        print(f"   {window_size:>12,} | {rolling * 1e6:>12.3f} | {legacy * 1e6:>16.3f}")
@@ -0,0 +1,111 @@
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from json_codec import JSONCodec, json_codec, read_json
+
+
+class StallMonitor:
+    """Ticks every `interval` on the loop and records how late each tick was - the time other requests would have waited"""
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.lags = []
+        self._last = None
+        self._task = None
+
+    def _record(self):
+        now = time.perf_counter()
+        self.lags.append(max(0.0, now - self._last - self.interval))
+        self._last = now
+
+    async def _tick(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self._record()
+
+    def __enter__(self):
+        self._last = time.perf_counter()
+        self._task = asyncio.ensure_future(self._tick())
+        return self
+
+    def __exit__(self, *exc):
+        # A loop that was blocked right up to the end never got to run the last tick
+        self._record()
+        self._task.cancel()
+
+    def summary(self):
+        lags = sorted(self.lags) or [0.0]
+        return {
+            "max_ms": lags[-1] * 1000,
+            "p99_ms": lags[int(len(lags) * 0.99) - 1 if len(lags) > 1 else 0] * 1000,
+            # Cumulative: every millisecond some other request spent waiting for the loop
+            "total_ms": sum(lags) * 1000,
+        }
+
+
+def make_body(records):
+    """A paginated-API-shaped payload: {"count", "data": [record, ...]}"""
+    data = [{"id": i, "name": f"user {i}", "email": f"user{i}@example.com", "tags": ["a", "b", "c"], "score": i * 1.5, "active": i % 3 == 0} for i in range(records)]
+    return json.dumps({"count": records, "data": data}).encode("utf-8")
+
+
+async def run_case(client, requests, decode):
+    with StallMonitor() as monitor:
+        await asyncio.sleep(0.01)
+        start = time.perf_counter()
+        for _ in range(requests):
+            response = await client.get("http://api/large")
+            await decode(response)
+        elapsed = time.perf_counter() - start
+    return elapsed, monitor.summary()
+
+
+async def run(args):
+    body = make_body(args.records)
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=body, headers={"Content-Type": "application/json"}))
+    codecs = {
+        "thread": json_codec,
+        "process": JSONCodec(executor="process"),
+        "chunked": JSONCodec(backend="chunked"),
+    }
+
+    async def inline_stdlib(response):
+        return response.json()
+
+    async def inline_fast(response):
+        return json_codec.decode(response.content)
+
+    def codec_case(codec):
+        async def decode(response):
+            return await read_json(response, codec=codec)
+        return decode
+
+    cases = [
+        ("response.json()", inline_stdlib),
+        (f"{json_codec.backend.name} inline", inline_fast),
+        (f"read_json ({json_codec.backend.name}, thread)", codec_case(codecs["thread"])),
+        (f"read_json ({json_codec.backend.name}, process)", codec_case(codecs["process"])),
+        ("read_json (chunked, thread)", codec_case(codecs["chunked"])),
+    ]
+
+    # Start the worker process up front - its spawn isn't part of any decode
+    await codecs["process"].decode_async(b"{}" + b" " * codecs["process"].offload_threshold)
+
+    print(f"🧮 Decoding a {len(body) / 1024 / 1024:.1f} MB JSON body {args.requests}x while the loop should tick every 1 ms")
+    print(f"   {'decoder':>30} | {'seconds':>8} | {'total stall ms':>14} | {'max ms':>8} | {'p99 ms':>8}")
+    async with httpx.AsyncClient(transport=transport) as client:
+        for label, decode in cases:
+            elapsed, stalls = await run_case(client, args.requests, decode)
+            print(f"   {label:>30} | {elapsed:>8.2f} | {stalls['total_ms']:>14.0f} | {stalls['max_ms']:>8.1f} | {stalls['p99_ms']:>8.1f}")
+    codecs["process"].executor.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Event-loop stall time of response.json() vs the off-loop JSON codec")
+    parser.add_argument("--records", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=5)
+    asyncio.run(run(parser.parse_args()))
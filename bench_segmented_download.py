@@ -0,0 +1,132 @@
+import argparse
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+
+import httpx
+
+from segmented_download import SegmentedDownloader
+
+
+class RangeServer:
+    """Tiny local HTTP/1.1 file server with Range support and a per-connection speed cap.
+
+    Real links rarely give one TCP connection the whole pipe (per-flow shaping, window
+    limits, a far-away CDN node), so each connection here is capped at `per_connection_mbps`.
+    ranges=False makes it ignore Range headers, to exercise the single-stream fallback.
+    """
+
+    def __init__(self, data, per_connection_mbps=50.0, ranges=True, chunk_size=64 * 1024):
+        self.data = data
+        self.etag = '"' + hashlib.md5(data).hexdigest() + '"'
+        self.bytes_per_second = per_connection_mbps * 1024 * 1024
+        self.ranges = ranges
+        self.chunk_size = chunk_size
+        self.server = None
+        self.requests = 0
+
+    async def start(self, host="127.0.0.1", port=0):
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        return f"http://{host}:{self.server.sockets[0].getsockname()[1]}/file.bin"
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method = request_line.split()[0].decode()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                self.requests += 1
+                await self.respond(method, headers, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method, headers, writer):
+        size = len(self.data)
+        start, end, status = 0, size - 1, "200 OK"
+        range_header = headers.get("range")
+        if self.ranges and range_header and headers.get("if-range", self.etag) == self.etag:
+            first, _, last = range_header.removeprefix("bytes=").partition("-")
+            start, end, status = int(first), min(int(last) if last else size - 1, size - 1), "206 Partial Content"
+
+        response_headers = [
+            f"HTTP/1.1 {status}",
+            f"Content-Length: {end - start + 1}",
+            f"ETag: {self.etag}",
+            "Content-Type: application/octet-stream",
+        ]
+        if self.ranges:
+            response_headers.append("Accept-Ranges: bytes")
+        if status.startswith("206"):
+            response_headers.append(f"Content-Range: bytes {start}-{end}/{size}")
+        writer.write(("\r\n".join(response_headers) + "\r\n\r\n").encode())
+        if method == "HEAD":
+            await writer.drain()
+            return
+
+        # Throttle: send chunk_size, then sleep until this connection's byte budget allows more
+        started = time.perf_counter()
+        sent = 0
+        for offset in range(start, end + 1, self.chunk_size):
+            chunk = self.data[offset:min(offset + self.chunk_size, end + 1)]
+            writer.write(chunk)
+            await writer.drain()
+            sent += len(chunk)
+            ahead = sent / self.bytes_per_second - (time.perf_counter() - started)
+            if ahead > 0:
+                await asyncio.sleep(ahead)
+
+
+async def run(args):
+    data = os.urandom(1024 * 1024) * args.size_mb
+    expected = hashlib.sha256(data).hexdigest()
+
+    print(f"📦 {args.size_mb} MB file | local server capped at {args.per_connection_mbps:.0f} MB/s per connection")
+    print(f"   {'segments':>8} | {'seconds':>8} | {'MB/s':>8} | {'speed-up':>8} | ok")
+
+    with tempfile.TemporaryDirectory() as folder:
+        for ranges in (True, False):
+            server = RangeServer(data, args.per_connection_mbps, ranges=ranges)
+            url = await server.start()
+            limits = httpx.Limits(max_connections=max(args.segments), max_keepalive_connections=max(args.segments))
+            baseline = None
+
+            async with httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(60.0)) as client:
+                for segments in args.segments if ranges else [max(args.segments)]:
+                    path = os.path.join(folder, f"download_{segments}.bin")
+                    downloader = SegmentedDownloader(client, segments=segments)
+
+                    start = time.perf_counter()
+                    result = await downloader.download(url, path)
+                    elapsed = time.perf_counter() - start
+
+                    with open(path, "rb") as file:
+                        ok = result["success"] and hashlib.sha256(file.read()).hexdigest() == expected
+                    baseline = baseline or elapsed
+                    label = segments if ranges else f"{result['segments']} (no ranges)"
+                    print(f"   {label!s:>8} | {elapsed:>8.2f} | {args.size_mb / elapsed:>8.1f} | {baseline / elapsed:>7.1f}x | {'✅' if ok else '❌'}")
+
+            await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Segmented vs. single-stream download throughput against a local range server")
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--per-connection-mbps", type=float, default=50.0, help="server-side cap per TCP connection (MB/s)")
+    parser.add_argument("--segments", type=lambda value: [int(n) for n in value.split(",")], default=[1, 2, 4, 8, 16])
+    asyncio.run(run(parser.parse_args()))
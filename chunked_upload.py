@@ -0,0 +1,181 @@
+"""Parallel, resumable chunked uploads (init / part / complete) over the caller's pooled client"""
+import asyncio
+import hashlib
+import json
+import os
+
+import httpx
+
+from fan_out import FanOut
+from retry_policy import RetryPolicy
+from streaming_upload import file_version
+
+# Default part size - big enough to amortise a request, small enough that a retry is cheap
+PART_SIZE = 8 * 1024 * 1024
+
+# Suffix of the progress file next to the upload source
+STATE_SUFFIX = ".upload.json"
+
+
+class UploadIncomplete(Exception):
+    """Some parts still failed after their retries - the progress file lets the next upload() resume"""
+
+    def __init__(self, path, failed):
+        super().__init__(f"{len(failed)} part(s) of {path} failed: {sorted(failed)}")
+        self.path = path
+        self.failed = failed
+
+
+def manifest_sha256(part_hashes):
+    """sha256 over the hex part hashes in part order"""
+    return hashlib.sha256("".join(part_hashes).encode("ascii")).hexdigest()
+
+
+def read_part(path, offset, size):
+    """Read one part and hash it in the same worker-thread call"""
+    with open(path, "rb") as file:
+        file.seek(offset)
+        data = file.read(size)
+    return data, hashlib.sha256(data).hexdigest()
+
+
+class UploadState:
+    """The progress file: which upload session this file belongs to and which parts it already has"""
+
+    def __init__(self, path):
+        self.path = path
+        self.state_path = path + STATE_SUFFIX
+        self.upload_id = None
+        self.version = None
+        self.part_size = None
+        self.parts = {}
+
+    @classmethod
+    def load(cls, path):
+        state = cls(path)
+        try:
+            with open(state.state_path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            state.upload_id = data["upload_id"]
+            state.version = list(data["version"])
+            state.part_size = data["part_size"]
+            state.parts = {int(number): sha for number, sha in data["parts"].items()}
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return state
+
+    def save(self):
+        data = {"upload_id": self.upload_id, "version": self.version, "part_size": self.part_size, "parts": self.parts}
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(temp_path, self.state_path)
+
+    def discard(self):
+        for leftover in (self.state_path, self.state_path + ".tmp"):
+            try:
+                os.remove(leftover)
+            except FileNotFoundError:
+                pass
+
+
+class ChunkedUploader:
+    """Uploads a file as fixed-size parts, `concurrency` at a time, and resumes after interruptions.
+
+        uploader = ChunkedUploader(client, "https://uploads.example.com", concurrency=4)
+        result = await uploader.upload("backup.tar")
+
+    Each part is read and sha256'd in one worker-thread call and sent with its hash, so the
+    server can reject a corrupted part. Parts are retried on their own through `retry_policy`
+    (PUTs are idempotent); a part that still fails doesn't stop the others. Finished parts
+    are recorded in a progress file (<file>.upload.json) - the next upload() of the same,
+    unchanged file asks the server which parts it has and only sends the rest. The upload
+    is finished with a manifest of part hashes (plus their combined manifest hash).
+    At most `concurrency` parts are in memory at once.
+    """
+
+    def __init__(self, client, base_url, part_size=PART_SIZE, concurrency=4, retry_policy=None, on_progress=None):
+        self.client = client
+        self.base_url = str(base_url).rstrip("/")
+        self.part_size = part_size
+        self.concurrency = concurrency
+        self.retry_policy = retry_policy or RetryPolicy(max_attempts=4, base_delay=0.2, max_delay=5.0)
+
+        # on_progress(path, parts_done, part_count)
+        self.on_progress = on_progress
+
+    async def _call(self, method, path, **kwargs):
+        response = await self.retry_policy.request(self.client, method, f"{self.base_url}{path}", **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def upload(self, path, filename=None):
+        """Upload path - returns the server's completion response plus upload stats"""
+        version = list(file_version(path))
+        size = version[2]
+        state = UploadState.load(path)
+
+        resumed = 0
+        if state.upload_id is not None and state.version == version:
+            try:
+                # The server is the source of truth for which parts really arrived
+                remote = await self._call("GET", f"/uploads/{state.upload_id}")
+                state.parts = {int(number): sha for number, sha in remote["parts"].items() if state.parts.get(int(number)) in (None, sha)}
+                resumed = len(state.parts)
+            except httpx.HTTPStatusError:
+                # Session expired / unknown - start a new one
+                state.upload_id = None
+        else:
+            state.upload_id = None
+
+        if state.upload_id is None:
+            session = await self._call("POST", "/uploads", json={"filename": filename or os.path.basename(path), "size": size, "part_size": self.part_size})
+            state.upload_id = session["upload_id"]
+            state.version = version
+            state.part_size = session["part_size"]
+            state.parts = {}
+            await asyncio.to_thread(state.save)
+
+        part_count = max(1, -(-size // state.part_size))
+        missing = [number for number in range(1, part_count + 1) if number not in state.parts]
+
+        fan_out = FanOut(lambda number: self._upload_part(state, number, size), concurrency=self.concurrency, return_exceptions=True)
+        failed = {}
+        async for number, outcome in fan_out.map(missing):
+            if isinstance(outcome, Exception):
+                failed[number] = outcome
+                continue
+            state.parts[number] = outcome
+            # Persisted per part: an interrupted upload loses at most the parts in flight
+            await asyncio.to_thread(state.save)
+            if self.on_progress is not None:
+                self.on_progress(path, len(state.parts), part_count)
+
+        if failed:
+            raise UploadIncomplete(path, failed)
+        if list(file_version(path)) != version:
+            # Parts from two versions of the file must never be stitched together
+            await asyncio.to_thread(state.discard)
+            raise ValueError(f"{path} changed during the upload - start it again")
+
+        hashes = [state.parts[number] for number in range(1, part_count + 1)]
+        result = await self._call(
+            "POST",
+            f"/uploads/{state.upload_id}/complete",
+            json={"parts": [{"part": number, "sha256": sha} for number, sha in enumerate(hashes, 1)], "manifest_sha256": manifest_sha256(hashes)},
+        )
+        await asyncio.to_thread(state.discard)
+        return {**result, "upload_id": state.upload_id, "parts": part_count, "parts_sent": len(missing), "parts_resumed": resumed}
+
+    async def _upload_part(self, state, number, size):
+        offset = (number - 1) * state.part_size
+        data, sha = await asyncio.to_thread(read_part, state.path, offset, min(state.part_size, size - offset))
+        result = await self._call(
+            "PUT",
+            f"/uploads/{state.upload_id}/parts/{number}",
+            content=data,
+            headers={"Content-Type": "application/octet-stream", "X-Part-SHA256": sha},
+        )
+        if result["sha256"] != sha:
+            raise ValueError(f"Server stored part {number} with sha256 {result['sha256']}, sent {sha}")
+        return sha
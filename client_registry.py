@@ -0,0 +1,179 @@
+"""Process-wide registry of long-lived httpx.AsyncClients - shared per config, pre-warmed, kept alive"""
+import asyncio
+import time
+
+import httpx
+
+from dns_cache import CachingResolver, ResolvingTransport
+from latency_histogram import LatencyHistogram
+from rate_limiter import RateLimitTransport
+
+# Defaults for clients handed out by the registry
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60.0)
+
+
+def timeout_key(timeout):
+    timeout = timeout if isinstance(timeout, httpx.Timeout) else httpx.Timeout(timeout)
+    return (timeout.connect, timeout.read, timeout.write, timeout.pool)
+
+
+def limits_key(limits):
+    return (limits.max_connections, limits.max_keepalive_connections, limits.keepalive_expiry)
+
+
+class ConnectionTrace:
+    """httpcore trace callback that notices whether a request had to open a new connection"""
+
+    __slots__ = ("started", "cold", "forward")
+
+    def __init__(self, forward=None):
+        self.started = time.perf_counter()
+        self.cold = False
+        # The caller's own trace callback, if it set one
+        self.forward = forward
+
+    async def __call__(self, event_name, info):
+        if event_name.startswith("connection.connect_tcp"):
+            self.cold = True
+        if self.forward is not None:
+            await self.forward(event_name, info)
+
+
+class HostMetrics:
+    """Cold (new connection: DNS + TCP + TLS) vs warm (pooled connection) time-to-headers for one host"""
+
+    __slots__ = ("cold", "warm", "last_used")
+
+    def __init__(self):
+        self.cold = LatencyHistogram(interval=3600)
+        self.warm = LatencyHistogram(interval=3600)
+        self.last_used = 0.0
+
+    def snapshot(self):
+        return {"cold": self.cold.percentiles(), "warm": self.warm.percentiles()}
+
+
+class ClientRegistry:
+    """Hands out one shared AsyncClient per configuration for the life of the process.
+
+        client = client_registry.get_client(http2=True, base_url="https://api.example.com")
+        await client_registry.prewarm(client, "https://api.example.com/health", connections=4)
+        ...
+        await client_registry.shutdown()
+
+    Callers must not `async with` / aclose() a registry client - shutdown() closes them all.
+    """
+
+    def __init__(self, resolver=None):
+        # One DNS cache for every client: lookups are cached, coalesced and raced (happy eyeballs)
+        self.resolver = resolver or CachingResolver()
+        self._clients = {}
+        self._pings = {}
+        self.metrics = {}
+
+    def get_client(self, base_url="", http2=True, timeout=DEFAULT_TIMEOUT, limits=DEFAULT_LIMITS, follow_redirects=False, headers=None, rate_limit=None):
+        """The shared client for this configuration (created on first use)
+
+        rate_limit: RateLimitTransport settings (e.g. {"rate": 5, "burst": 5}) to keep
+        every host / API key under its quota before requests leave the process.
+        """
+        key = (
+            str(base_url),
+            http2,
+            timeout_key(timeout),
+            limits_key(limits),
+            follow_redirects,
+            tuple(sorted((headers or {}).items())),
+            tuple(sorted((rate_limit or {}).items())),
+        )
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            transport = ResolvingTransport(resolver=self.resolver, http2=http2, limits=limits)
+            if rate_limit:
+                transport = RateLimitTransport(transport=transport, **rate_limit)
+            client = httpx.AsyncClient(
+                base_url=base_url,
+                transport=transport,
+                timeout=timeout,
+                follow_redirects=follow_redirects,
+                headers=headers,
+                event_hooks={"request": [self._on_request], "response": [self._on_response]},
+            )
+            self._clients[key] = client
+        return client
+
+    async def _on_request(self, request):
+        request.extensions["trace"] = ConnectionTrace(request.extensions.get("trace"))
+
+    async def _on_response(self, response):
+        trace = response.request.extensions.get("trace")
+        if not isinstance(trace, ConnectionTrace):
+            return
+        host = response.request.url.netloc.decode("ascii")
+        metrics = self.metrics.get(host)
+        if metrics is None:
+            metrics = self.metrics[host] = HostMetrics()
+        now = time.perf_counter()
+        (metrics.cold if trace.cold else metrics.warm).record(now, now - trace.started)
+        metrics.last_used = now
+
+    async def prewarm(self, client, url, connections=1, method="HEAD"):
+        """Open `connections` connections to url's host now (DNS + TCP + TLS off the critical path).
+
+        HTTP/2 multiplexes, so there it's one connection however many you ask for.
+        Returns how many warm-up requests got an answer.
+        """
+
+        async def touch():
+            try:
+                response = await client.request(method, url)
+                await response.aclose()
+                return True
+            except httpx.HTTPError:
+                return False
+
+        results = await asyncio.gather(*[touch() for _ in range(connections)])
+        return sum(results)
+
+    def keep_alive(self, client, url, connections=1, interval=30.0, method="HEAD"):
+        """Ping url every `interval` seconds while its host is idle, so pooled connections don't expire.
+
+        Pick `interval` below both the client's keepalive_expiry and the server's idle timeout.
+        """
+        key = (id(client), str(url))
+        if key not in self._pings:
+            self._pings[key] = asyncio.ensure_future(self._ping_loop(client, url, connections, interval, method))
+        return self._pings[key]
+
+    async def _ping_loop(self, client, url, connections, interval, method):
+        host = httpx.URL(url).netloc.decode("ascii")
+        while not client.is_closed:
+            await asyncio.sleep(interval)
+            metrics = self.metrics.get(host)
+            # Real traffic keeps the pool warm by itself - only ping an idle host
+            if metrics is None or time.perf_counter() - metrics.last_used >= interval:
+                await self.prewarm(client, url, connections, method)
+
+    def stats(self):
+        """Cold vs warm latency per host (seconds), plus the DNS cache counters"""
+        return {
+            "hosts": {host: metrics.snapshot() for host, metrics in self.metrics.items()},
+            "dns": dict(self.resolver.stats),
+        }
+
+    async def shutdown(self):
+        """Stop keep-alive pings and close every client (call once on the way out)"""
+        pings = list(self._pings.values())
+        for task in pings:
+            task.cancel()
+        await asyncio.gather(*pings, return_exceptions=True)
+        self._pings.clear()
+
+        clients = list(self._clients.values())
+        self._clients.clear()
+        await asyncio.gather(*[client.aclose() for client in clients], return_exceptions=True)
+
+
+# The process-wide registry
+client_registry = ClientRegistry()
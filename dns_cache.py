@@ -0,0 +1,334 @@
+"""Caching async DNS for httpx - TTL cache, coalesced lookups, stale-on-error, happy-eyeballs connect racing"""
+import asyncio
+import contextlib
+import ipaddress
+import socket
+import time
+
+import httpcore
+import httpx
+
+# getaddrinfo doesn't report TTLs - how long to trust its answers
+DEFAULT_TTL = 60.0
+
+# How long past expiry a cached answer may still be used if the resolver is failing
+DEFAULT_STALE_TTL = 300.0
+
+# RFC 8305 "Connection Attempt Delay" - head start each address gets before the next one is tried
+DEFAULT_ATTEMPT_DELAY = 0.25
+
+# httpx's own pool defaults
+DEFAULT_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+
+
+def is_ip_address(host):
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
+def interleave_families(addresses, prefer_ipv6=True):
+    """IPv6, IPv4, IPv6, ... (RFC 8305 §4) so one broken family doesn't stall every attempt"""
+    v6 = [address for address in addresses if ":" in address]
+    v4 = [address for address in addresses if ":" not in address]
+    first, second = (v6, v4) if prefer_ipv6 else (v4, v6)
+    ordered = []
+    for index in range(max(len(first), len(second))):
+        ordered.extend(family[index] for family in (first, second) if index < len(family))
+    return ordered
+
+
+class SystemResolver:
+    """The OS resolver (getaddrinfo in the loop's executor) - no TTLs, so the cache's default applies"""
+
+    async def resolve(self, host):
+        infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        # dict → unique, in the OS's preferred order
+        return list(dict.fromkeys(info[4][0] for info in infos)), None
+
+
+class StaticResolver:
+    """Fake resolver table for offline tests.
+
+        resolver = StaticResolver({"api.example.com": ["::1", "127.0.0.1"]})
+        resolver.table["api.example.com"] = socket.gaierror("boom")  # now it fails
+
+    A value that is an exception gets raised; `delay` simulates a slow DNS server.
+    """
+
+    def __init__(self, table, ttl=None, delay=0.0):
+        self.table = dict(table)
+        self.ttl = ttl
+        self.delay = delay
+        self.lookups = 0
+
+    async def resolve(self, host):
+        self.lookups += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        answer = self.table.get(host)
+        if answer is None:
+            raise socket.gaierror(socket.EAI_NONAME, f"Name or service not known: {host}")
+        if isinstance(answer, BaseException):
+            raise answer
+        return list(answer), self.ttl
+
+
+class CachedAddresses:
+    __slots__ = ("addresses", "expires_at", "stale_until")
+
+    def __init__(self, addresses, expires_at, stale_until):
+        self.addresses = addresses
+        self.expires_at = expires_at
+        self.stale_until = stale_until
+
+
+class CachingResolver:
+    """Wraps any resolver (`async resolve(host) -> (addresses, ttl or None)`).
+
+    - answers are cached for their TTL (or `ttl` when the resolver has none)
+    - concurrent lookups for the same host share one query
+    - if a refresh fails, the expired answer keeps being served for up to `stale_ttl`
+    """
+
+    def __init__(self, resolver=None, ttl=DEFAULT_TTL, stale_ttl=DEFAULT_STALE_TTL):
+        self.resolver = resolver or SystemResolver()
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._cache = {}
+        self._in_flight = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "stale_served": 0, "errors": 0}
+
+    async def resolve(self, host):
+        entry = self._cache.get(host)
+        if entry is not None and time.monotonic() < entry.expires_at:
+            self.stats["hits"] += 1
+            return entry.addresses
+
+        lookup = self._in_flight.get(host)
+        if lookup is None:
+            self.stats["misses"] += 1
+            lookup = asyncio.ensure_future(self._lookup(host))
+            self._in_flight[host] = lookup
+        else:
+            self.stats["coalesced"] += 1
+
+        # shield → one caller timing out doesn't cancel the lookup for everybody else
+        return await asyncio.shield(lookup)
+
+    async def _lookup(self, host):
+        try:
+            addresses, ttl = await self.resolver.resolve(host)
+            if not addresses:
+                raise socket.gaierror(socket.EAI_NODATA, f"No addresses for {host}")
+        except Exception:
+            self.stats["errors"] += 1
+            entry = self._cache.get(host)
+            if entry is not None and time.monotonic() < entry.stale_until:
+                self.stats["stale_served"] += 1
+                return entry.addresses
+            raise
+        finally:
+            self._in_flight.pop(host, None)
+
+        now = time.monotonic()
+        ttl = self.ttl if ttl is None else ttl
+        self._cache[host] = CachedAddresses(addresses, now + ttl, now + ttl + self.stale_ttl)
+        return addresses
+
+    def invalidate(self, host=None):
+        if host is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(host, None)
+
+
+class ResolvingBackend(httpcore.AsyncNetworkBackend):
+    """httpcore network backend: hostnames go through our resolver, then the addresses race (happy eyeballs).
+
+    Attempt n+1 starts when attempt n fails or has had `attempt_delay` seconds, first
+    connection up wins and the others are cancelled / closed. TLS still uses the original
+    hostname (httpcore passes it as server_hostname), so certificates verify as usual.
+    """
+
+    def __init__(self, resolver, backend=None, attempt_delay=DEFAULT_ATTEMPT_DELAY, prefer_ipv6=True):
+        # resolve(host) → addresses: raw resolvers return (addresses, ttl) and get a cache in front
+        self.resolver = resolver if isinstance(resolver, CachingResolver) else CachingResolver(resolver)
+        self.backend = backend or httpcore.AnyIOBackend()
+        self.attempt_delay = attempt_delay
+        self.prefer_ipv6 = prefer_ipv6
+        self.stats = {"connects": 0, "attempts": 0, "raced": 0}
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        if is_ip_address(host):
+            return await self.backend.connect_tcp(host, port, timeout, local_address, socket_options)
+
+        try:
+            addresses = await asyncio.wait_for(self.resolver.resolve(host), timeout)
+        except asyncio.TimeoutError:
+            raise httpcore.ConnectTimeout(f"DNS lookup for {host} timed out") from None
+        except OSError as exc:
+            raise httpcore.ConnectError(f"DNS lookup for {host} failed: {exc}") from exc
+
+        self.stats["connects"] += 1
+        return await self._race(interleave_families(addresses, self.prefer_ipv6), port, timeout, local_address, socket_options)
+
+    async def _race(self, addresses, port, timeout, local_address, socket_options):
+        remaining = list(addresses)
+        pending = set()
+        errors = []
+        started = 0
+        try:
+            while remaining or pending:
+                if remaining:
+                    started += 1
+                    self.stats["attempts"] += 1
+                    pending.add(asyncio.ensure_future(self.backend.connect_tcp(remaining.pop(0), port, timeout, local_address, socket_options)))
+
+                # Wait for the head start to run out (or for anything to finish / fail)
+                done, pending = await asyncio.wait(pending, timeout=self.attempt_delay if remaining else None, return_when=asyncio.FIRST_COMPLETED)
+
+                streams = [task.result() for task in done if not task.cancelled() and task.exception() is None]
+                errors.extend(task.exception() for task in done if not task.cancelled() and task.exception() is not None)
+                if streams:
+                    # The first address wasn't good enough on its own (failed or too slow)
+                    if started > 1:
+                        self.stats["raced"] += 1
+                    for extra in streams[1:]:
+                        await extra.aclose()
+                    return streams[0]
+        finally:
+            await self._abandon(pending)
+
+        raise errors[-1] if errors else httpcore.ConnectError("No addresses to connect to")
+
+    async def _abandon(self, tasks):
+        """Cancel the losing attempts and close any that connected anyway"""
+        for task in tasks:
+            task.cancel()
+        for result in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(result, httpcore.AsyncNetworkStream):
+                await result.aclose()
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self.backend.connect_unix_socket(path, timeout, socket_options)
+
+    async def sleep(self, seconds):
+        await self.backend.sleep(seconds)
+
+
+# httpcore → httpx exception types (looked up along the raised exception's MRO)
+HTTPCORE_ERRORS = {
+    httpcore.ConnectTimeout: httpx.ConnectTimeout,
+    httpcore.ReadTimeout: httpx.ReadTimeout,
+    httpcore.WriteTimeout: httpx.WriteTimeout,
+    httpcore.PoolTimeout: httpx.PoolTimeout,
+    httpcore.TimeoutException: httpx.TimeoutException,
+    httpcore.ConnectError: httpx.ConnectError,
+    httpcore.ReadError: httpx.ReadError,
+    httpcore.WriteError: httpx.WriteError,
+    httpcore.NetworkError: httpx.NetworkError,
+    httpcore.ProxyError: httpx.ProxyError,
+    httpcore.UnsupportedProtocol: httpx.UnsupportedProtocol,
+    httpcore.LocalProtocolError: httpx.LocalProtocolError,
+    httpcore.RemoteProtocolError: httpx.RemoteProtocolError,
+    httpcore.ProtocolError: httpx.ProtocolError,
+}
+
+
+@contextlib.contextmanager
+def httpx_errors():
+    """Re-raise httpcore's exceptions as the httpx ones callers (and RetryPolicy) expect"""
+    try:
+        yield
+    except Exception as exc:
+        for exc_type in type(exc).__mro__:
+            if exc_type in HTTPCORE_ERRORS:
+                raise HTTPCORE_ERRORS[exc_type](str(exc)) from exc
+        raise
+
+
+class ResponseStream(httpx.AsyncByteStream):
+    """An httpcore response body as an httpx stream"""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    async def __aiter__(self):
+        with httpx_errors():
+            async for part in self._stream:
+                yield part
+
+    async def aclose(self):
+        if hasattr(self._stream, "aclose"):
+            with httpx_errors():
+                await self._stream.aclose()
+
+
+class ResolvingTransport(httpx.AsyncBaseTransport):
+    """httpx transport whose connections resolve through a CachingResolver.
+
+        transport = ResolvingTransport(resolver=CachingResolver(), http2=True)
+        client = httpx.AsyncClient(transport=transport)
+
+    `resolver` may also be a raw resolver (SystemResolver, StaticResolver - anything returning
+    (addresses, ttl)); it gets wrapped in a CachingResolver. Share one CachingResolver between
+    transports to share its cache. `backend` is the httpcore backend that actually connects
+    (tests can pass a fake one). Takes AsyncHTTPTransport's connection arguments; proxies
+    aren't supported - only the proxy's own name would be resolved here.
+    """
+
+    def __init__(
+        self,
+        resolver=None,
+        attempt_delay=DEFAULT_ATTEMPT_DELAY,
+        prefer_ipv6=True,
+        backend=None,
+        verify=True,
+        cert=None,
+        trust_env=True,
+        http1=True,
+        http2=False,
+        limits=DEFAULT_LIMITS,
+        local_address=None,
+        retries=0,
+        socket_options=None,
+    ):
+        self.resolver = resolver if isinstance(resolver, CachingResolver) else CachingResolver(resolver)
+        self.backend = ResolvingBackend(self.resolver, backend, attempt_delay=attempt_delay, prefer_ipv6=prefer_ipv6)
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(verify=verify, cert=cert, trust_env=trust_env),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            http1=http1,
+            http2=http2,
+            local_address=local_address,
+            retries=retries,
+            socket_options=socket_options,
+            network_backend=self.backend,
+        )
+
+    async def handle_async_request(self, request):
+        url = request.url
+        core_request = httpcore.Request(
+            method=request.method,
+            url=httpcore.URL(scheme=url.raw_scheme, host=url.raw_host, port=url.port, target=url.raw_path),
+            headers=request.headers.raw,
+            content=request.stream,
+            extensions=request.extensions,
+        )
+        with httpx_errors():
+            response = await self._pool.handle_async_request(core_request)
+
+        return httpx.Response(
+            status_code=response.status,
+            headers=response.headers,
+            stream=ResponseStream(response.stream),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        await self._pool.aclose()
@@ -0,0 +1,253 @@
+"""Persistent, content-addressed download cache - a SQLite index of URLs over blobs stored once per sha256"""
+import asyncio
+import concurrent.futures
+import os
+import shutil
+import sqlite3
+import stat
+import time
+
+import httpx
+
+from download_integrity import parse_expected
+from segmented_download import SegmentedDownloader
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    url TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    content_type TEXT,
+    fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_sha256 ON entries (sha256);
+"""
+
+# prune() leaves younger temp files alone - they may be another process's download in progress
+TMP_MAX_AGE = 24 * 3600
+
+ENTRY_COLUMNS = ("url", "sha256", "size", "etag", "last_modified", "content_type", "fetched_at")
+
+
+class DownloadCache:
+    """Keeps downloaded files across runs: unchanged files cost a 304, identical files are stored once.
+
+        cache = DownloadCache("downloaded_images/.cache")
+        result = await cache.fetch(client, url, "downloaded_images/product.jpeg")
+        # result["status"]: "downloaded", "deduplicated" (new URL, bytes already stored) or "not_modified"
+
+    Layout under `root`:
+        index.sqlite3        url → sha256, size, ETag, Last-Modified, Content-Type, fetched_at
+        blobs/ab/ab12...     file contents, named by their sha256 (read-only)
+        tmp/                 downloads in progress (prune() clears ones older than TMP_MAX_AGE)
+
+    A URL already in the index is fetched with If-None-Match / If-Modified-Since; a 304 just
+    re-links the stored blob. Otherwise the body streams through SegmentedDownloader's writer
+    stage with sha256 computed inline, and is moved into blobs/ - or dropped, when that
+    content is already there under another URL. Destination files are hard links to the
+    blob where the filesystem allows (copies otherwise), so a cached file takes no extra space.
+
+    SQLite runs on one dedicated thread (like DownloadWriter's file thread), never on the loop;
+    WAL mode lets several processes share one cache directory.
+    """
+
+    def __init__(self, root, downloader=None, link=True):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        self.tmp_dir = os.path.join(root, "tmp")
+        self.index_path = os.path.join(root, "index.sqlite3")
+        # downloader: its write_buffer / chunk_size / verify_headers settings are used for cache misses
+        self.downloader = downloader
+        self.link = link
+        self._db = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="download-cache")
+
+        # Stats
+        self.downloads = 0
+        self.deduplicated = 0
+        self.not_modified = 0
+        self.bytes_downloaded = 0
+        self.bytes_not_transferred = 0
+
+    def blob_path(self, sha256):
+        return os.path.join(self.blob_dir, sha256[:2], sha256)
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _connect(self):
+        """Open the index (on the cache thread - sqlite3 connections stay on the thread that made them)"""
+        if self._db is None:
+            os.makedirs(self.blob_dir, exist_ok=True)
+            os.makedirs(self.tmp_dir, exist_ok=True)
+            self._db = sqlite3.connect(self.index_path, timeout=30.0)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    def _lookup(self, url):
+        row = self._connect().execute(f"SELECT {', '.join(ENTRY_COLUMNS)} FROM entries WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        entry = dict(zip(ENTRY_COLUMNS, row))
+        # An index row whose blob was deleted behind our back is as good as no row
+        return entry if os.path.exists(self.blob_path(entry["sha256"])) else None
+
+    def _record(self, url, sha256, size, etag, last_modified, content_type):
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO entries (url, sha256, size, etag, last_modified, content_type, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, sha256, size, etag, last_modified, content_type, time.time()),
+            )
+
+    def _store_blob(self, temp_path, sha256):
+        """Move a finished download into blobs/ - False if that content was already stored"""
+        blob_path = self.blob_path(sha256)
+        if os.path.exists(blob_path):
+            os.remove(temp_path)
+            return False
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        os.chmod(temp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        os.replace(temp_path, blob_path)
+        return True
+
+    def _materialize(self, sha256, path):
+        """Put the blob at path: a hard link if possible, a copy otherwise (skipped when path already is the blob)"""
+        blob_path = self.blob_path(sha256)
+        try:
+            if os.path.samefile(blob_path, path):
+                return
+        except FileNotFoundError:
+            pass
+        temp_path = f"{path}.{os.urandom(4).hex()}.tmp"
+        try:
+            if self.link:
+                try:
+                    os.link(blob_path, temp_path)
+                except OSError:
+                    # Other filesystem / no hard links (FAT, some network mounts)
+                    shutil.copyfile(blob_path, temp_path)
+            else:
+                shutil.copyfile(blob_path, temp_path)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    async def fetch(self, client, url, path=None, expected_digest=None):
+        """Bring url up to date in the cache (and at path, if given) - returns a result dict like SegmentedDownloader.download"""
+        temp_path = None
+        try:
+            expected = dict([parse_expected(expected_digest)]) if expected_digest else {}
+            entry = await self._run(self._lookup, url)
+
+            headers = {}
+            if entry is not None:
+                if entry["etag"]:
+                    headers["If-None-Match"] = entry["etag"]
+                if entry["last_modified"]:
+                    headers["If-Modified-Since"] = entry["last_modified"]
+
+            async with client.stream("GET", url, headers=headers) as response:
+                etag = response.headers.get("etag")
+                last_modified = response.headers.get("last-modified")
+
+                if response.status_code == 304:
+                    if entry is None:
+                        raise httpx.HTTPStatusError(f"304 for {url} with nothing cached to revalidate", request=response.request, response=response)
+                    status, sha256, size = "not_modified", entry["sha256"], entry["size"]
+                    if expected.get("sha256", sha256) != sha256:
+                        raise ValueError(f"Cached copy of {url} has sha256 {sha256}, expected {expected['sha256']}")
+                    # A 304 may carry fresher validators - keep the stored ones otherwise
+                    etag = etag or entry["etag"]
+                    last_modified = last_modified or entry["last_modified"]
+                    content_type = entry["content_type"]
+                    self.not_modified += 1
+                    self.bytes_not_transferred += size
+                else:
+                    response.raise_for_status()
+                    downloader = self.downloader or SegmentedDownloader(client, segments=1, resume=False)
+                    temp_path = os.path.join(self.tmp_dir, os.urandom(8).hex())
+                    size, _, digests = await downloader.save_response(response, temp_path, expected, compute=("sha256",))
+                    sha256 = digests["sha256"]
+                    content_type = response.headers.get("content-type")
+                    stored = await self._run(self._store_blob, temp_path, sha256)
+                    temp_path = None
+                    status = "downloaded" if stored else "deduplicated"
+                    self.downloads += 1
+                    self.deduplicated += not stored
+                    self.bytes_downloaded += size
+
+            await self._run(self._record, url, sha256, size, etag, last_modified, content_type)
+            if path is not None:
+                await self._run(self._materialize, sha256, path)
+            return {"success": True, "filename": path, "url": url, "status": status, "sha256": sha256, "size_bytes": size, "error": None}
+
+        except Exception as e:
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+            return {"success": False, "filename": path, "url": url, "status": None, "sha256": None, "size_bytes": 0, "error": str(e)}
+
+    def _forget(self, url):
+        with self._connect() as db:
+            db.execute("DELETE FROM entries WHERE url = ?", (url,))
+
+    async def forget(self, url):
+        """Drop url from the index (its blob goes on the next prune())"""
+        await self._run(self._forget, url)
+
+    def _prune(self):
+        referenced = {row[0] for row in self._connect().execute("SELECT DISTINCT sha256 FROM entries")}
+        removed = freed = 0
+        for folder, _, names in os.walk(self.blob_dir):
+            for name in names:
+                if name not in referenced:
+                    blob_path = os.path.join(folder, name)
+                    freed += os.path.getsize(blob_path)
+                    os.remove(blob_path)
+                    removed += 1
+        # Leftovers of downloads that were interrupted mid-stream - old enough that nobody is still writing them
+        cutoff = time.time() - TMP_MAX_AGE
+        for name in os.listdir(self.tmp_dir):
+            temp_path = os.path.join(self.tmp_dir, name)
+            try:
+                if os.path.getmtime(temp_path) < cutoff:
+                    os.remove(temp_path)
+            except FileNotFoundError:
+                # Finished (moved into blobs/) or cleaned up by its owner meanwhile
+                pass
+        return {"blobs_removed": removed, "bytes_freed": freed}
+
+    async def prune(self):
+        """Delete blobs no URL points at any more, and temp files untouched for TMP_MAX_AGE
+
+        Run it when no fetch() is in progress on this cache: a blob stored but not yet indexed looks unreferenced.
+        """
+        return await self._run(self._prune)
+
+    def _index_stats(self):
+        entries, blobs, logical = self._connect().execute("SELECT COUNT(*), COUNT(DISTINCT sha256), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        stored = self._connect().execute("SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT sha256, size FROM entries)").fetchone()[0]
+        return {"urls": entries, "blobs": blobs, "logical_bytes": logical, "stored_bytes": stored}
+
+    async def stats(self):
+        return {
+            **await self._run(self._index_stats),
+            "downloads": self.downloads,
+            "deduplicated": self.deduplicated,
+            "not_modified": self.not_modified,
+            "bytes_downloaded": self.bytes_downloaded,
+            "bytes_not_transferred": self.bytes_not_transferred,
+        }
+
+    def _close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    async def close(self):
+        await self._run(self._close)
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,144 @@
+"""Inline integrity checks for downloads - digests computed on the writer thread as the bytes are written"""
+import base64
+import binascii
+import hashlib
+import os
+import re
+
+# Header algorithm names → hashlib names
+ALGORITHMS = {"sha-256": "sha256", "sha256": "sha256", "sha-512": "sha512", "sha512": "sha512", "md5": "md5", "sha-1": "sha1", "sha1": "sha1"}
+
+# Bare hex digests are recognised by length
+HEX_LENGTHS = {32: "md5", 40: "sha1", 64: "sha256", 128: "sha512"}
+
+# Read-back size when hashing ranges that were written ahead of the hashed prefix
+READ_BACK_SIZE = 1024 * 1024
+
+STRUCTURED_DIGEST = re.compile(r"\s*([A-Za-z0-9-]+)\s*=\s*:([A-Za-z0-9+/=]+):\s*")
+LEGACY_DIGEST = re.compile(r"\s*([A-Za-z0-9-]+)\s*=\s*([A-Za-z0-9+/=]+)\s*")
+
+
+class IntegrityError(Exception):
+    """The downloaded bytes don't match the expected digest (the partial file has been deleted)"""
+
+
+def b64_to_hex(value):
+    try:
+        return base64.b64decode(value, validate=True).hex()
+    except (binascii.Error, ValueError):
+        return None
+
+
+def parse_expected(value):
+    """"sha256:<hex>", "md5:<hex>" or a bare hex digest → (algorithm, hex)"""
+    algorithm, _, digest = value.rpartition(":")
+    digest = digest.strip().lower()
+    if algorithm:
+        algorithm = ALGORITHMS.get(algorithm.strip().lower())
+    else:
+        algorithm = HEX_LENGTHS.get(len(digest))
+    if algorithm is None or len(digest) != hashlib.new(algorithm).digest_size * 2:
+        raise ValueError(f"Unrecognised digest: {value!r}")
+    return algorithm, digest
+
+
+def digests_from_headers(headers, partial=False):
+    """Digests of the *whole file* a response announces, as {algorithm: hex}.
+
+    Repr-Digest (RFC 9530) and Digest (RFC 3230) describe the full representation, so they
+    count even on a 206. Content-Digest and Content-MD5 describe just the bytes of this
+    response - only usable when it carried the whole file (partial=False).
+    """
+    found = {}
+    sources = [("repr-digest", STRUCTURED_DIGEST), ("digest", LEGACY_DIGEST)]
+    if not partial:
+        sources.append(("content-digest", STRUCTURED_DIGEST))
+
+    for header, pattern in sources:
+        for item in headers.get(header, "").split(","):
+            match = pattern.fullmatch(item)
+            if not match:
+                continue
+            algorithm = ALGORITHMS.get(match.group(1).lower())
+            digest = b64_to_hex(match.group(2))
+            if algorithm and digest and len(digest) == hashlib.new(algorithm).digest_size * 2:
+                found.setdefault(algorithm, digest)
+
+    if not partial and "content-md5" in headers:
+        digest = b64_to_hex(headers["content-md5"].strip())
+        if digest and len(digest) == 32:
+            found.setdefault("md5", digest)
+    return found
+
+
+if hasattr(os, "pread"):
+    def read_at(fd, size, offset):
+        return os.pread(fd, size, offset)
+else:
+    def read_at(fd, size, offset):
+        # Only ever called on the file's writer thread, so the seek can't race a write
+        os.lseek(fd, offset, os.SEEK_SET)
+        return os.read(fd, size)
+
+
+class InlineVerifier:
+    """Hashes a download in file order while it's being written - no second pass over the file.
+
+    Hooked into DownloadWriter(on_write=verifier.update): runs on the writer thread right
+    after each write, with the chunks still in memory. Bytes arriving in order (a single
+    stream, or the segment holding the hashed prefix) are hashed straight from those chunks.
+    Ranges written further ahead by other segments are only noted; once the prefix reaches
+    them they're read back with pread - from the page cache, they were written moments ago.
+    Ranges already on disk from an earlier (resumed) run are added with existing().
+    """
+
+    def __init__(self, expected, size=None):
+        # expected: {algorithm: hex} - a None hex only computes the digest (e.g. for a content-addressed store)
+        self.expected = dict(expected)
+        self.size = size
+        self._hashes = {algorithm: hashlib.new(algorithm) for algorithm in self.expected}
+        self.position = 0
+        self._ahead = {}
+
+        # Stats
+        self.read_back_bytes = 0
+
+    def existing(self, ranges):
+        for start, end in ranges:
+            self._ahead[start] = end - start + 1
+
+    def update(self, fd, offset, chunks):
+        size = sum(len(chunk) for chunk in chunks)
+        if offset != self.position:
+            self._ahead[offset] = size
+            return
+        for chunk in chunks:
+            for digest in self._hashes.values():
+                digest.update(chunk)
+        self.position += size
+        self._catch_up(fd)
+
+    def _catch_up(self, fd):
+        while self.position in self._ahead:
+            end = self.position + self._ahead.pop(self.position)
+            while self.position < end:
+                chunk = read_at(fd, min(READ_BACK_SIZE, end - self.position), self.position)
+                if not chunk:
+                    raise IntegrityError(f"File ends at byte {self.position}, expected {end}")
+                for digest in self._hashes.values():
+                    digest.update(chunk)
+                self.position += len(chunk)
+                self.read_back_bytes += len(chunk)
+
+    def hexdigests(self):
+        return {algorithm: digest.hexdigest() for algorithm, digest in self._hashes.items()}
+
+    def verify(self, fd):
+        """Hash whatever is still ahead of the prefix, then compare - raises IntegrityError (writer thread)"""
+        self._catch_up(fd)
+        if self.size is not None and self.position != self.size:
+            raise IntegrityError(f"Only {self.position} of {self.size} bytes could be hashed")
+        for algorithm, digest in self.hexdigests().items():
+            if self.expected[algorithm] is not None and digest != self.expected[algorithm]:
+                raise IntegrityError(f"{algorithm} mismatch: got {digest}, expected {self.expected[algorithm]}")
+        return self.hexdigests()
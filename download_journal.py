@@ -0,0 +1,137 @@
+"""Sidecar checkpoint journal for resumable downloads: completed byte ranges + the validator they belong to"""
+import json
+import os
+import threading
+
+# Suffix of the sidecar file next to the download
+JOURNAL_SUFFIX = ".journal.json"
+
+
+def merge_range(ranges, start, end):
+    """Insert inclusive [start, end] into sorted, non-overlapping `ranges` (adjacent ranges are joined)"""
+    merged = []
+    placed = False
+    for low, high in ranges:
+        if high + 1 < start:
+            merged.append([low, high])
+        elif end + 1 < low:
+            if not placed:
+                merged.append([start, end])
+                placed = True
+            merged.append([low, high])
+        else:
+            start, end = min(start, low), max(end, high)
+    if not placed:
+        merged.append([start, end])
+    return merged
+
+
+def missing_ranges(ranges, size):
+    """Inclusive byte ranges of [0, size) not covered by `ranges`"""
+    gaps = []
+    position = 0
+    for low, high in ranges:
+        if low > position:
+            gaps.append((position, low - 1))
+        position = max(position, high + 1)
+    if position < size:
+        gaps.append((position, size - 1))
+    return gaps
+
+
+def resume_validator(etag, last_modified):
+    """What to send in If-Range - a strong ETag, else Last-Modified (weak ETags aren't allowed there)"""
+    if etag and not etag.startswith("W/"):
+        return etag
+    return last_modified
+
+
+class DownloadJournal:
+    """Which byte ranges of `path` are already on disk, and for which version of the resource.
+
+        journal = DownloadJournal.load(path)
+        if not journal.matches(url, size, etag, last_modified):
+            journal.reset(url, size, etag, last_modified)   # stale partial → start over
+        for start, end in journal.missing():
+            ...  # fetch with Range + If-Range: journal.validator
+            journal.add(start, end)
+            journal.save()
+
+    The journal is small JSON written with write-to-temp + rename, so a crash leaves
+    either the old or the new checkpoint - never a torn one. Ranges are only added after
+    their bytes were written (and, with save(sync_fd=fd), flushed) to the data file.
+    """
+
+    def __init__(self, path, url=None, size=None, etag=None, last_modified=None, completed=None):
+        self.path = path
+        self.journal_path = path + JOURNAL_SUFFIX
+        self.url = url
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.completed = completed or []
+        # Segments checkpoint from worker threads - one writer of the temp file at a time
+        self._save_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """The journal next to `path` - empty if there is none (or it's unreadable)"""
+        try:
+            with open(path + JOURNAL_SUFFIX, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            return cls(path, data["url"], data["size"], data.get("etag"), data.get("last_modified"), [list(r) for r in data["completed"]])
+        except (OSError, ValueError, KeyError, TypeError):
+            return cls(path)
+
+    @property
+    def validator(self):
+        return resume_validator(self.etag, self.last_modified)
+
+    @property
+    def completed_bytes(self):
+        return sum(high - low + 1 for low, high in self.completed)
+
+    def matches(self, url, size, etag, last_modified):
+        """True when the partial file on disk is the same version of the same resource"""
+        if not self.completed or self.url != url or self.size != size or not os.path.exists(self.path):
+            return False
+        if resume_validator(etag, last_modified) is None:
+            # Without a validator we can't prove the server still has the same bytes
+            return False
+        return (self.etag, self.last_modified) == (etag, last_modified)
+
+    def reset(self, url, size, etag, last_modified):
+        self.url, self.size, self.etag, self.last_modified = url, size, etag, last_modified
+        self.completed = []
+
+    def add(self, start, end):
+        self.completed = merge_range(self.completed, start, end)
+
+    def missing(self):
+        return missing_ranges(self.completed, self.size)
+
+    def save(self, sync_fd=None):
+        """Atomically write the checkpoint (after fsyncing the data file, when given)"""
+        # Snapshot first: ranges added while we fsync might not be covered by it
+        data = {
+            "url": self.url,
+            "size": self.size,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "completed": self.completed,
+        }
+        if sync_fd is not None:
+            getattr(os, "fdatasync", os.fsync)(sync_fd)
+        temp_path = self.journal_path + ".tmp"
+        with self._save_lock:
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(data, file)
+            os.replace(temp_path, self.journal_path)
+
+    def discard(self):
+        """Forget the checkpoint (download finished, or the partial is stale)"""
+        for leftover in (self.journal_path, self.journal_path + ".tmp"):
+            try:
+                os.remove(leftover)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,165 @@
+"""Dedicated writer stage for downloads: coalesce network chunks into large aligned writes off the event loop"""
+import asyncio
+import concurrent.futures
+import os
+import threading
+
+# Default size of one write (and the alignment of every write after a segment's first)
+WRITE_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Filled buffers a file may have queued for the writer thread before readers have to wait
+MAX_PENDING_WRITES = 4
+
+# Max iovecs per pwritev call (POSIX guarantees at least 16, Linux allows 1024)
+try:
+    IOV_MAX = os.sysconf("SC_IOV_MAX")
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 16
+if IOV_MAX <= 0:
+    IOV_MAX = 16
+
+
+def write_vectored(fd, chunks, offset, lock):
+    """Write `chunks` back to back at `offset` - one pwritev per IOV_MAX chunks, no joining copy"""
+    if not hasattr(os, "pwritev"):
+        # Windows: one joined write under the lock (seek + write must not interleave)
+        data = memoryview(b"".join(chunks))
+        with lock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            while data:
+                data = data[os.write(fd, data):]
+        return
+
+    for start in range(0, len(chunks), IOV_MAX):
+        batch = chunks[start:start + IOV_MAX]
+        size = sum(len(chunk) for chunk in batch)
+        written = os.pwritev(fd, batch, offset)
+        if written < size:
+            # Short write (signal, nearly-full disk) - finish the rest the simple way
+            rest = memoryview(b"".join(batch))[written:]
+            position = offset + written
+            while rest:
+                count = os.pwrite(fd, rest, position)
+                rest = rest[count:]
+                position += count
+        offset += size
+
+
+class DownloadWriter:
+    """Owns one open file and writes to it from its own thread.
+
+    Segments hand over whole buffers (lists of the network chunks, never copied) with
+    submit(); the call only waits when `max_pending` buffers are already queued, so the
+    socket keeps being read while the previous buffer hits the disk. Writes run FIFO on
+    a single dedicated thread and close() queues the fd's close behind them, so the fd
+    is never closed under an in-flight write - even if the download task is cancelled.
+
+    A failed write is re-raised from the next submit() / drain() / close().
+
+    on_write(fd, offset, chunks) runs on the writer thread right after each write, while the
+    chunks are still in memory (InlineVerifier hashes them there).
+    """
+
+    def __init__(self, fd, max_pending=MAX_PENDING_WRITES, on_write=None):
+        self.fd = fd
+        self.on_write = on_write
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="download-writer")
+        self._slots = asyncio.Semaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._error = None
+
+        # Stats
+        self.writes = 0
+        self.bytes_written = 0
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    async def submit(self, offset, chunks, on_written=None):
+        """Queue chunks for writing at offset; on_written(offset, size) runs on the loop once they're on disk"""
+        self._raise_error()
+        await self._slots.acquire()
+        size = sum(len(chunk) for chunk in chunks)
+        future = asyncio.get_running_loop().run_in_executor(self._executor, self._write, offset, chunks)
+        self._pending.add(future)
+
+        def done(future):
+            self._pending.discard(future)
+            self._slots.release()
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                self._error = self._error or future.exception()
+                return
+            self.writes += 1
+            self.bytes_written += size
+            if on_written is not None:
+                on_written(offset, size)
+
+        future.add_done_callback(done)
+
+    def _write(self, offset, chunks):
+        write_vectored(self.fd, chunks, offset, self._lock)
+        if self.on_write is not None:
+            self.on_write(self.fd, offset, chunks)
+
+    async def run(self, func, *args):
+        """Run func(*args) on the writer thread, after every write queued so far (e.g. an fsync + checkpoint)"""
+        self._raise_error()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def drain(self):
+        """Wait until everything submitted so far is on disk"""
+        while self._pending:
+            await asyncio.wait(list(self._pending))
+        self._raise_error()
+
+    async def close(self):
+        """Finish queued writes, then close the fd (on the writer thread, so nothing races it)"""
+        closing = asyncio.get_running_loop().run_in_executor(self._executor, os.close, self.fd)
+        self._executor.shutdown(wait=False)
+        # shield: if we're cancelled here the close still happens, in order, on the writer thread
+        await asyncio.shield(closing)
+        self._raise_error()
+
+
+class ChunkCoalescer:
+    """Collects one segment's network chunks into `buffer_size` writes ending on aligned offsets.
+
+    The first write of a segment runs up to the next multiple of buffer_size; every write
+    after it is exactly buffer_size at an aligned offset (the last one is whatever's left).
+    Chunks are kept by reference and split with memoryview, so coalescing copies nothing.
+    """
+
+    __slots__ = ("offset", "buffer_size", "chunks", "size", "boundary")
+
+    def __init__(self, offset, buffer_size=WRITE_BUFFER_SIZE):
+        self.offset = offset
+        self.buffer_size = buffer_size
+        self.chunks = []
+        self.size = 0
+        self.boundary = (offset // buffer_size + 1) * buffer_size
+
+    def add(self, chunk):
+        """Buffer chunk - returns the (offset, chunks) writes that are now full"""
+        ready = []
+        view = memoryview(chunk)
+        while view:
+            room = self.boundary - (self.offset + self.size)
+            piece, view = (view, view[len(view):]) if len(view) <= room else (view[:room], view[room:])
+            self.chunks.append(piece)
+            self.size += len(piece)
+            if self.offset + self.size == self.boundary:
+                ready.append(self.take())
+        return ready
+
+    def take(self):
+        """Hand over whatever is buffered (end of the segment, or before giving up on it)"""
+        write = (self.offset, self.chunks)
+        self.offset += self.size
+        self.chunks = []
+        self.size = 0
+        self.boundary = (self.offset // self.buffer_size + 1) * self.buffer_size
+        return write
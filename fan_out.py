@@ -0,0 +1,161 @@
+"""Bounded-memory streaming fan-out: run an async function over a huge (async) iterable, N at a time"""
+import asyncio
+import collections
+
+
+class FanOut:
+    """Runs `func(item)` for every input with at most `concurrency` calls in flight.
+
+    Inputs are pulled from the (async) iterator only when a slot is free, and results
+    are yielded as `(item, result)` pairs - so memory is O(concurrency), not O(inputs).
+    The producer is never read ahead of the consumer: stop iterating and nothing new starts.
+
+        fan_out = FanOut(fetch, concurrency=50)
+        async for product_id, response in fan_out.map(product_ids):
+            ...
+
+    ordered=False (default)
+        Results come out in completion order.
+
+    ordered=True
+        Results come out in input order. Finished results wait in a reorder buffer of at
+        most `reorder_buffer` entries (default 2 × concurrency); when one slow call holds
+        the buffer full, no new inputs are started until it finishes.
+
+    With return_exceptions=True a failed call yields its exception as the result;
+    otherwise the first failure cancels everything in flight and is raised.
+    Breaking out early cancels the rest once the generator is closed - wrap it in
+    contextlib.aclosing() to make that immediate.
+    """
+
+    def __init__(self, func, concurrency=100, ordered=False, reorder_buffer=None, return_exceptions=False):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+
+        self.func = func
+        self.concurrency = concurrency
+        self.ordered = ordered
+        self.reorder_buffer = max(reorder_buffer or 2 * concurrency, concurrency)
+        self.return_exceptions = return_exceptions
+
+        # Stats
+        self.started = 0
+        self.completed = 0
+        self.failed = 0
+        self.peak_in_flight = 0
+        self.peak_buffered = 0
+
+    async def _call(self, item):
+        return await self.func(item)
+
+    async def map(self, inputs):
+        """Async generator of (item, result) pairs - see the class docstring for ordering"""
+        if hasattr(inputs, "__anext__") or hasattr(inputs, "__aiter__"):
+            iterator = inputs.__aiter__()
+
+            async def next_item():
+                try:
+                    return True, await iterator.__anext__()
+                except StopAsyncIteration:
+                    return False, None
+        else:
+            iterator = iter(inputs)
+
+            async def next_item():
+                for item in iterator:
+                    return True, item
+                return False, None
+
+        # task → (index, item)
+        pending = {}
+        # index → (item, result) finished but waiting for earlier inputs (ordered mode only)
+        buffered = {}
+        next_index = 0
+        next_to_yield = 0
+        exhausted = False
+
+        # Finished tasks land here via done-callbacks (O(1) per call, unlike asyncio.wait over the whole set)
+        done = collections.deque()
+        loop = asyncio.get_running_loop()
+        wakeup = None
+
+        def on_done(task):
+            done.append(task)
+            if wakeup is not None and not wakeup.done():
+                wakeup.set_result(None)
+
+        try:
+            while True:
+                # Top up the in-flight set - only as far as the reorder window allows
+                while not exhausted and len(pending) < self.concurrency and next_index - next_to_yield < self.reorder_buffer:
+                    has_item, item = await next_item()
+                    if not has_item:
+                        exhausted = True
+                        break
+                    task = asyncio.ensure_future(self._call(item))
+                    task.add_done_callback(on_done)
+                    pending[task] = (next_index, item)
+                    next_index += 1
+                    self.started += 1
+
+                self.peak_in_flight = max(self.peak_in_flight, len(pending))
+
+                if not pending:
+                    return
+
+                if not done:
+                    wakeup = loop.create_future()
+                    await wakeup
+                    wakeup = None
+
+                finished = []
+                while done:
+                    task = done.popleft()
+                    index, item = pending.pop(task)
+                    self.completed += 1
+                    # A worker cancelled from outside counts as a failure (its CancelledError is the
+                    # result, like asyncio.gather) - task.exception() would raise it right here instead
+                    error = asyncio.CancelledError(f"Worker for {item!r} was cancelled") if task.cancelled() else task.exception()
+                    if error is not None:
+                        self.failed += 1
+                        if not self.return_exceptions:
+                            raise error
+                        result = error
+                    else:
+                        result = task.result()
+                    finished.append((index, item, result))
+
+                if not self.ordered:
+                    for index, item, result in finished:
+                        next_to_yield += 1
+                        yield item, result
+                    continue
+
+                for index, item, result in finished:
+                    buffered[index] = (item, result)
+                self.peak_buffered = max(self.peak_buffered, len(buffered))
+
+                while next_to_yield in buffered:
+                    yield buffered.pop(next_to_yield)
+                    next_to_yield += 1
+        finally:
+            # Consumer broke out early / a call failed - don't leave orphaned requests running
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def stats(self):
+        """How many calls ran and how much was ever held at once"""
+        return {
+            "started": self.started,
+            "completed": self.completed,
+            "failed": self.failed,
+            "peak_in_flight": self.peak_in_flight,
+            "peak_buffered": self.peak_buffered,
+        }
+
+
+def fan_out(func, inputs, concurrency=100, ordered=False, reorder_buffer=None, return_exceptions=False):
+    """Shortcut for FanOut(...).map(inputs)"""
+    return FanOut(func, concurrency, ordered, reorder_buffer, return_exceptions).map(inputs)
@@ -0,0 +1,193 @@
+"""Rolling health windows used by the enterprise circuit breaker (async.py)"""
+
+
+class RollingHealthWindow:
+    """Ring buffer of the last `window_size` requests with running sums.
+
+    Every request writes one slot and evicts the oldest one, so recording a
+    request and reading the success rate / mean latency is O(1) no matter how
+    big the window is.
+    """
+
+    __slots__ = (
+        "window_size",
+        "latencies",
+        "outcomes",
+        "position",
+        "count",
+        "latency_sum",
+        "success_sum",
+    )
+
+    def __init__(self, window_size=100):
+        if window_size < 1:
+            raise ValueError("window_size must be at least 1")
+
+        self.window_size = window_size
+
+        # Preallocated slots - nothing is appended or popped after this point.
+        self.latencies = [0.0] * window_size
+        self.outcomes = bytearray(window_size)  # 1 = success, 0 = failure
+
+        # Next slot to overwrite and how many slots hold real requests.
+        self.position = 0
+        self.count = 0
+
+        # Running totals over the slots currently in the window.
+        self.latency_sum = 0.0
+        self.success_sum = 0
+
+    def record(self, response_time, success):
+        """Record one request, evicting the oldest one once the window is full"""
+        position = self.position
+        outcome = 1 if success else 0
+
+        if self.count == self.window_size:
+            # Window is full → subtract the request we are about to overwrite.
+            self.latency_sum -= self.latencies[position]
+            self.success_sum -= self.outcomes[position]
+        else:
+            self.count += 1
+
+        self.latencies[position] = response_time
+        self.outcomes[position] = outcome
+        self.latency_sum += response_time
+        self.success_sum += outcome
+
+        position += 1
+        self.position = 0 if position == self.window_size else position
+
+    def success_rate(self):
+        """Share of successful requests in the window (1.0 when empty)"""
+        if self.count == 0:
+            return 1.0
+        return self.success_sum / self.count
+
+    def failure_count(self):
+        """Number of failed requests in the window"""
+        return self.count - self.success_sum
+
+    def mean_latency(self):
+        """Mean response time of the requests in the window (0.0 when empty)"""
+        if self.count == 0:
+            return 0.0
+        # Running float sums can drift a hair below zero after many evictions.
+        return max(self.latency_sum, 0.0) / self.count
+
+    def reset(self):
+        """Forget every request in the window"""
+        self.position = 0
+        self.count = 0
+        self.latency_sum = 0.0
+        self.success_sum = 0
+
+
+class SlidingTimeWindow:
+    """Per-second buckets over the last `window_seconds` seconds.
+
+    Each bucket holds request count, failures, slow calls and latency sum, and the
+    window keeps running totals across all buckets. Rotating to a new second only
+    clears the buckets that expired, so recording a request stays O(1).
+    """
+
+    __slots__ = (
+        "window_seconds",
+        "requests",
+        "failures",
+        "slow_calls",
+        "latency_sums",
+        "current_second",
+        "total_requests",
+        "total_failures",
+        "total_slow_calls",
+        "total_latency",
+    )
+
+    def __init__(self, window_seconds=10):
+        if window_seconds < 1:
+            raise ValueError("window_seconds must be at least 1")
+
+        self.window_seconds = window_seconds
+
+        # One slot per second, reused round-robin (bucket for second s lives at s % window_seconds)
+        self.requests = [0] * window_seconds
+        self.failures = [0] * window_seconds
+        self.slow_calls = [0] * window_seconds
+        self.latency_sums = [0.0] * window_seconds
+
+        # Newest second the buckets cover + running totals over every live bucket
+        self.current_second = 0
+        self.total_requests = 0
+        self.total_failures = 0
+        self.total_slow_calls = 0
+        self.total_latency = 0.0
+
+    def advance(self, now):
+        """Expire buckets older than the window; returns the bucket index for `now`"""
+        second = int(now)
+        current = self.current_second
+
+        # Same second (or the clock stepped back) → keep filling the newest bucket
+        if second <= current:
+            return current % self.window_seconds
+
+        if second - current >= self.window_seconds:
+            # Idle for a whole window - everything expired
+            for index in range(self.window_seconds):
+                self.requests[index] = 0
+                self.failures[index] = 0
+                self.slow_calls[index] = 0
+                self.latency_sums[index] = 0.0
+            self.total_requests = 0
+            self.total_failures = 0
+            self.total_slow_calls = 0
+            self.total_latency = 0.0
+        else:
+            # Clear only the buckets we skipped over (at most window_seconds of them)
+            for expired in range(current + 1, second + 1):
+                index = expired % self.window_seconds
+                self.total_requests -= self.requests[index]
+                self.total_failures -= self.failures[index]
+                self.total_slow_calls -= self.slow_calls[index]
+                self.total_latency -= self.latency_sums[index]
+                self.requests[index] = 0
+                self.failures[index] = 0
+                self.slow_calls[index] = 0
+                self.latency_sums[index] = 0.0
+
+        self.current_second = second
+        return second % self.window_seconds
+
+    def record(self, now, response_time, success, slow):
+        """Count one request in the bucket for `now`"""
+        index = self.advance(now)
+
+        self.requests[index] += 1
+        self.latency_sums[index] += response_time
+        self.total_requests += 1
+        self.total_latency += response_time
+
+        if not success:
+            self.failures[index] += 1
+            self.total_failures += 1
+        if slow:
+            self.slow_calls[index] += 1
+            self.total_slow_calls += 1
+
+    def failure_rate(self):
+        """Failed share of the requests in the window (0.0 when empty)"""
+        if self.total_requests == 0:
+            return 0.0
+        return self.total_failures / self.total_requests
+
+    def slow_call_rate(self):
+        """Slow share of the requests in the window (0.0 when empty)"""
+        if self.total_requests == 0:
+            return 0.0
+        return self.total_slow_calls / self.total_requests
+
+    def mean_latency(self):
+        """Mean response time over the window (0.0 when empty)"""
+        if self.total_requests == 0:
+            return 0.0
+        return max(self.total_latency, 0.0) / self.total_requests
@@ -0,0 +1,396 @@
+"""In-memory HTTP response cache (httpx transport) - RFC 9111 freshness, ETag/Last-Modified revalidation,
+stale-while-revalidate / stale-if-error, and a byte-bounded LRU"""
+import asyncio
+import collections
+import time
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+# Status codes a cache may store (and give heuristic freshness to) without explicit Cache-Control
+HEURISTICALLY_CACHEABLE = frozenset([200, 203, 204, 300, 301, 308, 404, 405, 410, 414, 501])
+
+# Headers a 304 must not overwrite on the stored response
+NOT_UPDATED_BY_304 = frozenset([b"content-length", b"content-encoding", b"transfer-encoding", b"content-range"])
+
+# Heuristic freshness = 10% of the time since Last-Modified, capped at a day
+HEURISTIC_FRACTION = 0.1
+HEURISTIC_MAX = 86400
+
+
+def parse_cache_control(value):
+    """'max-age=60, no-cache' → {"max-age": "60", "no-cache": None}"""
+    directives = {}
+    if not value:
+        return directives
+    for part in value.split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip().strip('"') if argument else None
+    return directives
+
+
+def directive_seconds(directives, name):
+    """Integer argument of a directive (None if missing or invalid)"""
+    try:
+        return max(0, int(directives[name]))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def parse_http_date(value):
+    """HTTP date header → unix timestamp (None if missing or invalid)"""
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+class CacheEntry:
+    """A stored response plus everything needed to work out its age"""
+
+    __slots__ = ("status_code", "headers", "content", "extensions", "vary", "response_time", "date", "age", "directives", "size")
+
+    def __init__(self, status_code, headers, content, extensions, vary, response_time):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.extensions = extensions
+        self.vary = vary
+        self.refresh(response_time)
+
+    def refresh(self, response_time):
+        """Recompute the age inputs after storing / revalidating"""
+        headers = httpx.Headers(self.headers)
+        self.response_time = response_time
+        self.date = parse_http_date(headers.get("date")) or response_time
+        try:
+            self.age = max(0, int(headers.get("age", "0")))
+        except ValueError:
+            self.age = 0
+        self.directives = parse_cache_control(headers.get("cache-control"))
+        self.size = len(self.content) + sum(len(name) + len(value) for name, value in self.headers)
+
+    def current_age(self, now):
+        """RFC 9111 §4.2.3 (initial age from Date/Age + time spent in the cache)"""
+        apparent_age = max(0.0, self.response_time - self.date)
+        return max(apparent_age, self.age) + (now - self.response_time)
+
+    def freshness_lifetime(self):
+        """RFC 9111 §4.2.1 for a private cache: max-age, then Expires, then the Last-Modified heuristic"""
+        max_age = directive_seconds(self.directives, "max-age")
+        if max_age is not None:
+            return max_age
+
+        headers = httpx.Headers(self.headers)
+        if "expires" in headers:
+            expires = parse_http_date(headers["expires"])
+            # An invalid Expires (e.g. "0") means "already expired"
+            return max(0.0, expires - self.date) if expires is not None else 0
+
+        last_modified = parse_http_date(headers.get("last-modified"))
+        if last_modified is not None and self.status_code in HEURISTICALLY_CACHEABLE:
+            return min(HEURISTIC_MAX, max(0.0, self.date - last_modified) * HEURISTIC_FRACTION)
+
+        return 0
+
+    def validators(self):
+        """Conditional request headers for revalidation"""
+        headers = httpx.Headers(self.headers)
+        conditional = {}
+        if "etag" in headers:
+            conditional["If-None-Match"] = headers["etag"]
+        if "last-modified" in headers:
+            conditional["If-Modified-Since"] = headers["last-modified"]
+        return conditional
+
+
+class CachingTransport(httpx.AsyncBaseTransport):
+    """httpx transport that answers repeat GETs from memory when HTTP caching rules allow.
+
+        client = httpx.AsyncClient(transport=CachingTransport(max_bytes=64 * 1024 * 1024, http2=True))
+
+    Every response says what happened in `response.extensions["cache_status"]`:
+    "HIT", "MISS", "REVALIDATED" (304 from origin), "STALE" (stale-while-revalidate /
+    stale-if-error) or "BYPASS".
+    """
+
+    def __init__(self, transport=None, max_bytes=64 * 1024 * 1024, max_entry_bytes=None, **transport_kwargs):
+        self._transport = transport or httpx.AsyncHTTPTransport(**transport_kwargs)
+        self.max_bytes = max_bytes
+
+        # A single response may take at most this much of the cache (default 1/8)
+        self.max_entry_bytes = max_entry_bytes or max_bytes // 8
+
+        # LRU: oldest entries first
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+
+        # Background stale-while-revalidate refreshes (one per key at a time)
+        self._refreshing = {}
+
+        self.counters = collections.Counter()
+
+    # ------------------------------------------------------------------ storage
+
+    def cache_key(self, request):
+        return str(request.url)
+
+    def _lookup(self, key, request):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        # Vary: the stored response only matches requests with the same values for those headers
+        for name, value in entry.vary.items():
+            if request.headers.get(name) != value:
+                return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key, entry):
+        if entry.size > self.max_entry_bytes:
+            return
+
+        self._discard(key)
+        self._entries[key] = entry
+        self._bytes += entry.size
+        self.counters["stores"] += 1
+        self._evict()
+
+    def _evict(self):
+        """Evict least recently used until we fit again"""
+        while self._bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            self.counters["evictions"] += 1
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _storable(self, request, response):
+        """May this response be stored at all?"""
+        if response.status_code not in HEURISTICALLY_CACHEABLE:
+            return False
+        directives = parse_cache_control(response.headers.get("cache-control"))
+        if "no-store" in directives or "no-store" in parse_cache_control(request.headers.get("cache-control")):
+            return False
+        if response.headers.get("vary", "").strip() == "*":
+            return False
+        return True
+
+    def _entry_from(self, request, response, content, response_time):
+        vary = {}
+        for name in response.headers.get("vary", "").split(","):
+            name = name.strip().lower()
+            if name:
+                vary[name] = request.headers.get(name)
+        extensions = {name: response.extensions[name] for name in ("http_version", "reason_phrase") if name in response.extensions}
+        return CacheEntry(response.status_code, list(response.headers.raw), content, extensions, vary, response_time)
+
+    def _cached_response(self, entry, now, cache_status):
+        """Fresh Response object for a stored entry, with an up-to-date Age header"""
+        headers = [(name, value) for name, value in entry.headers if name.lower() != b"age"]
+        headers.append((b"Age", str(int(entry.current_age(now))).encode("ascii")))
+        self.counters["bytes_served"] += len(entry.content)
+        return httpx.Response(
+            entry.status_code,
+            headers=headers,
+            stream=httpx.ByteStream(entry.content),
+            extensions={**entry.extensions, "cache_status": cache_status},
+        )
+
+    # ------------------------------------------------------------------ request flow
+
+    async def handle_async_request(self, request):
+        if request.method != "GET":
+            response = await self._transport.handle_async_request(request)
+            # Unsafe methods invalidate what we know about the URL (RFC 9111 §4.4)
+            if request.method not in ("HEAD", "OPTIONS", "TRACE") and response.status_code < 400:
+                self._discard(self.cache_key(request))
+            response.extensions["cache_status"] = "BYPASS"
+            return response
+
+        # no-store, or the caller is doing its own conditional request → not our business
+        request_directives = parse_cache_control(request.headers.get("cache-control"))
+        if "no-store" in request_directives or "if-none-match" in request.headers or "if-modified-since" in request.headers:
+            self.counters["bypass"] += 1
+            response = await self._transport.handle_async_request(request)
+            response.extensions["cache_status"] = "BYPASS"
+            return response
+
+        key = self.cache_key(request)
+        entry = self._lookup(key, request)
+        now = time.time()
+
+        if entry is not None:
+            age = entry.current_age(now)
+            lifetime = entry.freshness_lifetime()
+            must_revalidate = "no-cache" in entry.directives or "no-cache" in request_directives
+            request_max_age = directive_seconds(request_directives, "max-age")
+            if request_max_age is not None and age > request_max_age:
+                must_revalidate = True
+
+            # Fresh → straight from memory
+            if not must_revalidate and age < lifetime:
+                self.counters["hits"] += 1
+                return self._cached_response(entry, now, "HIT")
+
+            # Stale but inside stale-while-revalidate → answer now, refresh in the background
+            swr = directive_seconds(entry.directives, "stale-while-revalidate")
+            if not must_revalidate and "must-revalidate" not in entry.directives and swr is not None and age < lifetime + swr:
+                self.counters["stale_hits"] += 1
+                if key not in self._refreshing:
+                    self._refreshing[key] = asyncio.ensure_future(self._background_revalidate(key, entry, request))
+                return self._cached_response(entry, now, "STALE")
+
+            return await self._revalidate(key, entry, request, now)
+
+        self.counters["misses"] += 1
+        return await self._fetch_and_store(key, request, "MISS")
+
+    async def _fetch_and_store(self, key, request, cache_status):
+        """Go to the origin; tee the body into the cache while the caller reads it"""
+        response = await self._transport.handle_async_request(request)
+        return self._tee(key, request, response, time.time(), cache_status)
+
+    def _tee(self, key, request, response, response_time, cache_status):
+        if not self._storable(request, response):
+            response.extensions["cache_status"] = cache_status
+            return response
+
+        length = response.headers.get("content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_entry_bytes:
+            response.extensions["cache_status"] = cache_status
+            return response
+
+        def store(content):
+            self._store(key, self._entry_from(request, response, content, response_time))
+
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers.raw,
+            stream=CacheFillingStream(response.stream, self.max_entry_bytes, store),
+            extensions={**response.extensions, "cache_status": cache_status},
+        )
+
+    async def _revalidate(self, key, entry, request, now):
+        """Conditional request: 304 → serve stored body, anything else → replace the entry"""
+        validators = entry.validators()
+        if not validators:
+            self.counters["misses"] += 1
+            return await self._fetch_and_store(key, request, "MISS")
+
+        conditional = httpx.Request(
+            request.method,
+            request.url,
+            headers=[*request.headers.raw, *[(name.encode("ascii"), value.encode("latin-1")) for name, value in validators.items()]],
+            extensions=request.extensions,
+        )
+
+        try:
+            response = await self._transport.handle_async_request(conditional)
+        except httpx.TransportError:
+            stale = self._stale_if_error(entry, now)
+            if stale is not None:
+                return stale
+            raise
+
+        if response.status_code == 304:
+            await response.aclose()
+            self._merge_304(key, entry, response)
+            self.counters["revalidated"] += 1
+            return self._cached_response(entry, time.time(), "REVALIDATED")
+
+        if response.status_code >= 500:
+            stale = self._stale_if_error(entry, now)
+            if stale is not None:
+                await response.aclose()
+                return stale
+
+        # New representation - hand it over (and store it) like a miss
+        self.counters["misses"] += 1
+        return self._tee(key, request, response, time.time(), "MISS")
+
+    async def _background_revalidate(self, key, entry, request):
+        try:
+            response = await self._revalidate(key, entry, request, time.time())
+            # Drain the body so a replacement entry actually gets stored
+            await response.aread()
+            await response.aclose()
+        except Exception:
+            self.counters["background_errors"] += 1
+        finally:
+            self._refreshing.pop(key, None)
+
+    def _merge_304(self, key, entry, response):
+        """RFC 9111 §4.3.4 - the 304's headers replace the stored ones (except the body-describing ones)"""
+        updates = {name.lower(): value for name, value in response.headers.raw if name.lower() not in NOT_UPDATED_BY_304}
+        headers = [(name, value) for name, value in entry.headers if name.lower() not in updates]
+        headers.extend((name, value) for name, value in response.headers.raw if name.lower() in updates)
+
+        old_size = entry.size
+        entry.headers = headers
+        entry.refresh(time.time())
+        # A background revalidation may finish after the entry was evicted or replaced - only a
+        # stored entry counts towards _bytes
+        if self._entries.get(key) is entry:
+            self._bytes += entry.size - old_size
+            self._evict()
+
+    def _stale_if_error(self, entry, now):
+        """Stale entry allowed by stale-if-error, or None"""
+        window = directive_seconds(entry.directives, "stale-if-error")
+        if window is None or "must-revalidate" in entry.directives:
+            return None
+        if entry.current_age(now) >= entry.freshness_lifetime() + window:
+            return None
+        self.counters["stale_if_error"] += 1
+        return self._cached_response(entry, now, "STALE")
+
+    def stats(self):
+        """Hit/miss/byte counters for sizing the cache"""
+        lookups = self.counters["hits"] + self.counters["stale_hits"] + self.counters["revalidated"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "entries": len(self._entries),
+            "bytes_stored": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hit_ratio": (self.counters["hits"] + self.counters["stale_hits"] + self.counters["revalidated"]) / lookups if lookups else 0.0,
+        }
+
+    async def aclose(self):
+        for task in list(self._refreshing.values()):
+            task.cancel()
+        await self._transport.aclose()
+
+
+class CacheFillingStream(httpx.AsyncByteStream):
+    """Passes the body through to the caller and keeps a copy for the cache (up to `limit` bytes)"""
+
+    def __init__(self, stream, limit, on_complete):
+        self._stream = stream
+        self._limit = limit
+        self._on_complete = on_complete
+
+    async def __aiter__(self):
+        chunks = []
+        size = 0
+        async for chunk in self._stream:
+            if chunks is not None:
+                size += len(chunk)
+                if size > self._limit:
+                    chunks = None  # too big to cache - keep streaming, stop copying
+                else:
+                    chunks.append(chunk)
+            yield chunk
+
+        # Only a fully read body gets stored
+        if chunks is not None:
+            self._on_complete(b"".join(chunks))
+
+    async def aclose(self):
+        await self._stream.aclose()
@@ -0,0 +1,251 @@
+"""Pluggable JSON codec - the fastest installed backend, big bodies decoded off the event loop, optional typed decoding"""
+import asyncio
+import concurrent.futures
+import dataclasses
+import json
+import re
+import types
+import typing
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# Bodies at least this big are decoded on the codec's executor - below it the hop costs more than the parse
+OFFLOAD_THRESHOLD = 256 * 1024
+
+# Container levels decode_chunked walks itself before handing whole values to the C scanner
+# (2 → {"data": [record, record, ...]} is decoded one record at a time)
+CHUNKED_DEPTH = 2
+
+# Backends in order of preference when none is named ("chunked" is opt-in only)
+PREFERENCE = ("orjson", "msgspec", "stdlib")
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+_scanner = json.JSONDecoder()
+
+
+class JSONBackend:
+    """One JSON library: loads(bytes | str) → Python objects, dumps(obj) → bytes"""
+
+    __slots__ = ("name", "loads", "dumps", "loads_typed")
+
+    def __init__(self, name, loads, dumps, loads_typed=None):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+        # loads_typed(data, type) - backends that can decode straight into typed objects
+        self.loads_typed = loads_typed
+
+    def __reduce__(self):
+        # Pickled by name (its functions may be lambdas) - a worker process looks it up in its own BACKENDS
+        return get_backend, (self.name,)
+
+
+def stdlib_dumps(value):
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+BACKENDS = {"stdlib": JSONBackend("stdlib", json.loads, stdlib_dumps)}
+if orjson is not None:
+    BACKENDS["orjson"] = JSONBackend("orjson", orjson.loads, orjson.dumps)
+if msgspec is not None:
+    BACKENDS["msgspec"] = JSONBackend("msgspec", msgspec.json.decode, msgspec.json.encode, lambda data, type: msgspec.json.decode(data, type=type))
+
+
+def register_backend(backend):
+    """Make a backend available by name (e.g. a simdjson / ujson wrapper)"""
+    BACKENDS[backend.name] = backend
+
+
+def get_backend(name=None):
+    if name is not None:
+        return BACKENDS[name]
+    return next(BACKENDS[name] for name in PREFERENCE if name in BACKENDS)
+
+
+def _chunked_value(text, index, depth):
+    """Decode the value at text[index] (no leading whitespace) → (value, end)"""
+    char = text[index:index + 1]
+    if depth and char == "[":
+        items = []
+        index = WHITESPACE.match(text, index + 1).end()
+        if text[index:index + 1] == "]":
+            return items, index + 1
+        while True:
+            item, index = _chunked_value(text, index, depth - 1)
+            items.append(item)
+            index = WHITESPACE.match(text, index).end()
+            char = text[index:index + 1]
+            if char == "]":
+                return items, index + 1
+            if char != ",":
+                raise json.JSONDecodeError("Expecting ',' delimiter", text, index)
+            index = WHITESPACE.match(text, index + 1).end()
+
+    if depth and char == "{":
+        members = {}
+        index = WHITESPACE.match(text, index + 1).end()
+        if text[index:index + 1] == "}":
+            return members, index + 1
+        while True:
+            if text[index:index + 1] != '"':
+                raise json.JSONDecodeError("Expecting property name enclosed in double quotes", text, index)
+            key, index = _scanner.raw_decode(text, index)
+            index = WHITESPACE.match(text, index).end()
+            if text[index:index + 1] != ":":
+                raise json.JSONDecodeError("Expecting ':' delimiter", text, index)
+            index = WHITESPACE.match(text, index + 1).end()
+            members[key], index = _chunked_value(text, index, depth - 1)
+            index = WHITESPACE.match(text, index).end()
+            char = text[index:index + 1]
+            if char == "}":
+                return members, index + 1
+            if char != ",":
+                raise json.JSONDecodeError("Expecting ',' delimiter", text, index)
+            index = WHITESPACE.match(text, index + 1).end()
+
+    return _scanner.raw_decode(text, index)
+
+
+def decode_chunked(data, depth=CHUNKED_DEPTH):
+    """json.loads that lets other threads run while it works (the "chunked" backend)
+
+    Every JSON library holds the GIL for a whole loads() call, so a 20 MB body parsed in a
+    worker thread still freezes the event loop for the full parse. This walks the outer
+    `depth` levels in Python and decodes each element with the C scanner, so the GIL can
+    change hands between elements - shorter stalls, but 2-3x the CPU of one loads() call.
+    Same result (and JSONDecodeError) as json.loads.
+    """
+    text = data.decode(json.detect_encoding(data), "surrogatepass") if isinstance(data, (bytes, bytearray)) else data
+    index = WHITESPACE.match(text, 0).end()
+    value, index = _chunked_value(text, index, depth)
+    index = WHITESPACE.match(text, index).end()
+    if index != len(text):
+        raise json.JSONDecodeError("Extra data", text, index)
+    return value
+
+
+BACKENDS["chunked"] = JSONBackend("chunked", decode_chunked, stdlib_dumps)
+
+
+def convert(value, type):
+    """Decoded JSON → `type` (dataclasses, list[...] / dict[str, ...] / Optional[...] of them)
+
+    Uses msgspec.convert when msgspec is installed (which also handles msgspec.Struct).
+    """
+    if msgspec is not None:
+        return msgspec.convert(value, type)
+    return _convert(value, type)
+
+
+def _convert(value, target):
+    if target is None or target is typing.Any or value is None:
+        return value
+    if dataclasses.is_dataclass(target):
+        hints = typing.get_type_hints(target)
+        names = {field.name for field in dataclasses.fields(target) if field.init}
+        # Unknown keys are ignored - APIs grow fields faster than clients
+        return target(**{name: _convert(item, hints.get(name)) for name, item in value.items() if name in names})
+
+    origin, args = typing.get_origin(target), typing.get_args(target)
+    if origin in (list, tuple, set, frozenset) and args:
+        return origin(_convert(item, args[0]) for item in value)
+    if origin is dict and args:
+        return {key: _convert(item, args[1]) for key, item in value.items()}
+    if origin in (typing.Union, types.UnionType):
+        # Optional[X] - value isn't None here
+        candidates = [arg for arg in args if arg is not type(None)]
+        return _convert(value, candidates[0]) if len(candidates) == 1 else value
+    return value
+
+
+def decode_with(backend, data, type=None):
+    """JSONCodec.decode's work (module-level so a ProcessPoolExecutor can pickle it)"""
+    if type is None:
+        return backend.loads(data)
+    if backend.loads_typed is not None:
+        return backend.loads_typed(data, type)
+    return convert(backend.loads(data), type)
+
+
+class JSONCodec:
+    """JSON encode/decode through the fastest installed backend, keeping big decodes off the event loop.
+
+        codec = JSONCodec()                                   # orjson → msgspec → stdlib
+        data = await codec.decode_async(response.content)
+        users = await codec.decode_async(body, type=list[User])   # dataclasses / msgspec.Struct
+        data = await read_json(response)                      # async stand-in for response.json()
+
+    Bodies under `offload_threshold` are decoded inline - a hop would cost more than the parse.
+    Bigger ones are decoded with the same backend on `executor`:
+        "thread" (default)   one dedicated thread. The backend holds the GIL for the whole
+                             parse, so the loop still waits out most of it.
+        "process"            one worker process: the parse runs outside this process, but the
+                             decoded objects are unpickled here, on the loop's thread.
+        an Executor          used as-is (a process pool's workers need the backend registered too).
+    backend="chunked" (decode_chunked) yields the GIL between elements for shorter stalls, at
+    2-3x the CPU. bench_json_codec.py compares them by cumulative and worst stall.
+
+    With `type`, bodies decode straight into it when the backend supports that (msgspec);
+    otherwise the decoded value is converted (msgspec.convert, or the built-in dataclass converter).
+
+    Backends differ at the edges: stdlib (and chunked) accept NaN / Infinity, orjson rejects
+    them with a JSONDecodeError - pick backend="stdlib" for APIs that send them.
+    """
+
+    def __init__(self, backend=None, offload_threshold=OFFLOAD_THRESHOLD, executor="thread"):
+        self.backend = backend if isinstance(backend, JSONBackend) else get_backend(backend)
+        self.offload_threshold = offload_threshold
+        if executor not in ("thread", "process") and not isinstance(executor, concurrent.futures.Executor):
+            raise ValueError(f"executor must be 'thread', 'process' or an Executor, not {executor!r}")
+        self._executor = executor
+
+        # Stats
+        self.inline_decodes = 0
+        self.offloaded_decodes = 0
+        self.offloaded_bytes = 0
+
+    @property
+    def executor(self):
+        if self._executor == "thread":
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="json-decode")
+        elif self._executor == "process":
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=1)
+        return self._executor
+
+    def encode(self, value):
+        return self.backend.dumps(value)
+
+    def decode(self, data, type=None):
+        """Inline decode (blocks the caller for the whole parse)"""
+        return decode_with(self.backend, data, type)
+
+    async def decode_async(self, data, type=None):
+        if len(data) < self.offload_threshold:
+            self.inline_decodes += 1
+            return self.decode(data, type)
+
+        self.offloaded_decodes += 1
+        self.offloaded_bytes += len(data)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, decode_with, self.backend, data, type)
+
+    def stats(self):
+        return {"backend": self.backend.name, "inline_decodes": self.inline_decodes, "offloaded_decodes": self.offloaded_decodes, "offloaded_bytes": self.offloaded_bytes}
+
+
+# The process-wide codec
+json_codec = JSONCodec()
+
+
+async def read_json(response, type=None, codec=None):
+    """Async response.json(): reads the body if it's still streaming, decodes big ones off the loop"""
+    body = await response.aread()
+    return await (codec or json_codec).decode_async(body, type)
@@ -0,0 +1,153 @@
+"""Fixed-memory latency histogram (HDR-histogram style) for per-circuit p50/p95/p99/max"""
+import math
+from array import array
+
+# Latencies are stored in whole microseconds, capped at 2^32 µs (~71 minutes)
+MAX_MICROSECONDS = (1 << 32) - 1
+
+
+def bucket_count_for(sub_bucket_bits):
+    """Buckets needed to cover 0 .. MAX_MICROSECONDS at this precision"""
+    return (MAX_MICROSECONDS.bit_length() - sub_bucket_bits + 1) * (1 << sub_bucket_bits)
+
+
+def bucket_index(microseconds, sub_bucket_bits):
+    """Log-linear bucket: exact below 2^bits, then 2^bits buckets per power of two"""
+    sub_buckets = 1 << sub_bucket_bits
+    if microseconds < sub_buckets:
+        return microseconds
+    shift = microseconds.bit_length() - sub_bucket_bits - 1
+    return (shift + 1) * sub_buckets + (microseconds >> shift) - sub_buckets
+
+
+def bucket_bounds(index, sub_bucket_bits):
+    """(lowest, highest) microsecond value that lands in bucket `index`"""
+    sub_buckets = 1 << sub_bucket_bits
+    if index < sub_buckets:
+        return index, index
+    shift = index // sub_buckets - 1
+    top = index % sub_buckets + sub_buckets
+    return top << shift, ((top + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """Constant-memory quantile sketch of recent response times.
+
+    Values land in log-linear buckets (2^sub_bucket_bits per power of two, so the
+    default 4 bits keeps every reported percentile within ~3% of the real value).
+    Two phases of `interval` seconds rotate: reads cover the current + previous
+    phase, so old traffic ages out instead of diluting today's tail.
+    """
+
+    __slots__ = (
+        "sub_bucket_bits",
+        "bucket_count",
+        "interval",
+        "refresh_every",
+        "counts",
+        "totals",
+        "maxima",
+        "active",
+        "phase_started",
+        "_cache",
+        "_cache_total",
+        "_cache_active",
+    )
+
+    def __init__(self, interval=60.0, sub_bucket_bits=4, refresh_every=16):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.bucket_count = bucket_count_for(sub_bucket_bits)
+        self.interval = interval
+
+        # Percentile reads are cached until this many new requests arrive
+        self.refresh_every = refresh_every
+
+        # Two phases (current + previous), each: bucket counts, request total, max latency
+        self.counts = (array("I", bytes(4 * self.bucket_count)), array("I", bytes(4 * self.bucket_count)))
+        self.totals = array("Q", [0, 0])
+        self.maxima = array("d", [0.0, 0.0])
+
+        # Which phase is being written, and when it started
+        self.active = 0
+        self.phase_started = 0.0
+
+        self._cache = {}
+        self._cache_total = -1
+        self._cache_active = -1
+
+    def rotate(self, now):
+        """Start a new phase once the current one is `interval` old (O(buckets) once per interval)"""
+        if now - self.phase_started < self.interval:
+            return self.active
+
+        # Two intervals of silence → the previous phase is stale too
+        if now - self.phase_started >= 2 * self.interval:
+            self.counts[self.active][:] = array("I", bytes(4 * self.bucket_count))
+            self.totals[self.active] = 0
+            self.maxima[self.active] = 0.0
+
+        active = self.active ^ 1
+        self.counts[active][:] = array("I", bytes(4 * self.bucket_count))
+        self.totals[active] = 0
+        self.maxima[active] = 0.0
+        self.active = active
+        self.phase_started = now
+        return active
+
+    def record(self, now, seconds):
+        """Add one response time (in seconds)"""
+        active = self.rotate(now)
+        microseconds = min(max(int(seconds * 1_000_000), 0), MAX_MICROSECONDS)
+
+        self.counts[active][bucket_index(microseconds, self.sub_bucket_bits)] += 1
+        self.totals[active] += 1
+        if seconds > self.maxima[active]:
+            self.maxima[active] = seconds
+
+    def count(self):
+        """Requests covered by the current + previous phase"""
+        return self.totals[0] + self.totals[1]
+
+    def max(self):
+        """Slowest response (seconds) in the current + previous phase"""
+        return max(self.maxima[0], self.maxima[1])
+
+    def percentile(self, q):
+        """Latency (seconds) at percentile q (0-100) over the current + previous phase"""
+        total = self.count()
+        if total == 0:
+            return 0.0
+
+        # Cached until enough new requests arrive (or the phase rotates)
+        if self._cache_active != self.active or abs(total - self._cache_total) >= self.refresh_every:
+            self._cache.clear()
+            self._cache_total = total
+            self._cache_active = self.active
+        elif q in self._cache:
+            return self._cache[q]
+
+        target = max(1, math.ceil(q / 100 * total))
+        current, previous = self.counts
+        seen = 0
+        value = self.max()
+
+        for index in range(self.bucket_count):
+            seen += current[index] + previous[index]
+            if seen >= target:
+                low, high = bucket_bounds(index, self.sub_bucket_bits)
+                # Middle of the bucket, but never above the real maximum
+                value = min((low + high) / 2 / 1_000_000, self.max())
+                break
+
+        self._cache[q] = value
+        return value
+
+    def percentiles(self):
+        """Snapshot of the usual tail-latency numbers (seconds)"""
+        return {
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max(),
+            "count": self.count(),
+        }
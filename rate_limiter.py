@@ -0,0 +1,262 @@
+"""Client-side per-host / per-API-key rate limiting (GCRA) that learns the real limit from the server"""
+import asyncio
+import random
+import time
+
+import httpx
+
+from retry_policy import ratelimit_reset_seconds, retry_after_seconds
+
+# Headers an API key usually travels in - first one present wins
+API_KEY_HEADERS = ("x-api-key", "authorization")
+
+
+class RateLimitExceeded(httpx.TransportError):
+    """Raised by RateLimitTransport when a request would have to wait longer than `max_wait`"""
+
+    # max_wait is the caller's limit - RetryPolicy doesn't stretch it with backoff
+    retryable = False
+
+    def __init__(self, key, wait, request=None):
+        super().__init__(f"Rate limit for {key} needs a {wait:.1f}s wait", request=request)
+        self.key = key
+        self.wait = wait
+
+
+# 👉 Limiter key builders: which requests share one quota?
+def rate_key_by_host(request):
+    """One quota per scheme + host + port"""
+    url = request.url
+    return f"{url.scheme}://{url.netloc.decode('ascii')}"
+
+
+def rate_key_by_api_key(request):
+    """One quota per host + API key (falls back to the host for unauthenticated requests)"""
+    for header in API_KEY_HEADERS:
+        value = request.headers.get(header)
+        if value:
+            return f"{rate_key_by_host(request)}|{value}"
+    return rate_key_by_host(request)
+
+
+RATE_LIMIT_KEYS = {
+    "host": rate_key_by_host,
+    "api_key": rate_key_by_api_key,
+}
+
+
+class GCRALimiter:
+    """Generic cell rate algorithm: `rate` requests/second with up to `burst` back-to-back.
+
+    The whole state is one timestamp (TAT, the "theoretical arrival time" of the next
+    request). A caller that arrives early reserves its slot and sleeps exactly until it,
+    so queued requests wait without polling and go out in arrival order.
+
+    The server can correct the limiter at any time:
+      update_from_headers() - paces the X-RateLimit-Remaining quota evenly until X-RateLimit-Reset
+      block_until()         - Retry-After / quota exhausted: nothing goes out before then
+      on_throttled()        - a 429 with no hints: multiply the rate by `backoff_ratio`
+    After a 429 the rate creeps back towards `max_rate` by `recovery` per successful response.
+    """
+
+    def __init__(self, rate=10.0, burst=1, min_rate=0.1, max_rate=None, backoff_ratio=0.5, recovery=0.1):
+        self.rate = float(rate)
+        self.burst = max(1, burst)
+        self.min_rate = min_rate
+        self.max_rate = float(max_rate if max_rate is not None else rate)
+        self.backoff_ratio = backoff_ratio
+        self.recovery = recovery
+
+        self.tat = 0.0
+        self.blocked_until = 0.0
+        # While the server is telling us the quota, don't second-guess it with our own recovery
+        self.server_paced = False
+
+        # Stats
+        self.admitted = 0
+        self.delayed = 0
+        self.total_wait = 0.0
+        self.throttled = 0
+
+    @property
+    def interval(self):
+        return 1.0 / self.rate
+
+    def _next_slot(self, now):
+        """(slot time, delay) for a request arriving now - shared by reserve() and wait_time() so they never disagree"""
+        start = max(now, self.blocked_until)
+        # Up to `burst` requests may run ahead of the steady-state schedule
+        tat = max(self.tat, start - (self.burst - 1) * self.interval)
+        return tat, max(0.0, tat - now, start - now)
+
+    def reserve(self, now):
+        """Book the next slot - returns how long the caller must sleep first (0.0 → go now)"""
+        tat, delay = self._next_slot(now)
+        self.tat = tat + self.interval
+        return delay
+
+    def wait_time(self, now):
+        """How long a request arriving now would wait (without booking anything)"""
+        return self._next_slot(now)[1]
+
+    async def acquire(self):
+        """Wait for this request's slot - returns the seconds spent waiting"""
+        waited = 0.0
+        while True:
+            delay = self.reserve(time.monotonic())
+            if delay <= 0.0:
+                break
+            await asyncio.sleep(delay)
+            waited += delay
+            # A Retry-After that arrived while we slept voids our slot - book a new one behind the block
+            if time.monotonic() >= self.blocked_until:
+                break
+
+        self.admitted += 1
+        if waited:
+            self.delayed += 1
+            self.total_wait += waited
+        return waited
+
+    def block_until(self, deadline):
+        """Hold everything back until `deadline` (monotonic seconds)"""
+        self.blocked_until = max(self.blocked_until, deadline)
+        # Slots booked before the block are void - restart the schedule at the deadline
+        self.tat = max(self.tat, deadline)
+
+    def set_rate(self, rate):
+        self.rate = max(self.min_rate, rate)
+
+    def on_throttled(self, now, retry_after=None):
+        """The server answered 429 (or 503 + Retry-After)"""
+        self.throttled += 1
+        if retry_after is not None:
+            self.block_until(now + retry_after)
+        if not self.server_paced:
+            self.set_rate(self.rate * self.backoff_ratio)
+        if retry_after is None:
+            # No hint - at least give the shrunken rate one clean interval
+            self.block_until(now + self.interval)
+
+    def on_success(self):
+        if not self.server_paced and self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.recovery)
+
+    def update_from_headers(self, now, limit, remaining, reset):
+        """Spread what's left of the server's quota evenly over the time until it resets"""
+        if remaining is None or reset is None:
+            return
+        self.server_paced = True
+        if remaining <= 0:
+            self.block_until(now + reset)
+            if limit:
+                # Once the window resets, the full limit is spread over one window again
+                self.set_rate(limit / max(reset, 1.0))
+            return
+        self.set_rate(remaining / max(reset, 1e-3))
+
+    def stats(self):
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "admitted": self.admitted,
+            "delayed": self.delayed,
+            "throttled": self.throttled,
+            "avg_wait": self.total_wait / self.delayed if self.delayed else 0.0,
+            "server_paced": self.server_paced,
+        }
+
+
+def header_number(response, name):
+    value = response.headers.get(name)
+    if value is None:
+        return None
+    try:
+        # Some APIs send "100, 100;w=60" (IETF draft style) - the first number is the one we want
+        return float(value.split(",")[0].split(";")[0].strip())
+    except ValueError:
+        return None
+
+
+class RateLimitTransport(httpx.AsyncBaseTransport):
+    """httpx transport that keeps each host (or API key) under its rate limit before the request is sent.
+
+        client = httpx.AsyncClient(transport=RateLimitTransport(rate=5, burst=5, http2=True))
+
+    Starts at `rate` req/s per key, then follows the server: X-RateLimit-Limit / -Remaining /
+    -Reset pace the remaining quota, Retry-After (or an exhausted quota) holds every queued
+    request until then, and a bare 429 halves the rate. Requests that would wait longer than
+    `max_wait` fail fast with RateLimitExceeded instead of queueing.
+    """
+
+    def __init__(self, transport=None, rate=10.0, burst=1, key="host", max_wait=None, throttle_statuses=(429,), limiter_kwargs=None, **transport_kwargs):
+        self._transport = transport or httpx.AsyncHTTPTransport(**transport_kwargs)
+        self._key = RATE_LIMIT_KEYS[key] if isinstance(key, str) else key
+        self._limiter_kwargs = {"rate": rate, "burst": burst, **(limiter_kwargs or {})}
+        self._throttle_statuses = frozenset(throttle_statuses)
+        self.max_wait = max_wait
+        self.limiters = {}
+
+    def limiter_for(self, key):
+        limiter = self.limiters.get(key)
+        if limiter is None:
+            limiter = self.limiters[key] = GCRALimiter(**self._limiter_kwargs)
+        return limiter
+
+    async def handle_async_request(self, request):
+        key = self._key(request)
+        limiter = self.limiter_for(key)
+
+        if self.max_wait is not None:
+            wait = limiter.wait_time(time.monotonic())
+            if wait > self.max_wait:
+                raise RateLimitExceeded(key, wait, request=request)
+
+        waited = await limiter.acquire()
+        response = await self._transport.handle_async_request(request)
+        response.extensions["rate_limit_wait"] = waited
+        self.learn(limiter, response)
+        return response
+
+    def learn(self, limiter, response):
+        """Feed the server's rate-limit hints back into the key's limiter"""
+        now = time.monotonic()
+        limiter.update_from_headers(
+            now,
+            header_number(response, "x-ratelimit-limit"),
+            header_number(response, "x-ratelimit-remaining"),
+            ratelimit_reset_seconds(response.headers["x-ratelimit-reset"]) if "x-ratelimit-reset" in response.headers else None,
+        )
+
+        if response.status_code in self._throttle_statuses or (response.status_code == 503 and "retry-after" in response.headers):
+            limiter.on_throttled(now, retry_after_seconds(response))
+        elif response.status_code < 400:
+            limiter.on_success()
+
+    def stats(self):
+        """Per-key limiter state"""
+        return {key: limiter.stats() for key, limiter in self.limiters.items()}
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def check_wait_time_matches_reserve(trials=2000, seed=0):
+    """wait_time() must predict exactly what reserve() then books - RateLimitTransport's max_wait relies on it"""
+    rng = random.Random(seed)
+    for _ in range(trials):
+        limiter = GCRALimiter(rate=rng.uniform(0.5, 20.0), burst=rng.randint(1, 10))
+        now = 0.0
+        for _ in range(50):
+            now += rng.expovariate(5.0)
+            if rng.random() < 0.05:
+                limiter.block_until(now + rng.random())
+            predicted = limiter.wait_time(now)
+            booked = limiter.reserve(now)
+            if predicted != booked:
+                raise AssertionError(f"wait_time() said {predicted}, reserve() booked {booked} (rate={limiter.rate}, burst={limiter.burst})")
+
+
+if __name__ == "__main__":
+    check_wait_time_matches_reserve()
+    print("✅ wait_time() agrees with reserve()")
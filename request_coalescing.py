@@ -0,0 +1,118 @@
+"""Single-flight coalescing of identical in-flight GETs (httpx transport)"""
+import asyncio
+
+import httpx
+
+# Request headers that can change the response - two GETs only coalesce if these match too
+DEFAULT_VARY_HEADERS = ("accept", "accept-encoding", "accept-language", "authorization", "cookie")
+
+# Response extensions that are safe to hand to every waiter (no live network stream)
+SHARED_EXTENSIONS = ("http_version", "reason_phrase")
+
+
+class InFlightRequest:
+    """One upstream call plus the number of callers waiting on it"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class CoalescingTransport(httpx.AsyncBaseTransport):
+    """Concurrent identical GETs share one upstream request.
+
+    The first caller for a key (method + full URL incl. query + vary headers) starts
+    the upstream call; everybody arriving while it's in flight waits on the same
+    call and gets their own Response built from the same status, headers and body
+    (or the same exception). Bodies are buffered once, so this is meant for API
+    responses, not multi-GB downloads.
+
+        client = httpx.AsyncClient(transport=CoalescingTransport(http2=True))
+    """
+
+    def __init__(self, transport=None, vary_headers=DEFAULT_VARY_HEADERS, methods=("GET", "HEAD"), **transport_kwargs):
+        self._transport = transport or httpx.AsyncHTTPTransport(**transport_kwargs)
+        self._vary_headers = tuple(header.lower() for header in vary_headers)
+        self._methods = frozenset(methods)
+        self._in_flight = {}
+
+        # Stats
+        self.requests = 0
+        self.upstream_requests = 0
+        self.coalesced = 0
+
+    def request_key(self, request):
+        """What makes two requests "identical" """
+        headers = request.headers
+        return (request.method, str(request.url), *(headers.get(name) for name in self._vary_headers))
+
+    async def handle_async_request(self, request):
+        # Anything with side effects (or explicitly opted out) goes straight through
+        if request.method not in self._methods or request.extensions.get("coalesce") is False:
+            return await self._transport.handle_async_request(request)
+
+        self.requests += 1
+        key = self.request_key(request)
+        flight = self._in_flight.get(key)
+
+        if flight is None:
+            # We're the leader - start the one upstream call everybody will share
+            flight = InFlightRequest(asyncio.ensure_future(self._fetch(key, request)))
+            self._in_flight[key] = flight
+            self.upstream_requests += 1
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            # shield → one impatient caller cancelling doesn't kill the call for the others
+            status_code, headers, content, extensions = await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Everybody gave up - no point finishing the upstream call. Unlist it now:
+                # _fetch only unwinds on a later loop pass, and a caller arriving before
+                # that must start a fresh request, not join one that's being cancelled
+                if self._in_flight.get(key) is flight:
+                    del self._in_flight[key]
+                flight.task.cancel()
+
+        return httpx.Response(
+            status_code,
+            headers=headers,
+            stream=httpx.ByteStream(content),
+            extensions=dict(extensions),
+        )
+
+    async def _fetch(self, key, request):
+        """The shared upstream call: read the raw (still encoded) body once"""
+        try:
+            response = await self._transport.handle_async_request(request)
+            try:
+                content = b"".join([chunk async for chunk in response.stream])
+            finally:
+                await response.aclose()
+
+            extensions = {name: response.extensions[name] for name in SHARED_EXTENSIONS if name in response.extensions}
+            return response.status_code, response.headers.raw, content, extensions
+        finally:
+            # Later callers start a fresh request - we only merge calls that overlap in time
+            # (unless a newer flight already took the key, after this one was cancelled)
+            flight = self._in_flight.get(key)
+            if flight is not None and flight.task is asyncio.current_task():
+                del self._in_flight[key]
+
+    def stats(self):
+        """How much duplicate traffic we saved"""
+        return {
+            "requests": self.requests,
+            "upstream_requests": self.upstream_requests,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+            "dedupe_ratio": self.coalesced / self.requests if self.requests else 0.0,
+        }
+
+    async def aclose(self):
+        await self._transport.aclose()
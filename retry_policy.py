@@ -0,0 +1,238 @@
+"""One retry engine for every script - decorrelated jitter, Retry-After / X-RateLimit-Reset, retry budget"""
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+# Worth another try: timeouts, throttling and the usual "upstream is having a moment" codes
+DEFAULT_RETRY_STATUSES = frozenset([408, 425, 429, 500, 502, 503, 504])
+
+# Methods that are safe to send twice
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE", "TRACE"])
+
+# Failures where the request never reached the server - safe to retry even for POST
+NOT_SENT_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+# Above this the reset header is an epoch timestamp, below it a number of seconds
+EPOCH_THRESHOLD = 1_000_000_000
+
+
+class RetryBudget:
+    """Token bucket capping retries at a fraction of traffic.
+
+    Every first attempt earns `ratio` of a retry (0.1 → retries ≤ 10% of requests),
+    plus `min_per_second` so a quiet client can still retry; `max_burst` caps the savings.
+    When the bucket is empty a failure goes straight back to the caller - retries never
+    multiply the load on a service that's already struggling.
+    """
+
+    def __init__(self, ratio=0.1, min_per_second=1.0, max_burst=10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_burst = max_burst
+        self.tokens = max_burst
+        self.updated = time.monotonic()
+
+    def _refill(self, earned):
+        now = time.monotonic()
+        self.tokens = min(self.max_burst, self.tokens + earned + (now - self.updated) * self.min_per_second)
+        self.updated = now
+
+    def deposit(self):
+        """A new (non-retry) request went out"""
+        self._refill(self.ratio)
+
+    def try_withdraw(self):
+        """Take one retry if the budget allows - True when taken"""
+        self._refill(0.0)
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+def retry_after_seconds(response, now=None):
+    """Server-requested wait (Retry-After seconds/date, or X-RateLimit-Reset) - None if not given"""
+    now = time.time() if now is None else now
+
+    value = response.headers.get("retry-after")
+    if value is not None:
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - now)
+        except (TypeError, ValueError, IndexError, OverflowError):
+            pass
+
+    value = response.headers.get("x-ratelimit-reset")
+    if value is not None:
+        return ratelimit_reset_seconds(value, now)
+
+    return None
+
+
+def ratelimit_reset_seconds(value, now=None):
+    """X-RateLimit-Reset as seconds from now (the header is either seconds or an epoch timestamp)"""
+    now = time.time() if now is None else now
+    try:
+        reset = float(value)
+    except ValueError:
+        return None
+    return max(0.0, reset - now) if reset > EPOCH_THRESHOLD else reset
+
+
+class RetryPolicy:
+    """Retries a request on the caller's own (pooled) client.
+
+        policy = RetryPolicy(max_attempts=4)
+        response = await policy.request(client, "GET", url, params=...)
+
+    Backoff is AWS-style decorrelated jitter: sleep = min(max_delay, uniform(base_delay, 3 × previous sleep)),
+    so clients that failed together don't come back together. A Retry-After / X-RateLimit-Reset
+    from the server is treated as the minimum wait (longer than `max_retry_after` → give up).
+
+    `rules` overrides the defaults per status code or exception class:
+        {401: False, 404: False, 429: {"max_attempts": 6}, httpx.ReadTimeout: True}
+    False → never retry, True → retry with the policy defaults, dict → retry with these
+    overrides (max_attempts / base_delay / max_delay). Exception rules match subclasses.
+    Exceptions with `retryable = False` (the circuit breaker's and rate limiter's own
+    rejections - no request was sent) are not retried unless a rule names them.
+
+    Non-idempotent methods (POST/PATCH) are only retried when the request provably never
+    reached the server (connect errors) or the server said 429, unless `retry_non_idempotent`.
+    After the last attempt the final response is returned / the final exception re-raised;
+    `response.extensions["retries"]` says how many retries it took.
+    """
+
+    def __init__(
+        self,
+        max_attempts=4,
+        base_delay=0.1,
+        max_delay=20.0,
+        retry_statuses=DEFAULT_RETRY_STATUSES,
+        retry_exceptions=(httpx.TransportError,),
+        rules=None,
+        budget=None,
+        respect_retry_after=True,
+        max_retry_after=60.0,
+        retry_non_idempotent=False,
+        on_retry=None,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = frozenset(retry_statuses)
+        self.retry_exceptions = tuple(retry_exceptions)
+        self.rules = dict(rules or {})
+        self.budget = budget if budget is not None else RetryBudget()
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+        self.retry_non_idempotent = retry_non_idempotent
+
+        # on_retry(request, attempt, delay, response_or_exception) - for logging
+        self.on_retry = on_retry
+
+        self.stats = {"requests": 0, "retries": 0, "budget_exhausted": 0, "gave_up": 0}
+
+    def _rule_for_status(self, request, status_code):
+        """None → don't retry, else the settings to retry with"""
+        rule = self.rules.get(status_code)
+        if rule is None:
+            if status_code not in self.retry_statuses:
+                return None
+            if request.method not in IDEMPOTENT_METHODS and not self.retry_non_idempotent and status_code != 429:
+                return None
+            rule = True
+        return self._settings(rule)
+
+    def _rule_for_exception(self, request, exc):
+        rule = None
+        for exc_type in type(exc).__mro__:
+            if exc_type in self.rules:
+                rule = self.rules[exc_type]
+                break
+        if rule is None:
+            # Local fail-fast rejections (CircuitOpenError, RateLimitExceeded) - retrying defeats their purpose
+            if not getattr(exc, "retryable", True) or not isinstance(exc, self.retry_exceptions):
+                return None
+            if request.method not in IDEMPOTENT_METHODS and not self.retry_non_idempotent and not isinstance(exc, NOT_SENT_EXCEPTIONS):
+                return None
+            rule = True
+        return self._settings(rule)
+
+    def _settings(self, rule):
+        if rule is False:
+            return None
+        settings = {"max_attempts": self.max_attempts, "base_delay": self.base_delay, "max_delay": self.max_delay}
+        if isinstance(rule, dict):
+            settings.update(rule)
+        return settings
+
+    def backoff(self, previous_delay, settings):
+        """Decorrelated jitter"""
+        base = settings["base_delay"]
+        return min(settings["max_delay"], random.uniform(base, max(base, previous_delay * 3)))
+
+    async def request(self, client, method, url, **kwargs):
+        """Like client.request(...), with retries"""
+        return await self.send(client, client.build_request(method, url, **kwargs))
+
+    async def send(self, client, request, **send_kwargs):
+        """Send a prepared request on `client`, retrying per the policy.
+
+        The request body must be re-readable (bytes, json, form, multipart from bytes, FileBody, MultipartFileBody).
+        """
+        self.stats["requests"] += 1
+        self.budget.deposit()
+
+        attempt = 0
+        delay = 0.0
+        while True:
+            attempt += 1
+            try:
+                response = await client.send(request, **send_kwargs)
+            except Exception as exc:
+                settings = self._rule_for_exception(request, exc)
+                if settings is None or not self._may_retry(attempt, settings):
+                    raise
+                delay = self.backoff(delay, settings)
+                outcome = exc
+            else:
+                # How many retries it took to get this response
+                response.extensions["retries"] = attempt - 1
+
+                settings = self._rule_for_status(request, response.status_code)
+                if settings is None:
+                    return response
+
+                server_delay = retry_after_seconds(response) if self.respect_retry_after else None
+                if server_delay is not None and server_delay > self.max_retry_after:
+                    self.stats["gave_up"] += 1
+                    return response
+                if not self._may_retry(attempt, settings):
+                    return response
+
+                delay = self.backoff(delay, settings)
+                if server_delay is not None:
+                    # The server knows when it'll have room - wait at least that, plus a little
+                    # jitter so everybody it throttled at once doesn't return on the same tick
+                    delay = max(delay, server_delay + random.uniform(0, settings["base_delay"]))
+                outcome = response
+                await response.aclose()
+
+            self.stats["retries"] += 1
+            if self.on_retry is not None:
+                self.on_retry(request, attempt, delay, outcome)
+            await asyncio.sleep(delay)
+
+    def _may_retry(self, attempt, settings):
+        if attempt >= settings["max_attempts"]:
+            self.stats["gave_up"] += 1
+            return False
+        if not self.budget.try_withdraw():
+            self.stats["budget_exhausted"] += 1
+            return False
+        return True
@@ -0,0 +1,426 @@
+"""Parallel ranged (segmented) downloads into a preallocated file, with a single-stream fallback"""
+import asyncio
+import os
+import re
+import time
+
+import httpx
+
+from download_integrity import InlineVerifier, IntegrityError, digests_from_headers, parse_expected
+from download_journal import DownloadJournal, resume_validator
+from download_writer import WRITE_BUFFER_SIZE, ChunkCoalescer, DownloadWriter
+
+# Below this a file isn't worth splitting - one stream is already as fast as the handshakes
+MIN_SEGMENT_SIZE = 1024 * 1024
+
+CONTENT_RANGE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
+
+# A 416's Content-Range: no byte was satisfiable, here's the real size
+UNSATISFIED_RANGE = re.compile(r"bytes\s+\*/(\d+)")
+
+
+class RangeNotSatisfied(Exception):
+    """The server ignored (or botched) a Range request - the caller falls back to one stream"""
+
+
+def split_gaps(gaps, segments, min_segment_size=MIN_SEGMENT_SIZE):
+    """Cut the missing (start, end) ranges into at most ~`segments` pieces of similar size"""
+    missing = sum(end - start + 1 for start, end in gaps)
+    if not missing:
+        return []
+    step = max(min_segment_size, -(-missing // max(1, segments)))
+    pieces = []
+    for start, end in gaps:
+        for piece_start in range(start, end + 1, step):
+            pieces.append((piece_start, min(piece_start + step, end + 1) - 1))
+    return pieces
+
+
+def preallocate(fd, size):
+    """Reserve the file's blocks up front (no fragmentation, ENOSPC now rather than at 90%)"""
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError:
+            # Filesystems without fallocate support (e.g. some network mounts)
+            pass
+    os.ftruncate(fd, size)
+
+
+async def probe(client, url):
+    """Size, range support and validators of `url` - without downloading it
+
+    Asks for the first byte: a 206 with Content-Range proves ranges work even when a
+    server forgets to advertise Accept-Ranges on HEAD.
+    """
+    async with client.stream("GET", url, headers={"Range": "bytes=0-0", "Accept-Encoding": "identity"}) as response:
+        match = UNSATISFIED_RANGE.match(response.headers.get("content-range", ""))
+        if response.status_code == 416 and match:
+            # Not even byte 0 exists - an empty file, on a server that does ranges
+            return {
+                "size": int(match.group(1)),
+                "accepts_ranges": True,
+                "etag": response.headers.get("etag"),
+                "last_modified": response.headers.get("last-modified"),
+                "digests": {},
+            }
+        response.raise_for_status()
+        info = {
+            "size": None,
+            "accepts_ranges": False,
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "digests": digests_from_headers(response.headers, partial=response.status_code == 206),
+        }
+        match = CONTENT_RANGE.match(response.headers.get("content-range", ""))
+        if response.status_code == 206 and match and match.group(3) != "*":
+            info["size"] = int(match.group(3))
+            info["accepts_ranges"] = True
+        elif "content-length" in response.headers:
+            # 200 → the server sent (or is about to send) the whole file: no ranges here
+            info["size"] = int(response.headers["content-length"])
+        return info
+
+
+class DownloadState:
+    """Per-download bookkeeping shared by its segments"""
+
+    __slots__ = ("path", "writer", "total", "done", "journal", "last_checkpoint", "checkpoint", "last_progress")
+
+    def __init__(self, path, writer, total, journal=None):
+        self.path = path
+        self.writer = writer
+        self.total = total
+        self.done = 0
+        self.journal = journal
+        self.last_checkpoint = time.monotonic()
+        # The in-flight journal save (runs on the writer thread), if any
+        self.checkpoint = None
+        self.last_progress = 0.0
+
+
+class SegmentedDownloader:
+    """Downloads one URL as `segments` concurrent byte ranges over the caller's pooled client.
+
+        downloader = SegmentedDownloader(client, segments=8)
+        result = await downloader.download(url, "large_downloads/10MB_file.bin")
+
+    The target file is preallocated and every segment writes straight to its own offset,
+    so nothing is reassembled in memory. Network chunks (`chunk_size` per read, None → as
+    they arrive) are coalesced into aligned `write_buffer`-sized writes and handed to the
+    file's DownloadWriter thread - a few pwritev calls per buffer instead of a thread-pool
+    hop per chunk, and the socket keeps being read while the disk catches up. on_progress
+    is called at most every `progress_interval` seconds (plus once at 100%).
+
+    When the server doesn't do ranges - no 206 on the probe, or a segment comes back 200 -
+    it falls back to one sequential stream.
+
+    With resume=True (default) completed ranges are checkpointed every `checkpoint_interval`
+    seconds to a sidecar DownloadJournal. The next download() of the same url + path only
+    fetches what's missing (Range + If-Range); if the server's ETag / Last-Modified changed
+    in between, the stale partial is thrown away and the download starts over.
+
+    download(url, path, expected_digest="sha256:...") verifies the file as it's written: the
+    digest is computed on the writer thread, in the same pass as the writes (InlineVerifier),
+    and checked before download() returns. With verify_headers=True (default) digests the
+    server announces (Repr-Digest, Digest, and Content-Digest / Content-MD5 on a full 200)
+    are checked too. A mismatch deletes the partial file and its journal - never resumed from.
+    """
+
+    def __init__(
+        self,
+        client,
+        segments=4,
+        min_segment_size=MIN_SEGMENT_SIZE,
+        write_buffer=WRITE_BUFFER_SIZE,
+        chunk_size=None,
+        on_progress=None,
+        progress_interval=0.5,
+        resume=True,
+        checkpoint_interval=1.0,
+        verify_headers=True,
+    ):
+        self.client = client
+        self.segments = segments
+        self.min_segment_size = min_segment_size
+        self.write_buffer = write_buffer
+        self.chunk_size = chunk_size
+        self.resume = resume
+        self.checkpoint_interval = checkpoint_interval
+        self.verify_headers = verify_headers
+
+        # on_progress(path, bytes_done, total_bytes) - rate-limited to one call per progress_interval
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+
+    async def download(self, url, path, expected_digest=None):
+        """Fetch url into path - returns the same result dict as stream_download_file
+
+        expected_digest: "sha256:<hex>", "md5:<hex>" or a bare hex digest (None → only the
+        server's own digest headers are checked, if any).
+
+        Extra keys: "segments", "resumed_bytes" (already on disk from an earlier run),
+        "digests" (what was verified, {algorithm: hex}) and, on failure, "resumable_bytes"
+        (what the next run won't have to fetch again).
+        """
+        journal = DownloadJournal.load(path) if self.resume else None
+        try:
+            expected = dict([parse_expected(expected_digest)]) if expected_digest else {}
+
+            # One stream and no partial on disk → the probe would only cost an extra round trip
+            # (the stream is still checkpointed, so the next run has something to resume)
+            if self.segments > 1 or (journal is not None and journal.completed_bytes):
+                info = await probe(self.client, url)
+                if info["accepts_ranges"] and info["size"] == 0:
+                    return await self._download_empty(path, info, journal, expected)
+                if info["accepts_ranges"] and info["size"]:
+                    try:
+                        return await self._download_ranges(url, path, info, journal, expected)
+                    except RangeNotSatisfied:
+                        pass
+
+                # No ranges → nothing to resume into
+                if journal is not None:
+                    journal.discard()
+                    journal = None
+            size, chunks, digests = await self._download_single(url, path, expected, journal)
+            return self._result(path, size, chunks, 1, 0, digests)
+
+        except IntegrityError as e:
+            # Corrupt bytes are worth nothing - not even as a resume point
+            if journal is not None:
+                journal.discard()
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return {"success": False, "filename": path, "size_bytes": 0, "chunks": 0, "segments": 0, "resumable_bytes": 0, "error": str(e)}
+
+        except Exception as e:
+            kept = journal.completed_bytes if journal is not None else 0
+            return {"success": False, "filename": path, "size_bytes": 0, "chunks": 0, "segments": 0, "resumable_bytes": kept, "error": str(e)}
+
+    def _result(self, path, size, chunks, segments, resumed_bytes, digests):
+        return {"success": True, "filename": path, "size_bytes": size, "chunks": chunks, "segments": segments, "resumed_bytes": resumed_bytes, "digests": digests, "error": None}
+
+    async def _download_empty(self, path, info, journal, expected):
+        """Zero-length resource: nothing to fetch, just the empty file (and its digest checked)"""
+        if journal is not None:
+            journal.discard()
+        writer = DownloadWriter(os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644))
+        try:
+            verifier = self._verifier(expected, info["digests"], 0)
+            digests = await writer.run(verifier.verify, writer.fd) if verifier is not None else {}
+        finally:
+            await writer.close()
+        return self._result(path, 0, 0, 0, 0, digests)
+
+    def _verifier(self, expected, headers_digests, size, compute=()):
+        """InlineVerifier for the explicit digest plus what the server announced - None if there's nothing to hash"""
+        expected = {**headers_digests, **expected} if self.verify_headers else dict(expected)
+        for algorithm in compute:
+            expected.setdefault(algorithm, None)
+        return InlineVerifier(expected, size) if expected else None
+
+    async def _download_ranges(self, url, path, info, journal, expected):
+        size = info["size"]
+        resumed = journal is not None and journal.matches(url, size, info["etag"], info["last_modified"])
+        if journal is not None and not resumed:
+            # Different file, different version or no checkpoint at all - start clean
+            journal.reset(url, size, info["etag"], info["last_modified"])
+        if journal is not None and journal.validator is None:
+            # Nothing to send in If-Range → a checkpoint could never be trusted
+            journal.discard()
+            journal = None
+
+        resumed_bytes = journal.completed_bytes if resumed else 0
+        gaps = journal.missing() if journal is not None else [(0, size - 1)]
+        ranges = split_gaps(gaps, self.segments, self.min_segment_size)
+
+        verifier = self._verifier(expected, info["digests"], size)
+        if verifier is not None and resumed:
+            # Already on disk → read back and hashed once the prefix reaches it
+            verifier.existing(journal.completed)
+
+        flags = os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0) | (0 if resumed else os.O_TRUNC)
+        writer = DownloadWriter(os.open(path, flags, 0o644), on_write=verifier.update if verifier is not None else None)
+        state = DownloadState(path, writer, size, journal)
+        state.done = resumed_bytes
+        try:
+            await writer.run(preallocate, writer.fd, size)
+
+            # If-Range: if the file changed since the probe (or since the checkpoint), the server
+            # sends 200 + the whole new file instead of mixing two versions - we treat that as "no ranges"
+            validator = resume_validator(info["etag"], info["last_modified"])
+            tasks = [asyncio.ensure_future(self._fetch_range(url, state, start, end, validator)) for start, end in ranges]
+            try:
+                chunk_counts = await asyncio.gather(*tasks)
+                await writer.drain()
+            except (RangeNotSatisfied, IntegrityError):
+                await self._abandon(state, tasks)
+                if journal is not None:
+                    journal.discard()
+                raise
+            except BaseException:
+                await self._abandon(state, tasks)
+                if journal is not None:
+                    try:
+                        # Keep what made it to disk for the next attempt
+                        await writer.run(journal.save, writer.fd)
+                    except Exception:
+                        pass
+                raise
+
+            if state.checkpoint is not None:
+                await asyncio.gather(state.checkpoint, return_exceptions=True)
+            digests = await writer.run(verifier.verify, writer.fd) if verifier is not None else {}
+            if journal is not None:
+                journal.discard()
+            self._report_progress(state, force=True)
+            return self._result(path, size, sum(chunk_counts), len(ranges), resumed_bytes, digests)
+        finally:
+            await writer.close()
+
+    async def _abandon(self, state, tasks):
+        """Stop the other segments and let queued writes land (so the journal counts them)"""
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if state.checkpoint is not None:
+            await asyncio.gather(state.checkpoint, return_exceptions=True)
+        try:
+            await state.writer.drain()
+        except Exception:
+            pass
+
+    async def _fetch_range(self, url, state, start, end, validator):
+        # Ranges count bytes of the encoded body - ask for it unencoded so offsets are file offsets
+        headers = {"Range": f"bytes={start}-{end}", "Accept-Encoding": "identity"}
+        if validator:
+            headers["If-Range"] = validator
+
+        async with self.client.stream("GET", url, headers=headers) as response:
+            response.raise_for_status()
+            match = CONTENT_RANGE.match(response.headers.get("content-range", ""))
+            if response.status_code != 206 or not match or int(match.group(1)) != start:
+                raise RangeNotSatisfied(f"Expected 206 for bytes {start}-{end}, got {response.status_code}")
+
+            chunks = 0
+            coalescer = ChunkCoalescer(start, self.write_buffer)
+            try:
+                async for chunk in response.aiter_raw(self.chunk_size):
+                    chunks += 1
+                    for offset, pieces in coalescer.add(chunk):
+                        await self._write(state, offset, pieces)
+            except httpx.TransportError:
+                # Keep whatever did arrive - a resumed download picks up right after it
+                if coalescer.size and state.journal is not None:
+                    await self._write(state, *coalescer.take())
+                raise
+            if coalescer.size:
+                await self._write(state, *coalescer.take())
+
+        if coalescer.offset != end + 1:
+            raise httpx.ReadError(f"Segment {start}-{end} ended early at byte {coalescer.offset}")
+        return chunks
+
+    async def _write(self, state, offset, pieces):
+        await state.writer.submit(offset, pieces, lambda offset, size: self._written(state, offset, size))
+
+        # Checkpoint in the background, queued on the writer thread behind the writes before it
+        if state.journal is not None and state.checkpoint is None and time.monotonic() - state.last_checkpoint >= self.checkpoint_interval:
+            state.checkpoint = asyncio.ensure_future(state.writer.run(state.journal.save, state.writer.fd))
+            state.checkpoint.add_done_callback(lambda task: self._checkpointed(state, task))
+
+    def _checkpointed(self, state, task):
+        state.checkpoint = None
+        state.last_checkpoint = time.monotonic()
+        if not task.cancelled():
+            # A failed save only costs resumability - the download itself carries on
+            task.exception()
+
+    def _written(self, state, offset, size):
+        """Runs on the loop once a buffer is on disk"""
+        state.done += size
+        if state.journal is not None:
+            # fdatasync + journal save happen later, on the writer thread (DownloadJournal.save)
+            state.journal.add(offset, offset + size - 1)
+        self._report_progress(state)
+
+    def _report_progress(self, state, force=False):
+        if self.on_progress is None:
+            return
+        now = time.monotonic()
+        if force or now - state.last_progress >= self.progress_interval:
+            state.last_progress = now
+            self.on_progress(state.path, state.done, state.total)
+
+    async def _download_single(self, url, path, expected, journal=None):
+        """Plain sequential stream (no range support) - same coalesced writes, one segment"""
+        # A checkpoint counts bytes of the body as sent - ask for it unencoded so they're file offsets
+        headers = {"Accept-Encoding": "identity"} if journal is not None else {}
+        async with self.client.stream("GET", url, headers=headers) as response:
+            response.raise_for_status()
+            if journal is not None:
+                size = int(response.headers.get("content-length", 0))
+                etag, last_modified = response.headers.get("etag"), response.headers.get("last-modified")
+                encoded = response.headers.get("content-encoding", "identity").lower() != "identity"
+                if size and not encoded and resume_validator(etag, last_modified) is not None:
+                    journal.reset(url, size, etag, last_modified)
+                else:
+                    # No size or nothing to send in If-Range → a checkpoint could never be trusted
+                    journal.discard()
+                    journal = None
+            return await self.save_response(response, path, expected, journal=journal)
+
+    async def save_response(self, response, path, expected=None, compute=(), journal=None):
+        """Stream the body of an already-open response into path - coalesced writes, verified inline
+
+        For callers that make the request themselves (DownloadCache's conditional GETs).
+        expected: {algorithm: hex} to check; compute: algorithms to hash without checking.
+        journal: checkpointed as bytes land and saved if the stream fails (discarded once complete).
+        Returns (size, chunks, {algorithm: hex}).
+        """
+        writer = DownloadWriter(os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644))
+        try:
+            # Header digests cover the body as sent - not what's on disk once a Content-Encoding is undone
+            encoded = response.headers.get("content-encoding", "identity").lower() != "identity"
+            verifier = self._verifier(expected or {}, {} if encoded else digests_from_headers(response.headers), None, compute)
+            writer.on_write = verifier.update if verifier is not None else None
+
+            state = DownloadState(path, writer, int(response.headers.get("content-length", 0)) or None, journal)
+            chunks = 0
+            coalescer = ChunkCoalescer(0, self.write_buffer)
+            try:
+                try:
+                    async for chunk in response.aiter_bytes(self.chunk_size):
+                        chunks += 1
+                        for offset, pieces in coalescer.add(chunk):
+                            await self._write(state, offset, pieces)
+                except httpx.TransportError:
+                    # Keep whatever did arrive - a resumed download picks up right after it
+                    if coalescer.size and journal is not None:
+                        await self._write(state, *coalescer.take())
+                    raise
+                if coalescer.size:
+                    await self._write(state, *coalescer.take())
+                await writer.drain()
+            except BaseException:
+                if journal is not None:
+                    await self._abandon(state, [])
+                    try:
+                        await writer.run(journal.save, writer.fd)
+                    except Exception:
+                        pass
+                raise
+
+            if state.checkpoint is not None:
+                await asyncio.gather(state.checkpoint, return_exceptions=True)
+            digests = await writer.run(verifier.verify, writer.fd) if verifier is not None else {}
+            if journal is not None:
+                journal.discard()
+            self._report_progress(state, force=True)
+            return coalescer.offset, chunks, digests
+        finally:
+            await writer.close()
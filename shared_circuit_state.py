@@ -0,0 +1,412 @@
+"""Cross-process circuit state for the enterprise circuit breaker (async.py)
+
+Every worker process maps the same file (put it on /dev/shm to keep it in RAM), so
+when one worker trips a circuit every other worker sees `state == "open"` on its very
+next request - no Redis, no network round trip.
+
+Layout: a 64-byte header followed by fixed-size slots, one per service.
+
+    - Single fields (state, next_retry_time, ...) are plain aligned 8/4-byte reads → lock-free.
+    - Read-modify-write updates (counters, transitions, health window) take a byte-range
+      fcntl lock on *that service's slot only*, so busy services don't contend with each other.
+    - error_types, rejected_requests and the preallocated rejections stay per process.
+
+fcntl locks are per process, so this is meant for one event loop thread per worker
+process (the normal asyncio / gunicorn-worker setup).
+"""
+import asyncio
+import fcntl
+import hashlib
+import mmap
+import multiprocessing
+import os
+import struct
+import time
+
+from health_window import RollingHealthWindow, SlidingTimeWindow
+from latency_histogram import LatencyHistogram, bucket_count_for
+
+MAGIC = b"CIRCUIT3"
+HEADER_SIZE = 64
+HEADER = struct.Struct("<8sIIII")  # magic, slot_count, window_size, window_seconds, slot_size
+
+STATES = ("closed", "open", "half_open")
+STATE_CODES = {state: code for code, state in enumerate(STATES)}
+
+# Shared circuit fields → (offset inside the slot, struct format)
+FIELDS = {
+    "state": (56, "<I"),
+    "health_score": (60, "<I"),
+    "failure_count": (64, "<Q"),
+    "success_count": (72, "<Q"),
+    "consecutive_failures": (80, "<Q"),
+    "total_requests": (88, "<Q"),
+    "probes_in_flight": (96, "<Q"),
+    "half_open_successes": (104, "<Q"),
+    "half_open_generation": (112, "<Q"),
+    "last_failure_time": (128, "<d"),
+    "next_retry_time": (136, "<d"),
+    "last_state_change": (144, "<d"),
+}
+FIELD_STRUCTS = {name: (offset, struct.Struct(fmt)) for name, (offset, fmt) in FIELDS.items()}
+
+KEY_OFFSET = 0        # 8-byte hash of the service name (0 = free slot)
+NAME_OFFSET = 8       # first 48 bytes of the service name, for listing/debugging
+NAME_SIZE = 48
+WINDOW_OFFSET = 152   # position, count, latency_sum, success_sum, then the window arrays
+WINDOW_HEADER = struct.Struct("<QQdQ")
+LATENCIES_OFFSET = WINDOW_OFFSET + WINDOW_HEADER.size
+
+# Sliding time window: current_second, totals (requests, failures, slow calls, latency), then 4 arrays
+TIME_WINDOW_HEADER = struct.Struct("<QQQQd")
+
+# Latency histogram: active phase, phase_started, totals[2], maxima[2], then 2 x bucket counts (u32)
+HISTOGRAM_HEADER = struct.Struct("<QdQQdd")
+HISTOGRAM_SUB_BUCKET_BITS = 4
+HISTOGRAM_BUCKETS = bucket_count_for(HISTOGRAM_SUB_BUCKET_BITS)
+
+U64 = struct.Struct("<Q")
+F64 = struct.Struct("<d")
+
+
+def time_window_offset(window_size):
+    """Where the sliding time window starts (right after the health window, 8-byte aligned)"""
+    end = LATENCIES_OFFSET + window_size * 8 + window_size
+    return (end + 7) // 8 * 8
+
+
+def histogram_offset(window_size, window_seconds):
+    """Where the latency histogram starts (right after the time buckets)"""
+    return time_window_offset(window_size) + TIME_WINDOW_HEADER.size + window_seconds * 8 * 4
+
+
+def slot_size_for(window_size, window_seconds):
+    """Bytes per slot: fixed fields + health window + time buckets + histogram, rounded up to 64"""
+    size = histogram_offset(window_size, window_seconds) + HISTOGRAM_HEADER.size + HISTOGRAM_BUCKETS * 4 * 2
+    return (size + 63) // 64 * 64
+
+
+def service_key(service_name):
+    """Stable 8-byte key for a service name (never 0, that marks a free slot)"""
+    digest = hashlib.blake2b(service_name.encode("utf-8"), digest_size=8).digest()
+    return U64.unpack(digest)[0] or 1
+
+
+class SlotLock:
+    """Exclusive fcntl byte-range lock over one slot"""
+
+    __slots__ = ("fd", "start", "length")
+
+    def __init__(self, fd, start, length):
+        self.fd = fd
+        self.start = start
+        self.length = length
+
+    def __enter__(self):
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, self.length, self.start)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.lockf(self.fd, fcntl.LOCK_UN, self.length, self.start)
+        return False
+
+
+def shared_property(codec, offset):
+    """Attribute stored at `offset` bytes into the object's region of the mapped file"""
+
+    def getter(self):
+        return codec.unpack_from(self._buf, self._base + offset)[0]
+
+    def setter(self, value):
+        codec.pack_into(self._buf, self._base + offset, value)
+
+    return property(getter, setter)
+
+
+class SharedHealthWindow(RollingHealthWindow):
+    """RollingHealthWindow whose ring buffer and running sums live inside a shared slot"""
+
+    __slots__ = ("_buf", "_base")
+
+    position = shared_property(U64, 0)
+    count = shared_property(U64, 8)
+    latency_sum = shared_property(F64, 16)
+    success_sum = shared_property(U64, 24)
+
+    def __init__(self, buf, base, window_size):
+        # No super().__init__ - the storage already exists in the mapped file
+        self._buf = buf
+        self._base = base + WINDOW_OFFSET
+        self.window_size = window_size
+        start = base + LATENCIES_OFFSET
+        self.latencies = buf[start:start + window_size * 8].cast("d")
+        self.outcomes = buf[start + window_size * 8:start + window_size * 9]
+
+    def release(self):
+        """Drop the views into the mapped file (needed before the mmap can close)"""
+        self.latencies.release()
+        self.outcomes.release()
+
+
+class SharedTimeWindow(SlidingTimeWindow):
+    """SlidingTimeWindow whose per-second buckets and totals live inside a shared slot"""
+
+    __slots__ = ("_buf", "_base")
+
+    current_second = shared_property(U64, 0)
+    total_requests = shared_property(U64, 8)
+    total_failures = shared_property(U64, 16)
+    total_slow_calls = shared_property(U64, 24)
+    total_latency = shared_property(F64, 32)
+
+    def __init__(self, buf, base, window_size, window_seconds):
+        # No super().__init__ - the storage already exists in the mapped file
+        self._buf = buf
+        self._base = base + time_window_offset(window_size)
+        self.window_seconds = window_seconds
+
+        start = self._base + TIME_WINDOW_HEADER.size
+        size = window_seconds * 8
+        self.requests = buf[start:start + size].cast("Q")
+        self.failures = buf[start + size:start + size * 2].cast("Q")
+        self.slow_calls = buf[start + size * 2:start + size * 3].cast("Q")
+        self.latency_sums = buf[start + size * 3:start + size * 4].cast("d")
+
+    def release(self):
+        """Drop the views into the mapped file (needed before the mmap can close)"""
+        for view in (self.requests, self.failures, self.slow_calls, self.latency_sums):
+            view.release()
+
+
+class SharedLatencyHistogram(LatencyHistogram):
+    """LatencyHistogram whose two phases of bucket counts live inside a shared slot"""
+
+    __slots__ = ("_buf", "_base")
+
+    active = shared_property(U64, 0)
+    phase_started = shared_property(F64, 8)
+
+    def __init__(self, buf, base, window_size, window_seconds, interval=60.0):
+        # No super().__init__ - the storage already exists in the mapped file
+        self._buf = buf
+        self._base = base + histogram_offset(window_size, window_seconds)
+        self.sub_bucket_bits = HISTOGRAM_SUB_BUCKET_BITS
+        self.bucket_count = HISTOGRAM_BUCKETS
+        self.interval = interval
+        self.refresh_every = 16
+
+        self.totals = buf[self._base + 16:self._base + 32].cast("Q")
+        self.maxima = buf[self._base + 32:self._base + 48].cast("d")
+        start = self._base + HISTOGRAM_HEADER.size
+        size = HISTOGRAM_BUCKETS * 4
+        self.counts = (buf[start:start + size].cast("I"), buf[start + size:start + size * 2].cast("I"))
+
+        self._cache = {}
+        self._cache_total = -1
+        self._cache_active = -1
+
+    def release(self):
+        """Drop the views into the mapped file (needed before the mmap can close)"""
+        for view in (self.totals, self.maxima, *self.counts):
+            view.release()
+
+
+class SharedCircuit:
+    """Dict-like circuit whose shared fields read/write straight into the mapped slot.
+
+    Anything not in FIELDS (error_types, rejections, ...) stays process-local, so
+    the breaker code in async.py works on it exactly like on a plain dict.
+    """
+
+    def __init__(self, backend, base, local):
+        self._buf = backend.buf
+        self._base = base
+        self._local = local
+        self._local["health_window"] = SharedHealthWindow(backend.buf, base, backend.window_size)
+        self._local["time_window"] = SharedTimeWindow(backend.buf, base, backend.window_size, backend.window_seconds)
+        self._local["latency_histogram"] = SharedLatencyHistogram(
+            backend.buf, base, backend.window_size, backend.window_seconds, backend.latency_interval
+        )
+        for window in ("health_window", "time_window", "latency_histogram"):
+            backend.windows.append(self._local[window])
+        self._local["lock"] = SlotLock(backend.fd, base, backend.slot_size)
+
+    def __getitem__(self, key):
+        field = FIELD_STRUCTS.get(key)
+        if field is None:
+            return self._local[key]
+        offset, codec = field
+        value = codec.unpack_from(self._buf, self._base + offset)[0]
+        return STATES[value] if key == "state" else value
+
+    def __setitem__(self, key, value):
+        field = FIELD_STRUCTS.get(key)
+        if field is None:
+            self._local[key] = value
+            return
+        offset, codec = field
+        if key == "state":
+            value = STATE_CODES[value]
+        codec.pack_into(self._buf, self._base + offset, value)
+
+    def __contains__(self, key):
+        return key in FIELD_STRUCTS or key in self._local
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def update(self, values):
+        for key, value in values.items():
+            self[key] = value
+
+    def snapshot(self):
+        """Plain-dict copy of the shared fields"""
+        return {key: self[key] for key in FIELDS}
+
+
+class SharedCircuitBackend:
+    """Memory-mapped table of circuits shared by every process that opens `path`"""
+
+    def __init__(self, path, slot_count=1024, window_size=100, window_seconds=10, latency_interval=60.0):
+        self.path = path
+        self.latency_interval = latency_interval
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+
+        # Whoever gets the header lock first initialises the file, everybody else just maps it
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, HEADER_SIZE, 0)
+        try:
+            header = os.pread(self.fd, HEADER.size, 0)
+            if len(header) == HEADER.size and header[:8] == MAGIC:
+                _, slot_count, window_size, window_seconds, slot_size = HEADER.unpack(header)
+            else:
+                slot_size = slot_size_for(window_size, window_seconds)
+                # Truncate to 0 first: slots left by an older layout must read back as zeros (free), not as garbage
+                os.ftruncate(self.fd, 0)
+                os.ftruncate(self.fd, HEADER_SIZE + slot_count * slot_size)
+                os.pwrite(self.fd, HEADER.pack(MAGIC, slot_count, window_size, window_seconds, slot_size), 0)
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, HEADER_SIZE, 0)
+
+        # The file decides the layout - a worker started with other numbers adopts it
+        self.slot_count = slot_count
+        self.window_size = window_size
+        self.window_seconds = window_seconds
+        self.slot_size = slot_size
+        self.mmap = mmap.mmap(self.fd, HEADER_SIZE + slot_count * slot_size)
+        self.buf = memoryview(self.mmap)
+
+        # Windows / histograms handed out so far - their views must be released before closing
+        self.windows = []
+
+    def slot_offset(self, service_name):
+        """Find (or claim) the slot for a service - open addressing with linear probing"""
+        key = service_key(service_name)
+        index = key % self.slot_count
+
+        for _ in range(self.slot_count):
+            base = HEADER_SIZE + index * self.slot_size
+            slot_key = U64.unpack_from(self.buf, base + KEY_OFFSET)[0]
+
+            if slot_key == key:
+                return base
+
+            if slot_key == 0:
+                with SlotLock(self.fd, base, self.slot_size):
+                    # Re-check under the lock - another process may have claimed it meanwhile
+                    slot_key = U64.unpack_from(self.buf, base + KEY_OFFSET)[0]
+                    if slot_key == 0:
+                        name = service_name.encode("utf-8")[:NAME_SIZE].ljust(NAME_SIZE, b"\0")
+                        self.buf[base + NAME_OFFSET:base + NAME_OFFSET + NAME_SIZE] = name
+                        for field, value in (("health_score", 100), ("last_state_change", time.time())):
+                            offset, codec = FIELD_STRUCTS[field]
+                            codec.pack_into(self.buf, base + offset, value)
+                        # Publish the key last, so readers never see a half-written slot
+                        U64.pack_into(self.buf, base + KEY_OFFSET, key)
+                        return base
+                    if slot_key == key:
+                        return base
+
+            index = (index + 1) % self.slot_count
+
+        raise RuntimeError(f"Shared circuit table is full ({self.slot_count} slots) - raise slot_count")
+
+    def circuit(self, service_name, local):
+        """Wrap a service's slot; `local` holds the process-only fields"""
+        return SharedCircuit(self, self.slot_offset(service_name), local)
+
+    def services(self):
+        """Names (truncated to 48 bytes) of every service in the table"""
+        names = []
+        for index in range(self.slot_count):
+            base = HEADER_SIZE + index * self.slot_size
+            if U64.unpack_from(self.buf, base + KEY_OFFSET)[0]:
+                raw = bytes(self.buf[base + NAME_OFFSET:base + NAME_OFFSET + NAME_SIZE])
+                names.append(raw.rstrip(b"\0").decode("utf-8", "replace"))
+        return names
+
+    def close(self):
+        for window in self.windows:
+            window.release()
+        self.windows.clear()
+        self.buf.release()
+        self.mmap.close()
+        os.close(self.fd)
+
+
+# ------------------------------------------------------------------------------------------
+# Demo: one worker trips the circuit, the other workers see it on their next read
+# ------------------------------------------------------------------------------------------
+
+def watcher_process(path, ready, results):
+    """Spin on the shared state until the circuit opens, report how long that took to show up"""
+    backend = SharedCircuitBackend(path)
+    circuit = backend.circuit("payment_api", {})
+    ready.set()
+
+    while circuit["state"] != "open":
+        pass
+
+    results.put((os.getpid(), time.time() - circuit["last_state_change"]))
+    backend.close()
+
+
+async def tripping_worker(path):
+    """Run real breaker traffic against the shared backend until the circuit trips"""
+    import importlib
+
+    breaker = importlib.import_module("async")
+    breaker.use_shared_circuit_state(path)
+
+    async def failing_request():
+        raise ConnectionError("payment_api is down")
+
+    for i in range(5):
+        result = await breaker.enterprise_circuit_breaker("payment_api", failing_request, config={"max_failures": 3})
+        print(f"   Request {i + 1}: {result['status']} | Circuit: {result['circuit_state']}")
+
+
+if __name__ == "__main__":
+    demo_path = "/dev/shm/enterprise_circuits.bin" if os.path.isdir("/dev/shm") else "enterprise_circuits.bin"
+    if os.path.exists(demo_path):
+        os.remove(demo_path)
+
+    SharedCircuitBackend(demo_path).close()
+
+    ready_events = [multiprocessing.Event() for _ in range(3)]
+    results = multiprocessing.Queue()
+    watchers = [multiprocessing.Process(target=watcher_process, args=(demo_path, ready, results)) for ready in ready_events]
+    for watcher in watchers:
+        watcher.start()
+    for ready in ready_events:
+        ready.wait()
+
+    print("🚀 Tripping payment_api from the main process...")
+    asyncio.run(tripping_worker(demo_path))
+
+    for _ in watchers:
+        pid, seen_after = results.get(timeout=5)
+        print(f"   👀 Worker {pid} saw the circuit OPEN {seen_after * 1e6:.0f} µs after it tripped")
+    for watcher in watchers:
+        watcher.join()
+
+    os.remove(demo_path)
@@ -0,0 +1,214 @@
+"""Streaming multipart uploads from disk - constant memory, hashes computed off the loop and cached per file version"""
+import asyncio
+import collections
+import hashlib
+import os
+
+import httpx
+
+# Read size when hashing / sending files
+CHUNK_SIZE = 1024 * 1024
+
+
+class FileChangedError(Exception):
+    """The file on disk changed while it was being uploaded - the body was cut short on purpose"""
+
+
+def file_version(path):
+    """(path, mtime_ns, size) - a digest is only reused while all three still match"""
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def hash_file(path, algorithm="md5", chunk_size=CHUNK_SIZE):
+    """Incremental digest of a file (blocking - hashlib releases the GIL, run it in a thread)"""
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FileDigestCache:
+    """Digests of files keyed by (path, mtime, size, algorithm) - each file version is hashed once.
+
+        md5 = await digest_cache.digest("report.pdf")            # hashed in a worker thread
+        md5 = await digest_cache.digest("report.pdf")            # unchanged → cached, no I/O
+
+    Concurrent calls for the same file share one hashing pass. Bodies that hashed the file
+    while sending it (MultipartFileBody) store their result with put(), so a file that was
+    uploaded once never has to be read just to hash it again.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._digests = collections.OrderedDict()
+        self._in_flight = {}
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path, algorithm="md5"):
+        """Cached digest for the file as it is on disk now, or None"""
+        key = (*file_version(path), algorithm)
+        digest = self._digests.get(key)
+        if digest is not None:
+            self._digests.move_to_end(key)
+        return digest
+
+    def put(self, version, algorithm, digest):
+        self._digests[(*version, algorithm)] = digest
+        self._digests.move_to_end((*version, algorithm))
+        while len(self._digests) > self.max_entries:
+            self._digests.popitem(last=False)
+
+    async def digest(self, path, algorithm="md5"):
+        version = file_version(path)
+        key = (*version, algorithm)
+        digest = self._digests.get(key)
+        if digest is not None:
+            self.hits += 1
+            self._digests.move_to_end(key)
+            return digest
+
+        self.misses += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            task = self._in_flight[key] = asyncio.ensure_future(asyncio.to_thread(hash_file, path, algorithm))
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        digest = await asyncio.shield(task)
+        self.put(version, algorithm, digest)
+        return digest
+
+    def stats(self):
+        return {"entries": len(self._digests), "hits": self.hits, "misses": self.misses, "hashing": len(self._in_flight)}
+
+
+# The process-wide digest cache
+digest_cache = FileDigestCache()
+
+
+def quote_field(value):
+    """Same escaping httpx uses for multipart names / filenames"""
+    return value.replace('"', "%22").replace("\\", "\\\\").replace("\r", "%0D").replace("\n", "%0A")
+
+
+class FilePart:
+    """One file field of a MultipartFileBody"""
+
+    __slots__ = ("name", "path", "filename", "content_type", "version")
+
+    def __init__(self, name, path, filename=None, content_type="application/octet-stream"):
+        self.name = name
+        self.path = path
+        self.filename = filename or os.path.basename(path)
+        self.content_type = content_type
+        self.version = file_version(path)
+
+    @property
+    def size(self):
+        return self.version[2]
+
+
+def read_and_hash(file, size, digest):
+    """One read + digest update in the same worker-thread call (a single pass over the bytes)"""
+    chunk = file.read(size)
+    if digest is not None:
+        digest.update(chunk)
+    return chunk
+
+
+class MultipartFileBody(httpx.AsyncByteStream):
+    """multipart/form-data body streamed straight from disk - memory stays at one chunk per upload.
+
+        body = MultipartFileBody(
+            files={"file": FilePart("file", path, content_type="image/png")},
+            data={"metadata": '{"hash": "..."}'},
+        )
+        await client.post(url, content=body, headers=body.headers)
+
+    Every pass (first send, each retry) re-opens the files and streams them in `chunk_size`
+    reads on a worker thread; nothing is held between passes, so retries re-send without
+    re-reading into memory. Content-Length is known up front (no chunked encoding).
+
+    With `hash_algorithm` set, a file whose digest isn't known yet is hashed in the same
+    worker-thread call that reads it, and the result is stored in `digest_cache`. A digest
+    that is known - `expected_digests` (e.g. the X-File-Hash header) or the one an earlier
+    pass computed - isn't recomputed on every send: the file's (mtime, size) is checked
+    before and after each pass instead. Either way, a file that changed stops the body
+    before its closing boundary with FileChangedError, so the server never accepts a torn upload.
+    """
+
+    def __init__(self, files, data=None, boundary=None, chunk_size=CHUNK_SIZE, hash_algorithm=None, expected_digests=None, cache=None):
+        self.boundary = boundary or os.urandom(16).hex()
+        self.chunk_size = chunk_size
+        self.hash_algorithm = hash_algorithm
+        self.expected_digests = dict(expected_digests or {})
+        self.cache = cache if cache is not None else digest_cache
+
+        # Digests of what the last pass actually sent, per file field
+        self.sent_digests = {}
+
+        # Text fields first, files last (servers can read the metadata before the big part arrives)
+        self._parts = []
+        for name, value in (data or {}).items():
+            header = f'--{self.boundary}\r\nContent-Disposition: form-data; name="{quote_field(name)}"\r\n\r\n'
+            self._parts.append((header.encode("utf-8"), name, str(value).encode("utf-8")))
+        for name, part in files.items():
+            header = (
+                f"--{self.boundary}\r\n"
+                f'Content-Disposition: form-data; name="{quote_field(name)}"; filename="{quote_field(part.filename)}"\r\n'
+                f"Content-Type: {part.content_type}\r\n\r\n"
+            )
+            self._parts.append((header.encode("utf-8"), name, part))
+        self._closing = f"--{self.boundary}--\r\n".encode("ascii")
+
+    @property
+    def content_length(self):
+        total = len(self._closing)
+        for header, _, body in self._parts:
+            total += len(header) + (body.size if isinstance(body, FilePart) else len(body)) + 2
+        return total
+
+    @property
+    def headers(self):
+        """Pass these with the request (Content-Length keeps httpx from switching to chunked)"""
+        return {"Content-Type": f"multipart/form-data; boundary={self.boundary}", "Content-Length": str(self.content_length)}
+
+    async def __aiter__(self):
+        for header, name, body in self._parts:
+            yield header
+            if isinstance(body, FilePart):
+                async for chunk in self._stream_file(name, body):
+                    yield chunk
+            else:
+                yield body
+            yield b"\r\n"
+        yield self._closing
+
+    async def _stream_file(self, name, part):
+        # `name` is the multipart field name (the files dict key) - expected_digests and sent_digests are keyed by it
+        if file_version(part.path) != part.version:
+            raise FileChangedError(f"{part.path} changed since the upload was prepared")
+
+        # Known for this version (given, or hashed on an earlier pass) → the version checks stand in for re-hashing
+        known = self.expected_digests.get(name) or self.sent_digests.get(name)
+        digest = hashlib.new(self.hash_algorithm) if self.hash_algorithm and known is None else None
+        remaining = part.size
+        with open(part.path, "rb") as file:
+            while remaining:
+                chunk = await asyncio.to_thread(read_and_hash, file, min(self.chunk_size, remaining), digest)
+                if not chunk:
+                    raise FileChangedError(f"{part.path} shrank during the upload")
+                remaining -= len(chunk)
+                yield chunk
+
+        if file_version(part.path) != part.version:
+            raise FileChangedError(f"{part.path} changed during the upload")
+        if digest is None:
+            if known is not None:
+                self.sent_digests[name] = known
+            return
+        self.sent_digests[name] = digest.hexdigest()
+        self.cache.put(part.version, self.hash_algorithm, self.sent_digests[name])
@@ -0,0 +1,211 @@
+"""Shared bearer-token manager (httpx.Auth) - single-flight refresh, proactive background refresh, 401 replay"""
+import asyncio
+import random
+import time
+
+import httpx
+
+# One manager per (token endpoint, credential set) for the whole process
+token_managers = {}
+
+
+class TokenRefreshError(Exception):
+    """The token endpoint didn't give us a usable token"""
+
+
+class BearerToken:
+    """An access token and when it stops being valid"""
+
+    __slots__ = ("access_token", "expires_at", "issued_at")
+
+    def __init__(self, access_token, expires_at, issued_at):
+        self.access_token = access_token
+        self.expires_at = expires_at
+        self.issued_at = issued_at
+
+    def valid(self, now):
+        return now < self.expires_at
+
+
+def parse_oauth_token(response):
+    """Standard OAuth2 token response → (access_token, lifetime in seconds or None)"""
+    payload = response.json()
+    try:
+        return payload["access_token"], payload.get("expires_in")
+    except KeyError:
+        raise TokenRefreshError("Token response has no access_token") from None
+
+
+class TokenManager:
+    """Keeps one valid bearer token for a credential set and refreshes it at most once at a time.
+
+    - Callers only ever wait when there's no valid token at all; every concurrent caller
+      waits on the same refresh (no stampede on the token endpoint).
+    - `refresh_margin` seconds before expiry (minus up to `jitter` of the lifetime, so a
+      fleet of processes doesn't all refresh on the same second) a background refresh
+      starts while callers keep using the current token.
+    - invalidate(token) after a 401 triggers one refresh no matter how many requests saw it.
+    """
+
+    def __init__(
+        self,
+        token_url,
+        credentials,
+        client=None,
+        parse_token=parse_oauth_token,
+        refresh_margin=60.0,
+        jitter=0.1,
+        default_lifetime=3600.0,
+        retry_interval=5.0,
+    ):
+        self.token_url = token_url
+        self.credentials = dict(credentials)
+        self.parse_token = parse_token
+        self.refresh_margin = refresh_margin
+        self.jitter = jitter
+        self.default_lifetime = default_lifetime
+        self.retry_interval = retry_interval
+
+        self._client = client
+        self._owns_client = client is None
+
+        # Keyword options get_token_manager() created this manager with
+        self.options = {}
+
+        self._token = None
+        self._refresh_task = None
+        self._refresh_timer = None
+
+        # Stats
+        self.refreshes = 0
+        self.background_refreshes = 0
+        self.failed_refreshes = 0
+        self.waits = 0
+        self.invalidations = 0
+
+    async def get_token(self):
+        """A valid token - only awaits the token endpoint when we don't have one"""
+        token = self._token
+        if token is not None and token.valid(time.time()):
+            return token
+
+        self.waits += 1
+        # shield → a cancelled caller doesn't cancel the refresh everybody else is waiting on
+        return await asyncio.shield(self._start_refresh())
+
+    async def invalidate(self, token):
+        """The server rejected `token` (401) - get a new one unless somebody already did"""
+        if self._token is token:
+            self.invalidations += 1
+            self._token = None
+        return await self.get_token()
+
+    def _start_refresh(self, background=False):
+        """The one in-flight refresh (starts it if needed)"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self._refresh(background))
+        return self._refresh_task
+
+    async def _refresh(self, background):
+        if self._client is None:
+            self._client = httpx.AsyncClient(http2=True, timeout=httpx.Timeout(30.0))
+
+        try:
+            response = await self._client.post(self.token_url, data=self.credentials)
+            if response.status_code != 200:
+                raise TokenRefreshError(f"Token endpoint answered {response.status_code}")
+            access_token, lifetime = self.parse_token(response)
+        except Exception:
+            self.failed_refreshes += 1
+            # A background refresh failing isn't fatal yet - the current token is still valid
+            if background and self._token is not None:
+                self._schedule_refresh(self.retry_interval)
+            raise
+
+        now = time.time()
+        lifetime = float(lifetime or self.default_lifetime)
+        self._token = BearerToken(access_token, now + lifetime, now)
+        self.refreshes += 1
+        if background:
+            self.background_refreshes += 1
+
+        # Refresh ahead of expiry; the jitter spreads refreshes of many processes/managers apart
+        delay = lifetime - self.refresh_margin - random.uniform(0, self.jitter * lifetime)
+        self._schedule_refresh(max(delay, lifetime / 2))
+        return self._token
+
+    def _schedule_refresh(self, delay):
+        if self._refresh_timer is not None:
+            self._refresh_timer.cancel()
+        self._refresh_timer = asyncio.get_running_loop().call_later(delay, self._background_refresh)
+
+    def _background_refresh(self):
+        self._refresh_timer = None
+        task = self._start_refresh(background=True)
+        # Nobody awaits a background refresh - don't let its failure turn into "exception never retrieved"
+        task.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+    def stats(self):
+        return {
+            "refreshes": self.refreshes,
+            "background_refreshes": self.background_refreshes,
+            "failed_refreshes": self.failed_refreshes,
+            "waits": self.waits,
+            "invalidations": self.invalidations,
+            "expires_in": self._token.expires_at - time.time() if self._token else None,
+        }
+
+    async def aclose(self):
+        if self._refresh_timer is not None:
+            self._refresh_timer.cancel()
+            self._refresh_timer = None
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_task.cancel()
+        if self._owns_client and self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def get_token_manager(token_url, credentials, **options):
+    """The process-wide manager for this token endpoint + credential set
+
+    Raises ValueError if a manager for it already exists with different options - they
+    would otherwise be silently ignored.
+    """
+    key = (token_url, tuple(sorted(credentials.items())))
+    manager = token_managers.get(key)
+    if manager is None:
+        manager = TokenManager(token_url, credentials, **options)
+        manager.options = options
+        token_managers[key] = manager
+    elif options != manager.options:
+        raise ValueError(f"A token manager for {token_url} already exists with options {manager.options}, got {options}")
+    return manager
+
+
+class BearerTokenAuth(httpx.Auth):
+    """httpx auth flow on top of a shared TokenManager.
+
+        auth = BearerTokenAuth("https://auth.example.com/token", {"client_id": ..., "client_secret": ...})
+        client = httpx.AsyncClient(auth=auth)
+
+    Adds `Authorization: Bearer ...`; a 401 invalidates the token and the request is
+    replayed once with a fresh one.
+    """
+
+    def __init__(self, token_url=None, credentials=None, manager=None, **options):
+        self.manager = manager or get_token_manager(token_url, credentials, **options)
+
+    async def async_auth_flow(self, request):
+        token = await self.manager.get_token()
+        request.headers["Authorization"] = f"Bearer {token.access_token}"
+        response = yield request
+
+        if response.status_code == 401:
+            # Only the first request to see this token's 401 actually refreshes
+            token = await self.manager.invalidate(token)
+            request.headers["Authorization"] = f"Bearer {token.access_token}"
+            yield request
+
+    def sync_auth_flow(self, request):
+        raise RuntimeError("BearerTokenAuth only works with httpx.AsyncClient")
@@ -0,0 +1,197 @@
+"""Local ASGI stand-in for a chunked upload service (init / part / complete) - for tests and benchmarks
+
+    app = UploadServer(storage_dir)
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://uploads")
+
+or over real sockets: `python upload_server.py --port 8008` (needs uvicorn).
+
+Protocol (JSON in, JSON out):
+    POST /uploads                        {"filename", "size", "part_size"} → {"upload_id", "part_size", "part_count"}
+    GET  /uploads/{id}                   → {"parts": {"1": "<sha256>", ...}, "completed": bool}
+    PUT  /uploads/{id}/parts/{n}         raw bytes + X-Part-SHA256 → {"part", "sha256"} (400 on hash mismatch)
+    POST /uploads/{id}/complete          {"parts": [{"part", "sha256"}], "manifest_sha256"} → {"size", "sha256", "manifest_sha256"}
+
+The manifest hash is sha256 over the concatenated hex part hashes (in part order), like an
+S3 multipart ETag - it lets both sides agree on the whole file without re-reading it.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import tempfile
+
+from chunked_upload import manifest_sha256
+
+PART_PATH = re.compile(r"^/uploads/([0-9a-f]+)/parts/(\d+)$")
+UPLOAD_PATH = re.compile(r"^/uploads/([0-9a-f]+)$")
+COMPLETE_PATH = re.compile(r"^/uploads/([0-9a-f]+)/complete$")
+
+
+class UploadServer:
+    """ASGI app implementing the init / part / complete protocol on local disk.
+
+    Knobs for tests and benchmarks:
+      per_request_mbps - caps how fast each request body is accepted (a per-connection uplink limit)
+      failure_rate     - fraction of part uploads answered with 503 after the body was read
+    """
+
+    def __init__(self, storage_dir=None, per_request_mbps=None, failure_rate=0.0, seed=None):
+        self.storage_dir = storage_dir or tempfile.mkdtemp(prefix="uploads-")
+        self.bytes_per_second = per_request_mbps * 1024 * 1024 if per_request_mbps else None
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self.uploads = {}
+
+        # Stats
+        self.part_requests = 0
+        self.injected_failures = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while (await receive())["type"] != "lifespan.shutdown":
+                await send({"type": "lifespan.startup.complete"})
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+        method, path = scope["method"], scope["path"]
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+
+        if method == "POST" and path == "/uploads":
+            status, body = self.init_upload(json.loads(await self.read_body(receive)))
+        elif method == "PUT" and PART_PATH.match(path):
+            upload_id, number = PART_PATH.match(path).groups()
+            status, body = await self.put_part(upload_id, int(number), headers, receive)
+        elif method == "GET" and UPLOAD_PATH.match(path):
+            status, body = self.get_upload(UPLOAD_PATH.match(path).group(1))
+        elif method == "POST" and COMPLETE_PATH.match(path):
+            status, body = await self.complete(COMPLETE_PATH.match(path).group(1), json.loads(await self.read_body(receive)))
+        else:
+            status, body = 404, {"error": "not found"}
+
+        payload = json.dumps(body).encode("utf-8")
+        await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())]})
+        await send({"type": "http.response.body", "body": payload})
+
+    async def read_body(self, receive, on_chunk=None):
+        """Read the request body, throttled to bytes_per_second when set"""
+        chunks = []
+        received = 0
+        started = asyncio.get_running_loop().time()
+        while True:
+            message = await receive()
+            chunk = message.get("body", b"")
+            if on_chunk is not None:
+                on_chunk(chunk)
+            else:
+                chunks.append(chunk)
+            received += len(chunk)
+            if self.bytes_per_second:
+                ahead = received / self.bytes_per_second - (asyncio.get_running_loop().time() - started)
+                if ahead > 0:
+                    await asyncio.sleep(ahead)
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+    def init_upload(self, request):
+        upload_id = os.urandom(8).hex()
+        size, part_size = int(request["size"]), int(request["part_size"])
+        part_count = max(1, -(-size // part_size))
+        directory = os.path.join(self.storage_dir, upload_id)
+        os.makedirs(directory)
+        self.uploads[upload_id] = {"filename": request.get("filename"), "size": size, "part_size": part_size, "part_count": part_count, "parts": {}, "result": None, "dir": directory}
+        return 200, {"upload_id": upload_id, "part_size": part_size, "part_count": part_count}
+
+    def get_upload(self, upload_id):
+        upload = self.uploads.get(upload_id)
+        if upload is None:
+            return 404, {"error": "unknown upload"}
+        return 200, {"parts": {str(number): sha for number, sha in upload["parts"].items()}, "completed": upload["result"] is not None}
+
+    async def put_part(self, upload_id, number, headers, receive):
+        self.part_requests += 1
+        upload = self.uploads.get(upload_id)
+        if upload is None:
+            return 404, {"error": "unknown upload"}
+        if not 1 <= number <= upload["part_count"]:
+            return 400, {"error": f"part {number} out of range"}
+
+        digest = hashlib.sha256()
+        part_path = os.path.join(upload["dir"], f"{number}.part")
+        # Unique per request: a retried / duplicate PUT of the same part must not write into this one's file
+        temp_path = f"{part_path}.{os.urandom(4).hex()}.tmp"
+        with open(temp_path, "wb") as file:
+            def on_chunk(chunk):
+                digest.update(chunk)
+                file.write(chunk)
+            await self.read_body(receive, on_chunk)
+
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            self.injected_failures += 1
+            os.remove(temp_path)
+            return 503, {"error": "injected failure"}
+
+        sha = digest.hexdigest()
+        if headers.get("x-part-sha256") not in (None, sha):
+            os.remove(temp_path)
+            return 400, {"error": "part hash mismatch", "sha256": sha}
+        os.replace(temp_path, part_path)
+        upload["parts"][number] = sha
+        return 200, {"part": number, "sha256": sha}
+
+    async def complete(self, upload_id, request):
+        upload = self.uploads.get(upload_id)
+        if upload is None:
+            return 404, {"error": "unknown upload"}
+        if upload["result"] is not None:
+            # Idempotent - a retried complete gets the same answer
+            return 200, upload["result"]
+
+        expected = {int(part["part"]): part["sha256"] for part in request["parts"]}
+        missing = [number for number in range(1, upload["part_count"] + 1) if number not in upload["parts"]]
+        if missing:
+            return 400, {"error": "missing parts", "missing": missing}
+        if any(upload["parts"][number] != sha for number, sha in expected.items()) or len(expected) != upload["part_count"]:
+            return 400, {"error": "manifest doesn't match the uploaded parts"}
+
+        hashes = [upload["parts"][number] for number in range(1, upload["part_count"] + 1)]
+        manifest = manifest_sha256(hashes)
+        if request.get("manifest_sha256") not in (None, manifest):
+            return 400, {"error": "manifest hash mismatch", "manifest_sha256": manifest}
+
+        # Stitch the parts together (off the loop - could be GBs)
+        result_path = os.path.join(upload["dir"], "complete")
+        size, sha = await asyncio.to_thread(self._assemble, upload, result_path)
+        if size != upload["size"]:
+            return 400, {"error": f"assembled {size} bytes, expected {upload['size']}"}
+        upload["result"] = {"size": size, "sha256": sha, "manifest_sha256": manifest, "path": result_path}
+        return 200, upload["result"]
+
+    def _assemble(self, upload, result_path):
+        digest = hashlib.sha256()
+        size = 0
+        with open(result_path, "wb") as out:
+            for number in range(1, upload["part_count"] + 1):
+                part_path = os.path.join(upload["dir"], f"{number}.part")
+                with open(part_path, "rb") as part:
+                    while chunk := part.read(1024 * 1024):
+                        digest.update(chunk)
+                        out.write(chunk)
+                        size += len(chunk)
+                os.remove(part_path)
+        return size, digest.hexdigest()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local chunked-upload stand-in server")
+    parser.add_argument("--port", type=int, default=8008)
+    parser.add_argument("--storage-dir", default=None)
+    parser.add_argument("--per-request-mbps", type=float, default=None)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    uvicorn.run(UploadServer(args.storage_dir, args.per_request_mbps, args.failure_rate), port=args.port, log_level="warning")